@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+跨用户共现图谱基准测试
+
+模拟大量用户的交互 (每次一个查询 + 1~3 个点击，物品热度服从 Zipf 分布)，测量：
+  - record: 单次交互写入共现计数的耗时 (含尾段合并的均摊开销)
+  - top_k:  以 5 个种子主题查询前 5 个共同点击的耗时
+
+用法：
+  python benchmarks/bench_cooccurrence.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cooccurrence import CooccurrenceGraph
+
+INTERACTIONS = [10_000, 100_000]
+QUERIES = 2_000
+ITEMS = 20_000
+SEEDS = 5
+REPEAT = 1_000
+
+
+def interactions(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    queries = rng.zipf(1.3, size=n) % QUERIES
+    n_clicks = rng.integers(1, 4, size=n)
+    items = rng.zipf(1.3, size=int(n_clicks.sum())) % ITEMS
+    pos = 0
+    for q, c in zip(queries.tolist(), n_clicks.tolist()):
+        yield f"query_{q}", [f"item_{i}" for i in items[pos:pos + c].tolist()]
+        pos += c
+
+
+def main():
+    print(f"{'交互数':>8} | {'物品数':>8} | {'物品对':>9} | {'record(µs)':>11} | {'top_k(µs)':>10}")
+    print("-" * 60)
+    for n in INTERACTIONS:
+        co = CooccurrenceGraph()
+        baskets = list(interactions(n))
+        start = time.perf_counter()
+        for query, clicked in baskets:
+            co.record(query, clicked)
+        record_us = (time.perf_counter() - start) / n * 1e6
+
+        seeds = [{f"query_{q}": 1.0 for q in range(s, s + SEEDS)} for s in range(0, REPEAT)]
+        start = time.perf_counter()
+        for seed in seeds:
+            co.top_k(seed, k=5)
+        top_k_us = (time.perf_counter() - start) / REPEAT * 1e6
+        stats = co.get_stats()
+        print(f"{n:>8} | {stats['items']:>8} | {stats['pairs']:>9} | {record_us:>11.1f} | {top_k_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+JSON数组闭合即停止的基准测试
+
+模型先输出 RECOMMENDATION_NUM 条推荐组成的JSON数组 (在 lm_head 上强制输出样例)，
+之后自由生成 (随机模型几乎不会生成EOS，相当于在数组后继续写说明文字)。对比：
+  - full: 不检查输出，解码到 512 个新token (原先 max_length=512 的行为)
+  - stop: 数组闭合即停止，预算为 RECOMMENDATION_NUM × 实测每条token数 + GENERATION_PREAMBLE_TOKENS
+
+报告每条请求的新token数、延迟和数组是否完整。
+
+用法：
+  python benchmarks/bench_early_stop.py
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from transformers import StoppingCriteriaList
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generation_model import load_shared_model
+from benchmarks.bench_continuous_batching import build_prompts
+from src.agents.generation_batcher import _JsonArrayStop
+from src.config import RECOMMENDATION_NUM, GENERATION_TOKENS_PER_ITEM, GENERATION_PREAMBLE_TOKENS
+
+BATCH_SIZES = [1, 8]
+REPEAT = 3
+SAMPLE = [
+    {"title": "机器学习实战", "description": "用Python动手实现常见算法", "reason": "与您对机器学习和Python的兴趣高度相关"},
+    {"title": "深度学习入门", "description": "从零搭建神经网络", "reason": "您最近关注深度学习框架，适合系统入门"},
+    {"title": "数据分析指南", "description": "pandas数据清洗与可视化", "reason": "补充您在数据分析工具方面的实践经验"},
+    {"title": "推荐系统实践", "description": "召回、排序与评估的完整流程", "reason": "与您当前关注的推荐系统需求直接相关"},
+    {"title": "大模型应用开发", "description": "基于大模型构建智能应用", "reason": "延伸您对深度学习和大模型应用的兴趣"},
+]
+
+
+def force_output(shared, script):
+    """每次 generate 的前 len(script) 步强制输出样例，返回重置步数的函数"""
+    state = {"step": 0}
+
+    def hook(module, args, output):
+        if state["step"] < len(script):
+            output[:, -1, script[state["step"]]] = 1e4
+        state["step"] += 1
+
+    shared.model.lm_head.register_forward_hook(hook)
+    return lambda: state.update(step=0)
+
+
+def run(shared, prompts, reset, **kwargs):
+    tokenizer = shared.tokenizer
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True, padding_side="left")
+    reset()
+    start = time.perf_counter()
+    with torch.no_grad():
+        outputs = shared.model.generate(**inputs, pad_token_id=tokenizer.pad_token_id, do_sample=True,
+                                        temperature=0.7, top_p=0.95, **kwargs)
+    elapsed = time.perf_counter() - start
+    texts = tokenizer.batch_decode(outputs[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+    complete = all(text.startswith(json.dumps(SAMPLE, ensure_ascii=False)) for text in texts)
+    return outputs.shape[1] - inputs["input_ids"].shape[1], elapsed, complete
+
+
+def main():
+    shared = load_shared_model()
+    tokenizer = shared.tokenizer
+    sample = json.dumps(SAMPLE[:RECOMMENDATION_NUM], ensure_ascii=False)
+    script = tokenizer(sample, add_special_tokens=False)["input_ids"]
+    per_item = len(script) / RECOMMENDATION_NUM
+    budget = int(np.ceil(per_item)) * RECOMMENDATION_NUM + GENERATION_PREAMBLE_TOKENS
+    print(f"每条推荐 {per_item:.1f} token (配置 GENERATION_TOKENS_PER_ITEM={GENERATION_TOKENS_PER_ITEM})，"
+          f"预算 {budget} 个新token")
+    reset = force_output(shared, script)
+    prompts = build_prompts()
+    modes = [
+        ("full", lambda batch: dict(max_new_tokens=512)),
+        ("stop", lambda batch: dict(max_new_tokens=budget,
+                                    stopping_criteria=StoppingCriteriaList([_JsonArrayStop(tokenizer, batch)]))),
+    ]
+    print(f"{'批大小':>6} | {'方式':>5} | {'新token':>7} | {'延迟(s)':>8} | 数组完整")
+    print("-" * 50)
+    for batch_size in BATCH_SIZES:
+        for name, kwargs in modes:
+            runs = [run(shared, prompts[i * batch_size:(i + 1) * batch_size], reset, **kwargs(batch_size))
+                    for i in range(REPEAT)]
+            tokens = np.mean([r[0] for r in runs])
+            latency = np.median([r[1] for r in runs])
+            print(f"{batch_size:>6} | {name:>5} | {tokens:>7.0f} | {latency:>8.2f} | {all(r[2] for r in runs)}")
+
+
+if __name__ == "__main__":
+    main()
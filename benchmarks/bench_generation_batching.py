@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+生成微批处理基准测试
+
+1~32 个并发用户各自循环请求推荐 (AgentA.generate_recommendations)，对比：
+  - single:  max_batch_size=1，请求逐条生成 (原先的行为)
+  - batched: max_batch_size=GENERATION_MAX_BATCH，并发请求合并成批
+
+报告吞吐 (请求/秒) 和请求延迟 p50/p99，即吞吐-延迟曲线。
+
+用法：
+  python benchmarks/bench_generation_batching.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generation_model import load_shared_model
+from src.agents import AgentA, GenerationBatcher
+from src.interest_graph import InterestGraph
+from src.config import GENERATION_MAX_BATCH, GENERATION_MAX_WAIT
+
+USERS = [1, 2, 4, 8, 16, 32]
+REQUESTS_PER_USER = 2
+QUERIES = ["机器学习入门", "数据分析工具", "Python进阶", "深度学习框架"]
+
+
+class FixedRegistry:
+    """让AgentA使用指定的共享模型"""
+
+    def __init__(self, shared):
+        self.shared = shared
+
+    def get(self, *args, **kwargs):
+        return self.shared
+
+
+def user_graph(i: int) -> InterestGraph:
+    graph = InterestGraph(f"user_{i}")
+    graph.add_interest(QUERIES[i % len(QUERIES)], weight=0.8)
+    graph.add_interest(QUERIES[(i + 1) % len(QUERIES)], weight=0.5)
+    return graph
+
+
+def run(shared, users: int, max_batch_size: int):
+    shared.batcher = GenerationBatcher(shared, max_batch_size, GENERATION_MAX_WAIT)
+    registry = FixedRegistry(shared)
+    latencies = []
+    barrier = threading.Barrier(users)
+
+    def worker(i: int):
+        agent = AgentA(registry=registry)
+        graph = user_graph(i)
+        barrier.wait()
+        for j in range(REQUESTS_PER_USER):
+            start = time.perf_counter()
+            agent.generate_recommendations(QUERIES[(i + j) % len(QUERIES)], graph)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stats = shared.batcher.get_stats()
+    shared.batcher.close()
+    return len(latencies) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99), stats["avg_batch_size"]
+
+
+def main():
+    shared = load_shared_model()
+    print(f"{'用户数':>6} | {'方式':>8} | {'吞吐(req/s)':>11} | {'p50(s)':>8} | {'p99(s)':>8} | {'平均批大小':>10}")
+    print("-" * 68)
+    for users in USERS:
+        for name, max_batch_size in (("single", 1), ("batched", GENERATION_MAX_BATCH)):
+            throughput, p50, p99, avg_batch = run(shared, users, max_batch_size)
+            print(f"{users:>6} | {name:>8} | {throughput:>11.2f} | {p50:>8.2f} | {p99:>8.2f} | {avg_batch:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+生成token预算的测量
+
+用模型的tokenizer统计一条推荐 (title/description/reason 的JSON对象) 实际占多少token，
+用于设置 GENERATION_TOKENS_PER_ITEM 和 GENERATION_PREAMBLE_TOKENS：
+  - 随机组合标题和描述/理由文本，长度在提示词限制内 (描述20字、理由30字)，
+    以及超出限制 1.5 倍 (模型并不总遵守字数限制)
+  - 按紧凑和缩进 (2/4空格) 三种JSON格式各序列化 RECOMMENDATION_NUM 条，统计每条的token数分位数
+  - 数组之前的开头说明和代码块标记也计入预算，单独统计
+
+用法：
+  python benchmarks/bench_generation_budget.py [tokenizer路径，默认 MODEL_NAME]
+"""
+
+import json
+import os
+import random
+import sys
+
+import numpy as np
+from transformers import AutoTokenizer
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import (MODEL_NAME, RECOMMENDATION_NUM, GENERATION_TOKENS_PER_ITEM, GENERATION_PREAMBLE_TOKENS,
+                        GENERATION_MAX_NEW_TOKENS)
+
+SAMPLES = 2000
+TITLES = ["机器学习实战", "深度学习入门", "数据分析指南", "推荐系统实践", "大模型应用开发", "吴恩达机器学习课程",
+          "Kaggle竞赛实战项目", "Pandas数据处理指南", "SQL数据库性能优化", "PyTorch从入门到精通", "Transformer原理详解",
+          "统计学习方法（第二版）", "计算机视觉：算法与应用", "自然语言处理入门", "强化学习导论", "Python编程：从入门到实践",
+          "《深度学习》花书精读", "Scikit-learn机器学习实战指南", "数据可视化之美", "LLM微调与部署实战"]
+WORDS = ("系统 学习 掌握 核心 算法 原理 实践 项目 数据 模型 深度 机器 分析 工具 入门 进阶 应用 案例 讲解 经典 课程 "
+         "框架 理论 方法 技巧 能力 提升 兴趣 相关 适合 您 的 和 与 帮助 快速 全面 深入 结合 实际 场景 内容 推荐 基础 "
+         "知识 Python PyTorch SQL 可视化 神经网络 ， 、").split()
+PREAMBLES = [
+    "```json\n",
+    "以下是为您生成的5条个性化推荐：\n\n```json\n",
+    "根据您对机器学习和数据分析的兴趣，以下是5条有针对性的推荐，每条都包含标题、简短描述和推荐理由：\n\n```json\n",
+]
+FORMATS = {
+    "紧凑": {},
+    "缩进2": {"indent": 2},
+    "缩进4": {"indent": 4},
+}
+
+
+def random_text(rng: random.Random, low: int, high: int) -> str:
+    """长度在 [low, high] 字符之间的随机文本"""
+    target = rng.randint(low, high)
+    text = ""
+    while len(text) < target:
+        text += rng.choice(WORDS)
+    return text[:target]
+
+
+def per_item_tokens(tokenizer, rng: random.Random, desc_max: int, reason_max: int, **dump_kwargs) -> np.ndarray:
+    """每个样本 RECOMMENDATION_NUM 条推荐的平均每条token数"""
+    counts = []
+    for _ in range(SAMPLES):
+        items = [{"title": rng.choice(TITLES), "description": random_text(rng, 6, desc_max),
+                  "reason": random_text(rng, 8, reason_max)} for _ in range(RECOMMENDATION_NUM)]
+        text = json.dumps(items, ensure_ascii=False, **dump_kwargs)
+        counts.append(len(tokenizer(text, add_special_tokens=False)["input_ids"]) / RECOMMENDATION_NUM)
+    return np.array(counts)
+
+
+def main():
+    tokenizer = AutoTokenizer.from_pretrained(sys.argv[1] if len(sys.argv) > 1 else MODEL_NAME)
+    print(f"配置: 每条 {GENERATION_TOKENS_PER_ITEM} token，开头 {GENERATION_PREAMBLE_TOKENS} token，"
+          f"max_new_tokens={GENERATION_MAX_NEW_TOKENS}")
+    print(f"{'字数':>10} | {'格式':>4} | {'平均':>6} | {'p95':>6} | {'p99':>6} | {'最大':>6}")
+    print("-" * 56)
+    rng = random.Random(0)
+    for label, desc_max, reason_max in [("限制内", 20, 30), ("超出1.5倍", 30, 45)]:
+        for name, dump_kwargs in FORMATS.items():
+            counts = per_item_tokens(tokenizer, rng, desc_max, reason_max, **dump_kwargs)
+            print(f"{label:>10} | {name:>4} | {counts.mean():>6.1f} | {np.percentile(counts, 95):>6.1f} | "
+                  f"{np.percentile(counts, 99):>6.1f} | {counts.max():>6.1f}")
+    for preamble in PREAMBLES:
+        print(f"开头 {len(tokenizer(preamble, add_special_tokens=False)['input_ids']):>3} token: {preamble!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+兴趣图谱内存占用基准测试
+
+对比两种存储引擎在不同规模下的单用户内存占用：
+  - networkx: InterestGraph (nx.DiGraph + 并行字典 + 排序索引)
+  - compact:  CompactInterestGraph (整数槽位 + NumPy数组 + 排序边键)
+
+每个规模构造 n 个节点、约 2n 条边，用 tracemalloc 统计构造过程中的净分配量。
+
+用法：
+  python benchmarks/bench_graph_memory.py
+"""
+
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.interest_graph import InterestGraph
+from src.compact_graph import CompactInterestGraph
+
+SIZES = [100, 1_000, 10_000]
+EDGES_PER_NODE = 2
+
+
+def build(graph_cls, n: int):
+    """直接写入节点和边 (绕开 MAX_GRAPH_SIZE 修剪)"""
+    rng = random.Random(n)
+    graph = graph_cls(f"mem_{n}")
+    now = time.time()
+    node_ids = [f"query:兴趣主题_{i}" for i in range(n)]
+    for node_id in node_ids:
+        graph._create_node(node_id, "query", node_id.split(":", 1)[1])
+        graph._set_node(node_id, rng.random(), now)
+        graph._touch(node_id)
+    for _ in range(n * EDGES_PER_NODE):
+        graph._set_edge(rng.choice(node_ids), rng.choice(node_ids), rng.random())
+    return graph
+
+
+def measure(graph_cls, n: int) -> int:
+    """构造图谱的净内存分配 (字节)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    graph = build(graph_cls, n)
+    if isinstance(graph, CompactInterestGraph):
+        graph._flush_tail()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del graph
+    return after - before
+
+
+def main():
+    print(f"{'节点数':>8} | {'networkx(KB)':>13} | {'compact(KB)':>12} | {'字节/节点 nx':>12} | {'字节/节点 compact':>16} | {'压缩比':>6}")
+    print("-" * 86)
+    for n in SIZES:
+        nx_bytes = measure(InterestGraph, n)
+        compact_bytes = measure(CompactInterestGraph, n)
+        print(f"{n:>8} | {nx_bytes / 1024:>13.1f} | {compact_bytes / 1024:>12.1f} | "
+              f"{nx_bytes / n:>12.0f} | {compact_bytes / n:>16.0f} | {nx_bytes / compact_bytes:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
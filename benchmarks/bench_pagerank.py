@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+个性化PageRank基准测试
+
+分别测量 get_related_interests 的三部分开销：
+  - build:  图谱修改后重建转移矩阵 (每个版本一次)
+  - solve:  转移矩阵已缓存时的幂迭代 (时间桶切换或参数变化时)
+  - cached: 同一版本、同一时间桶内的重复读取
+
+用法：
+  python benchmarks/bench_pagerank.py
+"""
+
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.compact_graph import CompactInterestGraph
+from src.interest_graph import InterestGraph
+
+SIZES = [1_000, 10_000]
+EDGES_PER_NODE = 3
+REPEAT = 50
+
+
+def build_graph(cls, n: int) -> InterestGraph:
+    """构造含n个节点、约 3n 条边的图谱 (直接写入存储，绕开 MAX_GRAPH_SIZE 修剪)"""
+    rng = random.Random(n)
+    graph = cls(f"bench_{n}")
+    now = time.time()
+    for i in range(n):
+        node_id = f"query:topic_{i}"
+        graph._create_node(node_id, "query", f"topic_{i}")
+        graph._set_node(node_id, rng.random(), now - rng.random() * 30 * 86400)
+    for i in range(n):
+        for _ in range(EDGES_PER_NODE):
+            graph._set_edge(f"query:topic_{i}", f"query:topic_{rng.randrange(n)}", rng.random())
+    return graph
+
+
+def time_per_call(fn, repeat: int) -> float:
+    """单次调用的平均耗时 (微秒)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    print(f"{'引擎':>10} | {'节点数':>8} | {'重建矩阵(µs)':>14} | {'幂迭代(µs)':>12} | {'缓存命中(µs)':>14}")
+    print("-" * 72)
+    for cls in (InterestGraph, CompactInterestGraph):
+        for n in SIZES:
+            graph = build_graph(cls, n)
+            now = time.time()
+
+            def build():
+                graph._read_cache.clear()
+                graph._transition_matrix()
+
+            def solve():
+                graph._build_related(10, 5, False, now)
+
+            build_us = time_per_call(build, max(REPEAT // 10, 3))
+            graph._transition_matrix()
+            solve_us = time_per_call(solve, REPEAT)
+            graph.get_related_interests(top_k=10)
+            cached_us = time_per_call(lambda: graph.get_related_interests(top_k=10), REPEAT)
+            print(f"{cls.__name__[:10]:>10} | {n:>8} | {build_us:>14.0f} | {solve_us:>12.0f} | {cached_us:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
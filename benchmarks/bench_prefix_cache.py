@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+静态前缀KV缓存基准测试
+
+AgentA的提示词以固定的指令前缀 (PROMPT_PREFIX) 开头。测量预填充 (编码提示词、
+得到第一个token的logits，即首token延迟的主要部分) 的耗时：
+  - full:   编码完整提示词
+  - prefix: 复用预热时计算的前缀KV缓存，只编码用户相关的后缀
+
+用法：
+  python benchmarks/bench_prefix_cache.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generation_model import load_shared_model
+from benchmarks.bench_continuous_batching import build_prompts
+from src.agents import GenerationBatcher
+from src.agents.agent_a import PROMPT_PREFIX
+from src.agents.generation_batcher import make_cache
+
+BATCH_SIZES = [1, 4, 8]
+REPEAT = 20
+
+
+def prefill(batcher, prompts):
+    """一次预填充，返回耗时 (秒)"""
+    model = batcher.shared_model.model
+    start = time.perf_counter()
+    input_ids, mask, cache, cached = batcher._encode(prompts)
+    past = None if cache is None else make_cache(cache, model.config)
+    position_ids = (mask.cumsum(-1) - 1).clamp(min=0)[:, cached:]
+    with torch.no_grad():
+        model(input_ids=input_ids[:, cached:], attention_mask=mask, position_ids=position_ids,
+              past_key_values=past, use_cache=True, logits_to_keep=1)
+    return time.perf_counter() - start
+
+
+def main():
+    shared = load_shared_model()
+    prompts = build_prompts()
+    full = GenerationBatcher(shared)
+    cached = GenerationBatcher(shared)
+    start = time.perf_counter()
+    cached.warmup(PROMPT_PREFIX)
+    warmup_ms = (time.perf_counter() - start) * 1e3
+
+    tokenizer = shared.tokenizer
+    prefix_tokens = len(tokenizer(PROMPT_PREFIX, add_special_tokens=False)["input_ids"])
+    suffix_tokens = np.mean([len(tokenizer(p[len(PROMPT_PREFIX):], add_special_tokens=False)["input_ids"])
+                             for p in prompts])
+    print(f"前缀 {prefix_tokens} token (预热 {warmup_ms:.1f}ms)，后缀平均 {suffix_tokens:.0f} token")
+    print(f"{'批大小':>6} | {'full(ms)':>9} | {'prefix(ms)':>10} | {'加速':>6}")
+    print("-" * 42)
+    for batch_size in BATCH_SIZES:
+        batches = [prompts[i:i + batch_size] for i in range(0, batch_size * REPEAT, batch_size)]
+        batches = [batch for batch in batches if len(batch) == batch_size][:REPEAT] or [prompts[:batch_size]]
+        prefill(full, batches[0])  # 预热
+        full_ms = np.median([prefill(full, batch) for batch in batches]) * 1e3
+        prefix_ms = np.median([prefill(cached, batch) for batch in batches]) * 1e3
+        print(f"{batch_size:>6} | {full_ms:>9.1f} | {prefix_ms:>10.1f} | {full_ms / prefix_ms:>5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
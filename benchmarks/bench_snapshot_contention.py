@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+读写并发基准测试
+
+N 个读线程反复读取同一用户的推荐上下文和 top 兴趣 (AgentA 的读取路径)，
+1 个写线程持续提交批量修改 (一次交互的 apply_updates)，对比两种方式：
+  - lock:     读写共用一把全局锁，直接读写原图谱
+  - snapshot: 写线程每批修改后发布不可变快照，读线程无锁读取快照
+
+报告读取吞吐、读取延迟 p50/p99 和写入吞吐。
+
+用法：
+  python benchmarks/bench_snapshot_contention.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.interest_graph import create_interest_graph
+
+READERS = [1, 4, 8]
+DURATION = 2.0
+GRAPH_NODES = 500
+
+
+def build_graph(engine: str):
+    graph = create_interest_graph("bench", engine)
+    graph.apply_updates([("add_interest", f"topic_{i}", "query", 0.5) for i in range(GRAPH_NODES)]
+                        + [("add_relation", f"topic_{i}", f"topic_{(i * 7) % GRAPH_NODES}", "query", "query", 0.5)
+                           for i in range(GRAPH_NODES)])
+    return graph
+
+
+def interaction(i: int):
+    """一次交互产生的修改"""
+    query, clicked = f"query_{i % 200}", f"item_{i % 300}"
+    return [("add_interest", query, "query", 0.6),
+            ("add_interest", clicked, "clicked", 0.8),
+            ("add_relation", query, clicked, "query", "clicked", 0.7)]
+
+
+def run(engine: str, mode: str, readers: int):
+    graph = build_graph(engine)
+    lock = threading.Lock()
+    if mode == "snapshot":
+        graph.enable_snapshots()
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+    writes = [0]
+
+    def read_once():
+        if mode == "lock":
+            with lock:
+                graph.get_recommendations_context(top_k=8)
+                graph.get_top_interests(top_k=5)
+        else:
+            view = graph.snapshot()
+            view.get_recommendations_context(top_k=8)
+            view.get_top_interests(top_k=5)
+
+    def reader(out):
+        while not stop.is_set():
+            start = time.perf_counter()
+            read_once()
+            out.append(time.perf_counter() - start)
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            if mode == "lock":
+                with lock:
+                    graph.apply_updates(interaction(i))
+            else:
+                graph.apply_updates(interaction(i))
+            i += 1
+        writes[0] = i
+
+    threads = [threading.Thread(target=reader, args=(latencies[r],)) for r in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    samples = sorted(x for out in latencies for x in out)
+    p50 = samples[len(samples) // 2] * 1e6 if samples else 0.0
+    p99 = samples[int(len(samples) * 0.99)] * 1e6 if samples else 0.0
+    return len(samples) / DURATION, p50, p99, writes[0] / DURATION
+
+
+def main():
+    print(f"{'引擎':>9} | {'方式':>8} | {'读线程':>6} | {'读取/秒':>10} | {'p50(µs)':>9} | {'p99(µs)':>9} | {'写入/秒':>8}")
+    print("-" * 80)
+    for engine in ("networkx", "compact"):
+        for readers in READERS:
+            for mode in ("lock", "snapshot"):
+                reads, p50, p99, writes = run(engine, mode, readers)
+                print(f"{engine:>9} | {mode:>8} | {readers:>6} | {reads:>10.0f} | {p50:>9.0f} | {p99:>9.0f} | {writes:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+top-k 查询基准测试
+
+对比两种获取前k个兴趣的方式：
+  - sort:  对 node_weights 全量排序后切片 (原实现，O(n log n))
+  - index: 从维护好的 RankingIndex 直接读取 (O(k))
+
+用法：
+  python benchmarks/bench_top_k.py
+"""
+
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.interest_graph import InterestGraph
+
+SIZES = [1_000, 10_000, 100_000]
+TOP_K = 10
+REPEAT = 200
+
+
+def build_graph(n: int) -> InterestGraph:
+    """构造含n个节点的图谱 (直接写入节点，绕开 MAX_GRAPH_SIZE 修剪)"""
+    rng = random.Random(n)
+    graph = InterestGraph(f"bench_{n}")
+    now = time.time()
+    for i in range(n):
+        node_id = f"query:topic_{i}"
+        graph.graph.add_node(node_id, category="query", topic=f"topic_{i}")
+        graph._set_node(node_id, rng.random(), now - rng.random() * 30 * 86400)
+    return graph
+
+
+def time_per_call(fn, repeat: int) -> float:
+    """单次调用的平均耗时 (微秒)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    print(f"{'节点数':>10} | {'全量排序(µs)':>14} | {'排序索引(µs)':>14} | {'加速比':>8} | {'单次更新(µs)':>14}")
+    print("-" * 74)
+    for n in SIZES:
+        graph = build_graph(n)
+        now = time.time()
+
+        def sort_top_k():
+            return sorted(graph.node_weights.items(), key=lambda x: x[1], reverse=True)[:TOP_K]
+
+        def index_top_k():
+            return [(node_id, graph.get_weight(node_id, now)) for node_id in graph._top_nodes(TOP_K)]
+
+        repeat = max(REPEAT * 1_000 // n, 5)
+        sort_us = time_per_call(sort_top_k, repeat)
+        index_us = time_per_call(index_top_k, REPEAT)
+
+        # 增量维护代价：随机更新已有节点
+        rng = random.Random(0)
+        updates = [(f"query:topic_{rng.randrange(n)}", rng.random()) for _ in range(REPEAT)]
+        start = time.perf_counter()
+        for node_id, weight in updates:
+            graph._set_node(node_id, weight, now)
+        update_us = (time.perf_counter() - start) / len(updates) * 1e6
+
+        print(f"{n:>10} | {sort_us:>14.1f} | {index_us:>14.1f} | {sort_us / index_us:>7.0f}x | {update_us:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+生成基准测试使用的模型
+
+优先从注册表加载 MODEL_NAME；无法下载时 (离线环境) 退回到随机初始化的
+小型 Qwen2 模型和字符级tokenizer。后者的输出没有意义，但每步解码的计算
+形态 (注意力、KV缓存、批内填充) 与真实模型相同，可用于比较调度方式。
+"""
+
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+from transformers import PreTrainedTokenizerFast, Qwen2Config, Qwen2ForCausalLM
+
+from src.agents.model_registry import SharedModel, create_batcher, get_model_registry
+from src.config import MODEL_NAME
+
+TINY_CONFIG = dict(hidden_size=256, intermediate_size=1024, num_hidden_layers=4,
+                   num_attention_heads=4, num_key_value_heads=2)
+
+
+def tiny_tokenizer() -> PreTrainedTokenizerFast:
+    """字符级tokenizer (ASCII、CJK统一汉字和全角标点各一个token，与Qwen对中文的切分粒度相近)"""
+    chars = [chr(i) for i in range(32, 127)] + [chr(i) for i in range(0x3000, 0x3040)] \
+        + [chr(i) for i in range(0x4E00, 0xA000)] + [chr(i) for i in range(0xFF00, 0xFF60)] + ["\n"]
+    vocab = {"<unk>": 0, "<pad>": 1, "<eos>": 2}
+    vocab.update({ch: i + len(vocab) for i, ch in enumerate(chars)})
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split("", "isolated")
+    tokenizer.decoder = decoders.Fuse()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="<unk>",
+                                   pad_token="<pad>", eos_token="<eos>")
+
+
+def load_shared_model(seed: int = 0) -> SharedModel:
+    """真实模型可用时返回注册表中的共享模型，否则返回小型随机模型"""
+    shared = get_model_registry().get(MODEL_NAME)
+    if shared.available:
+        return shared
+    torch.manual_seed(seed)
+    tokenizer = tiny_tokenizer()
+    config = Qwen2Config(vocab_size=len(tokenizer), eos_token_id=tokenizer.eos_token_id,
+                         pad_token_id=tokenizer.pad_token_id, **TINY_CONFIG)
+    shared = SharedModel(model_name="tiny-qwen2", dtype=torch.float32, device=torch.device("cpu"),
+                         tokenizer=tokenizer, model=Qwen2ForCausalLM(config).eval())
+    shared.batcher = create_batcher(shared)
+    print(f"⚠️  {MODEL_NAME} 不可用，使用随机初始化的小型Qwen2模型 ({TINY_CONFIG})")
+    return shared
+
+
+def add_random_stop(shared: SharedModel, mean_tokens: float, seed: int = 0):
+    """
+    让每条序列每步以 1/mean_tokens 的概率生成EOS，模拟长短不一的输出。
+
+    随机模型几乎不会生成EOS或闭合JSON数组，所有序列都会跑满预算；
+    在 lm_head 输出上强制EOS使输出长度服从几何分布 (各调度方式的分布相同)。
+    """
+    generator = torch.Generator().manual_seed(seed)
+    eos = shared.tokenizer.eos_token_id
+
+    def hook(module, args, output):
+        stop = torch.rand(output.shape[0], generator=generator) < 1.0 / mean_tokens
+        output[stop, -1, eos] = 1e4
+
+    return shared.model.lm_head.register_forward_hook(hook)
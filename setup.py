@@ -23,17 +23,15 @@ setup(
     packages=find_packages(),
     classifiers=[
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.8",
-        "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: 3.10",
         "Programming Language :: Python :: 3.11",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.8",
+    python_requires=">=3.10",
     install_requires=[
-        "torch>=2.0.0",
-        "transformers>=4.30.0",
+        "torch>=2.2.0",
+        "transformers>=5.0.0",
         "networkx>=3.0",
         "numpy>=1.20.0",
     ],
@@ -4,15 +4,19 @@ RecSystem - 源代码包
 包含所有核心模块：
   - config: 系统配置
   - interest_graph: 用户兴趣图谱
+  - compact_graph: 基于NumPy数组的紧凑图谱存储引擎
   - agents: 推荐和评估智能体
   - managers: 演化管理器
 """
-from .interest_graph import InterestGraph
+from .interest_graph import InterestGraph, create_interest_graph
+from .compact_graph import CompactInterestGraph
 from .agents import AgentA, AgentB
 from .managers import EvolutionManager, SessionManager
 
 __all__ = [
     "InterestGraph",
+    "CompactInterestGraph",
+    "create_interest_graph",
     "AgentA",
     "AgentB",
     "EvolutionManager",
@@ -0,0 +1,84 @@
+"""
+邻接排序索引模块
+
+为兴趣图谱的每个节点维护按边权重降序排列的出边和入边列表，支持：
+  1. 写入边权重时增量更新两端的列表 (二分定位，单次 O(log d + d) 搬移)
+  2. 删除节点时移除其所有出边和入边
+  3. 按权重取前k个后继或前驱 (O(k)，无需对邻接表排序)
+
+结构说明：
+  - 每个列表的元素为 (-weight, neighbor)，升序存放即为权重降序，同权重按节点ID排序
+  - _weights 记录 (source, target) 的当前权重，用于定位旧元素；
+    networkx 引擎的边权重只存在这里 (InterestGraph.edge_weights 是它的只读视图)
+"""
+from bisect import bisect_left, insort
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+
+class AdjacencyIndex:
+    """按边权重排序的双向邻接索引"""
+
+    def __init__(self):
+        self._out: Dict[str, List[Tuple[float, str]]] = {}
+        self._in: Dict[str, List[Tuple[float, str]]] = {}
+        self._weights: Dict[Tuple[str, str], float] = {}
+
+    def __len__(self) -> int:
+        """边数"""
+        return len(self._weights)
+
+    @property
+    def weights(self) -> Mapping[Tuple[str, str], float]:
+        """所有边的当前权重 (只读视图)"""
+        return MappingProxyType(self._weights)
+
+    def get_weight(self, source_id: str, target_id: str) -> Optional[float]:
+        """边权重，边不存在时返回None"""
+        return self._weights.get((source_id, target_id))
+
+    @staticmethod
+    def _discard(lists: Dict[str, List[Tuple[float, str]]], node_id: str, item: Tuple[float, str]):
+        entries = lists.get(node_id)
+        if entries is None:
+            return
+        pos = bisect_left(entries, item)
+        if pos < len(entries) and entries[pos] == item:
+            del entries[pos]
+        if not entries:
+            del lists[node_id]
+
+    def set_edge(self, source_id: str, target_id: str, weight: float):
+        """插入边，已存在时更新其权重"""
+        old = self._weights.get((source_id, target_id))
+        if old == weight:
+            return
+        if old is not None:
+            self._discard(self._out, source_id, (-old, target_id))
+            self._discard(self._in, target_id, (-old, source_id))
+        self._weights[(source_id, target_id)] = weight
+        insort(self._out.setdefault(source_id, []), (-weight, target_id))
+        insort(self._in.setdefault(target_id, []), (-weight, source_id))
+
+    def remove_node(self, node_id: str):
+        """删除节点的所有出边和入边"""
+        for neg_weight, target_id in self._out.pop(node_id, ()):
+            self._discard(self._in, target_id, (neg_weight, node_id))
+            del self._weights[(node_id, target_id)]
+        for neg_weight, source_id in self._in.pop(node_id, ()):
+            self._discard(self._out, source_id, (neg_weight, node_id))
+            del self._weights[(source_id, node_id)]
+
+    def clear(self):
+        """清空索引"""
+        self._out.clear()
+        self._in.clear()
+        self._weights.clear()
+
+    def top_successors(self, node_id: str, k: int) -> List[Tuple[str, float]]:
+        """权重最大的k条出边，[(target, weight), ...] 降序"""
+        return [(target_id, -neg_weight) for neg_weight, target_id in self._out.get(node_id, [])[:max(k, 0)]]
+
+    def top_predecessors(self, node_id: str, k: int) -> List[Tuple[str, float]]:
+        """权重最大的k条入边，[(source, weight), ...] 降序"""
+        return [(source_id, -neg_weight) for neg_weight, source_id in self._in.get(node_id, [])[:max(k, 0)]]
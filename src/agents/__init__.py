@@ -4,9 +4,19 @@
 包含：
   - AgentA: 推荐智能体
   - AgentB: 评估智能体
+  - ModelRegistry: 进程级共享模型注册表
+  - GenerationBatcher: 并发生成请求的微批处理器
+  - ContinuousBatcher: 迭代级调度的连续批处理器
+  - RecommendationCache: 推荐结果的LRU+TTL缓存
 """
 
 from .agent_a import AgentA
 from .agent_b import AgentB
+from .generation_batcher import GenerationBatcher
+from .continuous_batcher import ContinuousBatcher
+from .model_registry import ModelRegistry, SharedModel, create_batcher, get_model_registry
+from .recommendation_cache import RecommendationCache, get_recommendation_cache
 
-__all__ = ['AgentA', 'AgentB']
+__all__ = ['AgentA', 'AgentB', 'ModelRegistry', 'SharedModel', 'GenerationBatcher',
+           'ContinuousBatcher', 'create_batcher', 'get_model_registry', 'RecommendationCache',
+           'get_recommendation_cache']
@@ -5,45 +5,54 @@
 使用Qwen2.5-0.5B-Instruct LLM生成自然语言推荐。
 """
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
-import torch
 from typing import List, Dict
 from src.interest_graph import InterestGraph
-from src.config import DEVICE, MODEL_NAME, RECOMMENDATION_NUM
+from src.cooccurrence import CooccurrenceGraph
+from src.config import MODEL_NAME, RECOMMENDATION_NUM, COOCCURRENCE_CANDIDATES
+from src.agents.model_registry import ModelRegistry, get_model_registry
+from src.agents.prompts import PROMPT_PREFIX
+from src.agents.recommendation_cache import RecommendationCache, get_recommendation_cache
 import json
 
 
 class AgentA:
     """推荐智能体"""
     
-    def __init__(self):
-        try:
-            self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-            self.model = AutoModelForCausalLM.from_pretrained(
-                MODEL_NAME,
-                torch_dtype=torch.float16 if DEVICE.type == "cuda" else torch.float32,
-                device_map=DEVICE
-            )
-        except Exception as e:
-            print(f"⚠️  模型加载失败: {e}，使用模拟模式")
-            self.tokenizer = None
-            self.model = None
+    def __init__(self, registry: ModelRegistry = None, cache: RecommendationCache = None):
+        # 模型权重由进程级注册表共享，每个用户的AgentA只保存自身状态
+        registry = registry or get_model_registry()
+        self.shared_model = registry.get(MODEL_NAME)
+        self.tokenizer = self.shared_model.tokenizer
+        self.model = self.shared_model.model
+        # 生成结果缓存同样进程级共享，兴趣相近的用户可以互相命中
+        self.cache = cache if cache is not None else get_recommendation_cache()
         
         self.version = 0
         self.total_recommendations = 0
         self.recommendation_history = []
+        self.cache_hits = 0
+        self.cache_misses = 0
         
-    def generate_recommendations(self, user_query: str, interest_graph: InterestGraph) -> List[Dict]:
-        """生成推荐"""
-        interest_context = interest_graph.get_recommendations_context(top_k=8)
-        top_interests = interest_graph.get_top_interests(top_k=5)
+    def generate_recommendations(self, user_query: str, interest_graph: InterestGraph,
+                                 cooccurrence: CooccurrenceGraph = None) -> List[Dict]:
+        """生成推荐 (提供共现图谱时，其他用户的共同点击作为额外候选参与排序)"""
+        # 启用快照的图谱返回不可变快照，与写入方并发时无需加锁
+        view = interest_graph.snapshot()
+        top_interests = view.get_top_interests(top_k=5)
         
-        prompt = self._build_prompt(user_query, interest_context, top_interests)
-        
-        if self.model is not None:
-            recommendations = self._generate_with_model(prompt, user_query)
+        # 相同查询、相近兴趣、同一版本的生成结果直接复用
+        key = self.cache.make_key(user_query, top_interests, self.version)
+        recommendations = self.cache.get(key)
+        if recommendations is not None:
+            self.cache_hits += 1
         else:
-            recommendations = self._generate_mock_recommendations(user_query, top_interests)
+            self.cache_misses += 1
+            recommendations = self._generate(user_query, view, top_interests)
+            self.cache.put(key, recommendations)
+        
+        if cooccurrence is not None:
+            recommendations = self._merge_candidates(
+                recommendations, self._cooccurrence_candidates(cooccurrence, user_query, top_interests))
         
         recommendations = self._rank_recommendations(recommendations, user_query, top_interests)
         
@@ -56,6 +65,14 @@ class AgentA:
         
         return recommendations[:RECOMMENDATION_NUM]
     
+    def _generate(self, user_query: str, view, top_interests) -> List[Dict]:
+        """构造提示词并生成推荐 (模型不可用时生成模拟推荐)"""
+        if self.model is None:
+            return self._generate_mock_recommendations(user_query, top_interests)
+        interest_context = view.get_recommendations_context(top_k=8)
+        prompt = self._build_prompt(user_query, interest_context, top_interests)
+        return self._generate_with_model(prompt, user_query)
+    
     def _build_prompt(self, user_query: str, interest_context: str, top_interests) -> str:
         """构造提示词"""
         # top_interests 是 List[Tuple[str, float]] 格式
@@ -64,41 +81,24 @@ class AgentA:
         else:
             interests_str = ", ".join(list(top_interests.keys())[:5])
         
-        prompt = f"""你是一个专业的个性化推荐系统。
-用户的主要兴趣包括: {interest_context}
+        # 指令和输出格式是固定前缀 (其KV缓存在预热时计算一次)，只有用户相关的后缀每次编码
+        prompt = PROMPT_PREFIX + f"""用户的主要兴趣包括: {interest_context}
 用户最重视的兴趣领域: {interests_str}
 
-用户当前的需求是: {user_query}
-
-请根据用户的兴趣和需求，生成5条有针对性的推荐。
-每条推荐需要包含:
-1. 标题 (title)
-2. 简短描述 (description, 20字以内)
-3. 推荐理由 (reason, 30字以内)
-
-输出格式为JSON数组。"""
+用户当前的需求是: {user_query}"""
         return prompt
     
     def _generate_with_model(self, prompt: str, user_query: str) -> List[Dict]:
         """使用模型生成推荐"""
         try:
-            inputs = self.tokenizer(prompt, return_tensors="pt").to(DEVICE)
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_length=512,
-                    temperature=0.7,
-                    top_p=0.95,
-                    do_sample=True
-                )
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            # 与其他用户的并发请求合并成一批生成，阻塞到本条结果返回
+            response = self.shared_model.batcher.generate(prompt)
             
+            # response 只含新生成的文本，生成在第一个JSON数组闭合时停止
             try:
                 start = response.find('[')
-                end = response.rfind(']')
-                if start != -1 and end != -1:
-                    json_str = response[start:end+1]
-                    recommendations = json.loads(json_str)
+                if start != -1:
+                    recommendations, _ = json.JSONDecoder().raw_decode(response, start)
                 else:
                     recommendations = self._generate_mock_recommendations(user_query, {})
             except json.JSONDecodeError:
@@ -109,6 +109,25 @@ class AgentA:
             print(f"⚠️  模型生成失败: {e}")
             return self._generate_mock_recommendations(user_query, {})
     
+    def _cooccurrence_candidates(self, cooccurrence: CooccurrenceGraph, user_query: str,
+                                 top_interests) -> List[Dict]:
+        """以查询和用户的top兴趣为种子，从共现图谱取其他用户的共同点击 (不调用模型)"""
+        if COOCCURRENCE_CANDIDATES <= 0:
+            return []
+        seeds = {node_id.split(":", 1)[-1]: weight for node_id, weight in top_interests}
+        seeds[user_query] = 1.0
+        return [
+            {"title": title, "description": "相似用户的共同点击", "reason": "与您的兴趣经常一起被点击",
+             "source": "cooccurrence"}
+            for title, _ in cooccurrence.top_k(seeds, k=COOCCURRENCE_CANDIDATES)
+        ]
+    
+    @staticmethod
+    def _merge_candidates(recommendations: List[Dict], candidates: List[Dict]) -> List[Dict]:
+        """追加候选，跳过标题重复的"""
+        titles = {rec.get("title") for rec in recommendations}
+        return recommendations + [c for c in candidates if c["title"] not in titles]
+    
     def _generate_mock_recommendations(self, user_query: str, top_interests: Dict) -> List[Dict]:
         """生成模拟推荐"""
         recommendation_templates = {
@@ -159,16 +178,39 @@ class AgentA:
         return sorted(recommendations, key=lambda x: x.get("score", 0), reverse=True)
     
     def get_stats(self) -> Dict:
-        """获取统计信息"""
+        """获取统计信息 (cache 为进程共享缓存的统计)"""
+        lookups = self.cache_hits + self.cache_misses
         return {
             "version": self.version,
             "total_recommendations": self.total_recommendations,
-            "recent_history": self.recommendation_history[-10:]
+            "recent_history": self.recommendation_history[-10:],
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "cache": self.cache.get_stats()
         }
     
+    def to_dict(self) -> Dict:
+        """序列化可持久化的状态 (模型权重由注册表共享，不保存)"""
+        return {
+            "version": self.version,
+            "total_recommendations": self.total_recommendations,
+            "recommendation_history": list(self.recommendation_history)
+        }
+    
+    def load_dict(self, data: Dict):
+        """恢复 to_dict 保存的状态"""
+        self._set_version(data.get("version", 0))
+        self.total_recommendations = data.get("total_recommendations", 0)
+        self.recommendation_history = list(data.get("recommendation_history", []))
+    
+    def _set_version(self, version: int):
+        """切换版本 (缓存键含版本号，旧版本的条目不再命中，由LRU/TTL自然淘汰)"""
+        self.version = version
+    
     def update_version(self):
         """更新版本号"""
-        self.version += 1
+        self._set_version(self.version + 1)
     
     def set_improvements(self, improvements: Dict):
         """应用改进"""
@@ -176,4 +218,4 @@ class AgentA:
             pass
         if improvements.get("add_filters"):
             pass
-        self.version += 1
+        self._set_version(self.version + 1)
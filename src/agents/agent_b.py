@@ -280,3 +280,25 @@ class AgentB:
             "total_improvement_rules": len(self.improvement_rules),
             "recent_feedback": self.feedback_history[-3:] if self.feedback_history else []
         }
+    
+    def to_dict(self) -> Dict:
+        """序列化版本、反馈历史和评估指标"""
+        return {
+            "version": self.version,
+            "feedback_history": list(self.feedback_history),
+            "performance_metrics": {key: list(values) for key, values in self.performance_metrics.items()},
+            "improvement_rules": list(self.improvement_rules),
+            "evolution_stages": self.evolution_stages
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AgentB":
+        """从 to_dict 的结果恢复"""
+        agent = cls()
+        agent.version = data.get("version", 0)
+        agent.feedback_history = list(data.get("feedback_history", []))
+        for key, values in data.get("performance_metrics", {}).items():
+            agent.performance_metrics[key] = list(values)
+        agent.improvement_rules = list(data.get("improvement_rules", []))
+        agent.evolution_stages = data.get("evolution_stages", 0)
+        return agent
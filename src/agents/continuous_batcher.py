@@ -0,0 +1,254 @@
+"""
+连续批处理 (迭代级调度)
+
+静态微批 (generation_batcher.py) 要等批内最长的序列结束才一起返回，先写完
+JSON数组的序列只能在批内空转。连续批处理器自己运行解码循环，以单步解码为
+调度粒度：
+  1. 最多 max_batch_size 条序列同时解码，每条占KV缓存的一行 (槽位)
+  2. 每步解码前把排队的请求整批预填充后并入缓存，不等正在解码的序列结束
+  3. 序列生成EOS、闭合JSON数组或用完token预算后立即交还结果并释放槽位
+  4. 所有行左填充到相同的缓存长度 (掩码标记填充位置，位置编码按真实token计数)，
+     有序列退出后裁掉所有行共有的左填充
+
+采样与 generate 一致：依次应用重复惩罚、温度、top-k、top-p，GENERATE_KWARGS 中
+未给出的参数取模型生成配置 (generation_config) 中的值。GENERATE_KWARGS 含有其他
+参数时构造即报错 (改用静态微批)，不会静默忽略。
+
+接口与 GenerationBatcher 相同，由 GENERATION_SCHEDULER 选择。
+"""
+import queue
+from typing import Dict, List, Optional
+
+import torch
+import torch.nn.functional as F
+from transformers import RepetitionPenaltyLogitsProcessor
+
+from src.agents.generation_batcher import GENERATE_KWARGS, GenerationBatcher, make_cache
+from src.agents.json_stream import JsonArrayTracker
+
+# 解码循环实现了的生成参数
+SUPPORTED_KWARGS = {"max_new_tokens", "do_sample", "temperature", "top_k", "top_p", "repetition_penalty"}
+
+
+class _Sequence:
+    """解码中的一条请求"""
+
+    __slots__ = ("future", "prompt_ids", "tokens", "budget", "tracker")
+
+    def __init__(self, future, prompt_ids: List[int], budget: int):
+        self.future = future
+        self.prompt_ids = prompt_ids  # 重复惩罚要计入提示词中的token
+        self.tokens: List[int] = []
+        self.budget = budget
+        self.tracker = JsonArrayTracker()
+
+
+def _pad_left(tensor: torch.Tensor, n: int) -> torch.Tensor:
+    """在序列维 (倒数第二维) 左侧补 n 个0"""
+    return F.pad(tensor, (0, 0, n, 0)) if n else tensor
+
+
+class ContinuousBatcher(GenerationBatcher):
+    """
+    迭代级调度的连续批处理器。
+
+    Attributes:
+        shared_model (SharedModel): 共享模型句柄
+        max_batch_size (int): 同时解码的最大序列数 (槽位数)
+        max_wait (float): 空闲时第一条请求到达后等待更多请求一起预填充的最长时间 (秒)
+    """
+
+    def __init__(self, shared_model, *args, **kwargs):
+        unsupported = set(GENERATE_KWARGS) - SUPPORTED_KWARGS
+        if unsupported:
+            raise ValueError(f"连续批处理不支持生成参数 {sorted(unsupported)}，请使用 GENERATION_SCHEDULER=\"static\"")
+        super().__init__(shared_model, *args, **kwargs)
+        # 解码状态，只在后台线程中访问
+        self._active: List[_Sequence] = []
+        self._cache: Optional[List] = None  # 每层 (keys, values)，形状 [行, 头, 缓存长度, 维]
+        self._mask: Optional[torch.Tensor] = None  # [行, 缓存长度]，1为真实token
+        self._next: Optional[torch.Tensor] = None  # [行]，已采样、尚未输入模型的token
+        self._eos = set()
+        self._top_k = None
+        self._penalty: Optional[RepetitionPenaltyLogitsProcessor] = None
+
+        self.steps = 0
+        self.slot_steps = 0
+        self.tokens = 0
+
+    # ===== 解码循环 =====
+
+    def _run(self):
+        generation_config = getattr(self.shared_model.model, "generation_config", None)
+        eos = getattr(generation_config, "eos_token_id", None)
+        self._eos = set(eos if isinstance(eos, (list, tuple)) else [eos])
+        self._eos.add(self.shared_model.tokenizer.eos_token_id)
+        self._eos.discard(None)
+        # 未显式指定 top_k、重复惩罚时与 generate 一样使用模型生成配置中的值
+        self._top_k = GENERATE_KWARGS.get("top_k", getattr(generation_config, "top_k", None))
+        penalty = GENERATE_KWARGS.get("repetition_penalty", getattr(generation_config, "repetition_penalty", None))
+        self._penalty = RepetitionPenaltyLogitsProcessor(penalty) if penalty and penalty != 1.0 else None
+
+        stopping = False
+        while True:
+            if self._active:
+                pending = []
+            else:
+                if stopping:
+                    break
+                first = self._queue.get()
+                if first is None:
+                    break
+                pending = self._collect(first)
+            while not stopping and len(self._active) + len(pending) < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                else:
+                    pending.append(item)
+            pending = [(prompt, future) for prompt, future in pending if future.set_running_or_notify_cancel()]
+            try:
+                if pending:
+                    self._admit(pending)
+                if self._active:
+                    self._step()
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                for seq in self._active:
+                    if not seq.future.done():  # 刚加入的序列已在上面处理
+                        seq.future.set_exception(e)
+                self._reset()
+
+    def _forward(self, input_ids, mask, position_ids, cache=None, logits_to_keep=0):
+        shared = self.shared_model
+        past = None if cache is None else make_cache(cache, shared.model.config)
+        with shared.lock, torch.no_grad():
+            out = shared.model(input_ids=input_ids, attention_mask=mask, position_ids=position_ids,
+                               past_key_values=past, use_cache=True, logits_to_keep=logits_to_keep)
+        cache = [(layer.keys, layer.values) for layer in out.past_key_values.layers]
+        return out.logits[:, -1], cache
+
+    def _admit(self, items: List):
+        """整批预填充新请求 (以前缀开头时从前缀缓存继续)，采样第一个token，未结束的并入解码状态"""
+        input_ids, mask, prefix_cache, cached = self._encode([prompt for prompt, _ in items])
+        # 有前缀缓存时只编码后缀
+        position_ids = (mask.cumsum(-1) - 1).clamp(min=0)[:, cached:]
+        logits, cache = self._forward(input_ids[:, cached:], mask, position_ids, prefix_cache, logits_to_keep=1)
+        budget = max(1, GENERATE_KWARGS["max_new_tokens"])
+        seqs = [_Sequence(future, [t for t, m in zip(ids, row_mask) if m], budget)
+                for (_, future), ids, row_mask in zip(items, input_ids.tolist(), mask.tolist())]
+        self.requests += len(seqs)
+        self.batches += 1
+
+        tokens = self._sample(logits, seqs)
+        keep = [i for i, done in enumerate(self._record(seqs, tokens)) if not done]
+        if not keep:
+            return
+        if len(keep) < len(seqs):
+            index = torch.tensor(keep, device=mask.device)
+            cache = [(k[index], v[index]) for k, v in cache]
+            mask, tokens = mask[index], tokens[index]
+            seqs = [seqs[i] for i in keep]
+
+        if not self._active:
+            self._cache, self._mask, self._next = cache, mask, tokens
+        else:
+            # 已有行和新行左填充到相同长度后拼接
+            old_len, new_len = self._mask.shape[1], mask.shape[1]
+            length = max(old_len, new_len)
+            self._cache = [
+                (torch.cat([_pad_left(k0, length - old_len), _pad_left(k1, length - new_len)]),
+                 torch.cat([_pad_left(v0, length - old_len), _pad_left(v1, length - new_len)]))
+                for (k0, v0), (k1, v1) in zip(self._cache, cache)
+            ]
+            self._mask = torch.cat([F.pad(self._mask, (length - old_len, 0)), F.pad(mask, (length - new_len, 0))])
+            self._next = torch.cat([self._next, tokens])
+        self._active.extend(seqs)
+        self.largest_batch = max(self.largest_batch, len(self._active))
+
+    def _step(self):
+        """所有活跃序列解码一步，退出已结束的序列"""
+        self._mask = torch.cat([self._mask, self._mask.new_ones(len(self._active), 1)], dim=1)
+        position_ids = self._mask.sum(-1, keepdim=True) - 1
+        logits, self._cache = self._forward(self._next[:, None], self._mask, position_ids, self._cache)
+        self.steps += 1
+        self.slot_steps += len(self._active)
+
+        self._next = self._sample(logits, self._active)
+        finished = self._record(self._active, self._next)
+        keep = [i for i, done in enumerate(finished) if not done]
+        if len(keep) == len(self._active):
+            return
+        if not keep:
+            self._reset()
+            return
+        index = torch.tensor(keep, device=self._mask.device)
+        self._active = [self._active[i] for i in keep]
+        self._mask, self._next = self._mask[index], self._next[index]
+        # 裁掉所有行共有的左填充
+        lead = int((self._mask.cumsum(-1) == 0).sum(-1).min())
+        self._mask = self._mask[:, lead:]
+        self._cache = [(k[index, :, lead:], v[index, :, lead:]) for k, v in self._cache]
+
+    def _reset(self):
+        self._active = []
+        self._cache = self._mask = self._next = None
+
+    # ===== 采样与结束判断 =====
+
+    def _sample(self, logits: torch.Tensor, seqs: List[_Sequence]) -> torch.Tensor:
+        """
+        按 GENERATE_KWARGS 的重复惩罚、温度、top-k、top-p 采样 (与 generate 的顺序相同)，
+        不采样时在重复惩罚后取argmax
+        """
+        logits = logits.float()
+        if self._penalty is not None:
+            # 各行的已有token (提示词 + 已生成) 用本行的第一个token补齐到相同长度，重复的token不影响惩罚
+            rows = [seq.prompt_ids + seq.tokens for seq in seqs]
+            width = max(len(row) for row in rows)
+            ids = torch.tensor([row + row[:1] * (width - len(row)) for row in rows], device=logits.device)
+            logits = self._penalty(ids, logits)
+        if not GENERATE_KWARGS.get("do_sample"):
+            return logits.argmax(-1)
+        logits = logits / GENERATE_KWARGS.get("temperature", 1.0)
+        top_k = min(self._top_k or logits.shape[-1], logits.shape[-1])
+        values, order = logits.topk(top_k, dim=-1)  # 降序
+        top_p = GENERATE_KWARGS.get("top_p", 1.0)
+        if top_p < 1.0:
+            probs = values.softmax(-1)
+            # 去掉累计概率 (不含自身) 已达到 top_p 的token，至少保留概率最高的一个
+            values = values.masked_fill(probs.cumsum(-1) - probs >= top_p, float("-inf"))
+        choice = torch.multinomial(values.softmax(-1), 1)
+        return order.gather(-1, choice).squeeze(-1)
+
+    def _record(self, seqs: List[_Sequence], tokens: torch.Tensor) -> List[bool]:
+        """把新token追加到各序列，交还已结束序列的结果，返回每条是否结束"""
+        tokenizer = self.shared_model.tokenizer
+        tokens = tokens.tolist()
+        pieces = tokenizer.batch_decode([[t] for t in tokens])
+        finished = []
+        for seq, token, piece in zip(seqs, tokens, pieces):
+            done = token in self._eos
+            if not done:
+                seq.tokens.append(token)
+                self.tokens += 1
+                done = seq.tracker.feed(piece) or len(seq.tokens) >= seq.budget
+            if done:
+                seq.future.set_result(tokenizer.decode(seq.tokens, skip_special_tokens=True))
+            finished.append(done)
+        return finished
+
+    def get_stats(self) -> Dict:
+        """批处理统计 (batches 为预填充次数)"""
+        stats = super().get_stats()
+        stats.update({
+            "steps": self.steps,
+            "tokens": self.tokens,
+            "avg_active_slots": self.slot_steps / self.steps if self.steps else 0.0,
+        })
+        return stats
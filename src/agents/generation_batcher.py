@@ -0,0 +1,239 @@
+"""
+生成请求微批处理
+
+多个用户同时请求推荐时，逐条调用 generate 只用到一行矩阵乘，CPU的大部分
+吞吐被浪费。批处理器把并发的生成请求合并成一批：
+  1. 调用方提交提示词后阻塞等待自己的结果 (Future)
+  2. 后台线程取到一批的第一条请求后，最多再等待 max_wait 秒或凑满 max_batch_size 条
+  3. 整批左填充后调用一次 generate，只解码新生成的部分，把每条结果交还各自的调用方
+  4. 生成期间到达的请求在队列中累积，上一批结束后立即组成下一批
+
+生成长度：每行的第一个JSON数组闭合后该行立即停止 (_JsonArrayStop)，之后的输出对
+解析没有用处；预算 max_new_tokens 只计新生成的token，由推荐条数和每条的token数决定。
+
+静态前缀：warmup(prefix) 对所有提示词共同的开头 (AgentA的指令部分) 预填充一次并
+保存其KV缓存 (模型加载时由 create_batcher 调用)；预填充失败同样记录，之后对同一前缀
+的调用直接返回，不重复前向计算。整批提示词都以该前缀开头时只编码各自的后缀，前缀的KV缓存按批大小
+扩展后作为 past_key_values 传入；后缀左填充，填充位于前缀和后缀之间，由掩码屏蔽。
+
+每个共享模型 (SharedModel) 一个批处理器，同一进程的所有AgentA共用。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from transformers import DynamicCache, StoppingCriteria, StoppingCriteriaList
+
+from src.agents.json_stream import JsonArrayTracker
+from src.config import GENERATION_MAX_BATCH, GENERATION_MAX_WAIT, GENERATION_MAX_NEW_TOKENS
+
+# 与逐条生成时相同的采样参数
+GENERATE_KWARGS = {
+    "max_new_tokens": GENERATION_MAX_NEW_TOKENS,
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "do_sample": True,
+}
+
+
+def make_cache(tensors: List[Tuple[torch.Tensor, torch.Tensor]], config) -> DynamicCache:
+    """用每层的 (keys, values) 构造 DynamicCache，直接引用张量而不复制"""
+    cache = DynamicCache(config=config)
+    for layer, (keys, values) in zip(cache.layers, tensors):
+        layer.lazy_initialization(keys, values)
+        layer.keys, layer.values = keys, values
+    return cache
+
+
+class _JsonArrayStop(StoppingCriteria):
+    """generate 的停止条件：逐token跟踪每行输出的括号平衡，第一个JSON数组闭合的行结束"""
+
+    def __init__(self, tokenizer, batch_size: int):
+        self.tokenizer = tokenizer
+        self.trackers = [JsonArrayTracker() for _ in range(batch_size)]
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> torch.BoolTensor:
+        pieces = self.tokenizer.batch_decode(input_ids[:, -1:], skip_special_tokens=True)
+        done = [tracker.feed(piece) for tracker, piece in zip(self.trackers, pieces)]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class GenerationBatcher:
+    """
+    把并发的生成请求合并成批的调度器。
+
+    Attributes:
+        shared_model (SharedModel): 共享模型句柄
+        max_batch_size (int): 每批最多的请求数
+        max_wait (float): 批内第一条请求到达后等待更多请求的最长时间 (秒)
+    """
+
+    def __init__(self, shared_model, max_batch_size: int = GENERATION_MAX_BATCH,
+                 max_wait: float = GENERATION_MAX_WAIT):
+        self.shared_model = shared_model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        # (前缀文本, 前缀token, 每层 (keys, values))，批大小为1
+        self._prefix: Optional[Tuple[str, List[int], List[Tuple[torch.Tensor, torch.Tensor]]]] = None
+        self._failed_prefix: Optional[str] = None  # 预填充失败的前缀，不再重试
+
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.prefix_hits = 0
+
+    def submit(self, prompt: str) -> Future:
+        """提交提示词，返回完成后结果为新生成文本 (不含提示词) 的 Future"""
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((prompt, future))
+        return future
+
+    def generate(self, prompt: str, timeout: float = None) -> str:
+        """提交提示词并等待生成文本 (生成失败时抛出原异常)"""
+        return self.submit(prompt).result(timeout)
+
+    # ===== 静态前缀 =====
+
+    @property
+    def prefix(self) -> Optional[str]:
+        """已预填充的静态前缀"""
+        return None if self._prefix is None else self._prefix[0]
+
+    def warmup(self, prefix: str) -> bool:
+        """
+        预填充静态前缀 (同一前缀只做一次，失败也只尝试一次)。
+
+        Returns:
+            bool: 前缀缓存是否可用 (预填充失败时不使用前缀缓存)
+        """
+        if self.prefix == prefix:
+            return True
+        if self._failed_prefix == prefix:
+            return False
+        shared = self.shared_model
+        try:
+            ids = shared.tokenizer(prefix, add_special_tokens=False)["input_ids"]
+            with shared.lock, torch.no_grad():
+                out = shared.model(input_ids=torch.tensor([ids], device=shared.device), use_cache=True,
+                                   logits_to_keep=1)
+        except Exception as e:
+            self._failed_prefix = prefix
+            print(f"⚠️  前缀预填充失败: {e}，不使用前缀缓存")
+            return False
+        self._prefix = (prefix, ids, [(layer.keys, layer.values) for layer in out.past_key_values.layers])
+        return True
+
+    def _encode(self, prompts: List[str]):
+        """
+        编码一批提示词 (左填充)。
+
+        Returns:
+            tuple: (input_ids, attention_mask, 前缀缓存, 前缀长度)。整批都以预填充前缀开头时
+                input_ids 为 前缀 + 后缀，前缀缓存为扩展到批大小的每层 (keys, values)；
+                否则前缀缓存为None，前缀长度为0
+        """
+        shared = self.shared_model
+        tokenizer = shared.tokenizer
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        state = self._prefix
+        if state is None or not all(prompt.startswith(state[0]) for prompt in prompts):
+            # 解码器模型须左填充，使每行的最后一个位置都是真实的提示词末尾
+            inputs = tokenizer(prompts, return_tensors="pt", padding=True, padding_side="left").to(shared.device)
+            return inputs["input_ids"], inputs["attention_mask"], None, 0
+        prefix, prefix_ids, cache = state
+        n = len(prompts)
+        inputs = tokenizer([prompt[len(prefix):] for prompt in prompts], return_tensors="pt", padding=True,
+                           padding_side="left", add_special_tokens=False).to(shared.device)
+        suffix_ids, suffix_mask = inputs["input_ids"], inputs["attention_mask"]
+        input_ids = torch.cat([suffix_ids.new_tensor(prefix_ids).expand(n, -1), suffix_ids], dim=1)
+        mask = torch.cat([suffix_mask.new_ones(n, len(prefix_ids)), suffix_mask], dim=1)
+        self.prefix_hits += n
+        return input_ids, mask, [(k.expand(n, -1, -1, -1), v.expand(n, -1, -1, -1)) for k, v in cache], len(prefix_ids)
+
+    # ===== 后台线程 =====
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="generation-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self, first) -> List:
+        """从第一条请求开始凑一批，遇到停止标记时把它放回队列"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [(prompt, future) for prompt, future in self._collect(first)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                texts = self._generate_batch([prompt for prompt, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+    def _generate_batch(self, prompts: List[str]) -> List[str]:
+        """整批编码后调用一次 generate (以前缀开头时从前缀缓存继续)，返回每条新生成部分的解码文本"""
+        shared = self.shared_model
+        tokenizer = shared.tokenizer
+        input_ids, mask, cache, _ = self._encode(prompts)
+        past = None if cache is None else make_cache(cache, shared.model.config)
+        with shared.lock, torch.no_grad():
+            outputs = shared.model.generate(input_ids=input_ids, attention_mask=mask, past_key_values=past,
+                                            pad_token_id=tokenizer.pad_token_id,
+                                            stopping_criteria=StoppingCriteriaList(
+                                                [_JsonArrayStop(tokenizer, len(prompts))]),
+                                            **GENERATE_KWARGS)
+        self.requests += len(prompts)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(prompts))
+        return tokenizer.batch_decode(outputs[:, input_ids.shape[1]:], skip_special_tokens=True)
+
+    def close(self):
+        """处理完已提交的请求后停止后台线程 (之后提交的请求会启动新线程)"""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def get_stats(self) -> Dict:
+        """批处理统计"""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "max_batch_size": self.max_batch_size,
+            "max_wait": self.max_wait,
+            "prefix_hits": self.prefix_hits,
+        }
@@ -0,0 +1,44 @@
+"""
+流式JSON数组跟踪
+
+逐段接收模型解码出的文本，跟踪第一个JSON数组的括号平衡：
+  - 数组开始前的文字 (包括其中的引号和括号外的内容) 不参与计数
+  - 数组内字符串中的括号不计数，支持转义引号
+  - 最外层 ']' 出现时数组完整，之后的输出对解析没有用处，可以停止解码
+"""
+
+
+class JsonArrayTracker:
+    """JSON数组括号平衡的增量跟踪器"""
+
+    __slots__ = ("depth", "in_string", "escape", "closed")
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.closed = False
+
+    def feed(self, text: str) -> bool:
+        """追加一段解码文本，返回第一个数组是否已完整"""
+        if self.closed:
+            return True
+        for ch in text:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == "[":
+                self.depth += 1
+            elif self.depth:
+                if ch == '"':
+                    self.in_string = True
+                elif ch == "]":
+                    self.depth -= 1
+                    if self.depth == 0:
+                        self.closed = True
+                        return True
+        return False
@@ -0,0 +1,169 @@
+"""
+模型注册表 - 进程级共享的LLM权重池
+
+同一进程内的所有AgentA共享一份tokenizer和模型权重：
+  1. 以 (模型名称, 数据类型, 设备) 为键，每个进程只加载一次
+  2. 加载过程加锁，并发创建用户时不会重复加载
+  3. 加载失败同样缓存，避免每个新用户都重试下载
+  4. 每个模型附带一把生成锁，供共享引用的调用方串行化推理
+  5. 每个模型附带一个批处理器，合并所有AgentA的并发生成请求
+     (静态微批见 generation_batcher.py，连续批处理见 continuous_batcher.py)
+  6. 批处理器创建时预填充AgentA提示词的静态前缀，每个模型只做一次
+
+智能体自身的状态 (版本号、推荐历史) 仍保存在各自的AgentA实例中。
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+from src.agents.generation_batcher import GenerationBatcher
+from src.agents.continuous_batcher import ContinuousBatcher
+from src.agents.prompts import PROMPT_PREFIX
+from src.config import DEVICE, MODEL_NAME, GENERATION_SCHEDULER, PROMPT_PREFIX_CACHE
+
+BATCHERS = {"static": GenerationBatcher, "continuous": ContinuousBatcher}
+
+
+@dataclass
+class SharedModel:
+    """共享模型句柄"""
+    model_name: str
+    dtype: torch.dtype
+    device: torch.device
+    tokenizer: Optional[object] = None
+    model: Optional[object] = None
+    error: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    batcher: Optional[GenerationBatcher] = field(default=None, repr=False)
+
+    @property
+    def available(self) -> bool:
+        """模型是否加载成功"""
+        return self.model is not None and self.tokenizer is not None
+
+
+def create_batcher(shared: SharedModel, scheduler: str = None, prefix: str = None,
+                   **kwargs) -> GenerationBatcher:
+    """
+    创建共享模型的生成批处理器，并预填充静态前缀。
+
+    Args:
+        shared (SharedModel): 共享模型句柄
+        scheduler (str, optional): "static" 或 "continuous"，默认使用 GENERATION_SCHEDULER
+        prefix (str, optional): 预填充的静态前缀，默认在 PROMPT_PREFIX_CACHE 开启时使用
+            PROMPT_PREFIX，传空字符串不预填充
+        **kwargs: 传给批处理器的参数 (max_batch_size, max_wait)
+    """
+    scheduler = scheduler or GENERATION_SCHEDULER
+    if scheduler not in BATCHERS:
+        raise ValueError(f"未知的生成调度方式: {scheduler}")
+    batcher = BATCHERS[scheduler](shared, **kwargs)
+    if prefix is None:
+        prefix = PROMPT_PREFIX if PROMPT_PREFIX_CACHE else ""
+    if prefix:
+        batcher.warmup(prefix)
+    return batcher
+
+
+class ModelRegistry:
+    """进程级模型注册表"""
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str, str], SharedModel] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+
+    @staticmethod
+    def default_dtype(device: torch.device) -> torch.dtype:
+        """根据设备选择默认数据类型"""
+        return torch.float16 if device.type == "cuda" else torch.float32
+
+    @staticmethod
+    def _make_key(model_name: str, dtype: torch.dtype,
+                  device: torch.device) -> Tuple[str, str, str]:
+        return (model_name, str(dtype), str(device))
+
+    def get(self, model_name: str = MODEL_NAME, dtype: torch.dtype = None,
+            device: torch.device = None) -> SharedModel:
+        """
+        获取共享模型，首次调用时加载。
+
+        Args:
+            model_name (str): 模型名称或本地路径
+            dtype (torch.dtype, optional): 权重数据类型，默认按设备选择
+            device (torch.device, optional): 计算设备，默认使用DEVICE
+
+        Returns:
+            SharedModel: 共享模型句柄 (加载失败时 available 为 False)
+        """
+        device = device or DEVICE
+        dtype = dtype or self.default_dtype(device)
+        key = self._make_key(model_name, dtype, device)
+
+        shared = self._models.get(key)
+        if shared is not None:
+            return shared
+
+        # 每个键一把加载锁：不同模型可并行加载，同一模型只加载一次
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            shared = self._models.get(key)
+            if shared is None:
+                shared = self._load(model_name, dtype, device)
+                with self._lock:
+                    self._models[key] = shared
+        return shared
+
+    def _load(self, model_name: str, dtype: torch.dtype,
+              device: torch.device) -> SharedModel:
+        """加载tokenizer和模型"""
+        shared = SharedModel(model_name=model_name, dtype=dtype, device=device)
+        try:
+            shared.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModelForCausalLM.from_pretrained(
+                model_name,
+                torch_dtype=dtype,
+                device_map=device
+            )
+            model.eval()
+            shared.model = model
+            shared.batcher = create_batcher(shared)
+        except Exception as e:
+            shared.tokenizer = None
+            shared.model = None
+            shared.error = str(e)
+            print(f"⚠️  模型加载失败: {e}，使用模拟模式")
+        return shared
+
+    def release(self, model_name: str = MODEL_NAME, dtype: torch.dtype = None,
+                device: torch.device = None) -> bool:
+        """从注册表中移除模型，权重在最后一个引用释放后回收"""
+        device = device or DEVICE
+        dtype = dtype or self.default_dtype(device)
+        with self._lock:
+            return self._models.pop(self._make_key(model_name, dtype, device), None) is not None
+
+    def clear(self):
+        """清空注册表"""
+        with self._lock:
+            self._models.clear()
+            self._key_locks.clear()
+
+    def loaded_models(self) -> Dict[Tuple[str, str, str], bool]:
+        """已注册的模型及其可用状态"""
+        with self._lock:
+            return {key: shared.available for key, shared in self._models.items()}
+
+
+_default_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    """获取进程级默认注册表"""
+    return _default_registry
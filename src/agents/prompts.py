@@ -0,0 +1,16 @@
+"""
+提示词模板
+
+PROMPT_PREFIX 与用户无关，模型加载时由批处理器预填充一次 (见 model_registry.create_batcher)。
+"""
+
+# 所有提示词共同的开头：任务说明和输出格式 (不含任何用户相关内容)
+PROMPT_PREFIX = """你是一个专业的个性化推荐系统。
+请根据用户的兴趣和需求，生成5条有针对性的推荐。
+每条推荐需要包含:
+1. 标题 (title)
+2. 简短描述 (description, 20字以内)
+3. 推荐理由 (reason, 30字以内)
+输出格式为JSON数组。
+
+"""
@@ -0,0 +1,176 @@
+"""
+推荐结果缓存 - LRU + TTL
+
+用户经常重复相同的查询，而每次推荐都要完整运行一次LLM生成 (占请求延迟的绝大部分)。
+缓存位于生成之前，键为：
+  1. 归一化的查询文本 (NFKC、去首尾空白、合并连续空白、小写)
+  2. 用户top兴趣的指纹：兴趣ID和按 RECOMMENDATION_CACHE_WEIGHT_STEP 量化的权重的哈希，
+     权重的微小变化 (如衰减) 不改变指纹
+  3. AgentA.version：智能体演化后旧版本的条目不再命中，由LRU/TTL自然淘汰。
+     不主动删除：同一个键可能被其他仍处于该版本的用户共享
+
+条目数超过上限时淘汰最久未使用的条目；超过TTL的条目在读取时视为未命中并删除。
+同一进程的所有AgentA共用一个缓存 (get_recommendation_cache)，兴趣相同的用户也能共享结果。
+
+可以挂一个跨进程的二级缓存 (backend，见 storage/generation_cache.py)：进程内未命中时
+先查二级缓存，命中的条目连同原写入时间放入进程内缓存 (按原时间过期)；写入和清除
+同时作用于两级。这样一个工作进程的生成结果可以服务同一主机的所有工作进程。
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from src.storage.generation_cache import SQLiteGenerationCache
+from src.config import (RECOMMENDATION_CACHE_SIZE, RECOMMENDATION_CACHE_TTL, RECOMMENDATION_CACHE_WEIGHT_STEP,
+                        RECOMMENDATION_CACHE_DB)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """归一化查询文本 (全角转半角、合并空白、小写)"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query)).strip().lower()
+
+
+def interest_fingerprint(top_interests: Sequence[Tuple[str, float]],
+                         step: float = RECOMMENDATION_CACHE_WEIGHT_STEP) -> str:
+    """top兴趣的指纹 (兴趣ID + 量化权重，保持排名顺序)"""
+    text = "|".join(f"{node_id}:{int(round(weight / step))}" for node_id, weight in top_interests)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class RecommendationCache:
+    """
+    推荐结果的LRU + TTL缓存。
+
+    Attributes:
+        max_size (int): 最多缓存的条目数，0表示不在进程内缓存
+        ttl (float): 条目的有效期 (秒)
+        backend (SQLiteGenerationCache): 跨进程的二级缓存，为None时不使用
+    """
+
+    def __init__(self, max_size: int = RECOMMENDATION_CACHE_SIZE, ttl: float = RECOMMENDATION_CACHE_TTL,
+                 backend: SQLiteGenerationCache = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self._entries: "OrderedDict[Hashable, Tuple[float, Tuple]]" = OrderedDict()  # 最近使用的在末尾
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(user_query: str, top_interests: Sequence[Tuple[str, float]], version: int) -> Tuple:
+        """缓存键：(归一化查询, 兴趣指纹, 智能体版本)"""
+        return normalize_query(user_query), interest_fingerprint(top_interests), version
+
+    def get(self, key: Hashable, now: float = None) -> Optional[List[Dict]]:
+        """
+        读取缓存的推荐 (进程内未命中时查二级缓存)。
+
+        Returns:
+            list: 推荐列表的副本 (调用方可以修改)，未命中或已过期时返回None
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(key, now)
+            if entry is not None:
+                with self._lock:
+                    self._insert(key, entry)
+                    self.backend_hits += 1
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return [dict(rec) for rec in entry[1]]
+
+    def put(self, key: Hashable, recommendations: List[Dict], now: float = None):
+        """写入推荐 (保存副本，同时写入二级缓存)"""
+        if now is None:
+            now = time.time()
+        value = tuple(dict(rec) for rec in recommendations)
+        with self._lock:
+            self._insert(key, (now, value))
+        if self.backend is not None:
+            self.backend.put(key, value, now)
+
+    def _insert(self, key: Hashable, entry: Tuple[float, Tuple]):
+        """放入进程内缓存，超出上限时淘汰最久未使用的条目 (调用方持有锁)"""
+        if self.max_size <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, keys: Iterable[Hashable]) -> int:
+        """删除指定的条目 (如智能体演化前使用过的键，两级都删除)，返回进程内删除的条目数"""
+        keys = list(keys)
+        with self._lock:
+            removed = sum(1 for key in keys if self._entries.pop(key, None) is not None)
+            self.invalidations += removed
+        if self.backend is not None:
+            self.backend.invalidate(keys)
+        return removed
+
+    def clear(self):
+        """清空进程内缓存 (不重置统计，不影响二级缓存)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        """命中率 (含二级缓存命中)、淘汰和过期统计"""
+        lookups = self.hits + self.backend_hits + self.misses
+        stats = {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.backend_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+        if self.backend is not None:
+            stats["backend"] = self.backend.get_stats()
+        return stats
+
+
+_default_cache: Optional[RecommendationCache] = None
+_default_lock = threading.Lock()
+
+
+def get_recommendation_cache() -> RecommendationCache:
+    """获取进程级默认缓存 (首次调用时创建，配置了 RECOMMENDATION_CACHE_DB 时挂上二级缓存)"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                backend = SQLiteGenerationCache(RECOMMENDATION_CACHE_DB) if RECOMMENDATION_CACHE_DB else None
+                _default_cache = RecommendationCache(backend=backend)
+    return _default_cache
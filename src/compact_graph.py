@@ -0,0 +1,477 @@
+"""
+紧凑兴趣图谱存储引擎
+
+与 InterestGraph 接口一致，但用数组代替 networkx 图和多个并行字典：
+  1. 节点ID驻留为整数槽位 (node_id -> slot)，删除后槽位回收复用
+  2. 权重 (float32)、更新时间 (float64, epoch秒)、访问计数 (uint32) 存放在NumPy数组中
+  3. 边以 (src_slot << 32 | dst_slot) 的int64键 + float32权重存储：
+       - 主段按键排序，用二分查找定位 (CSR风格，同一源节点的边连续存放)
+       - 新边先追加到小尾段，尾段满后与主段合并重排
+  4. 边权重只存一份，不存在 networkx 属性与 edge_weights 字典不一致的问题
+
+每个节点的开销约为驻留字符串 + 一个字典项 + 约25字节数组空间，
+适合常驻内存的海量用户场景。
+"""
+import math
+import sys
+import time
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.interest_graph import InterestGraph, _LOG_DECAY_RATE
+from src.config import INTEREST_MIN_WEIGHT
+
+_SLOT_BITS = 32
+_SLOT_MASK = (1 << _SLOT_BITS) - 1
+
+
+class _ArrayView(Mapping):
+    """把节点数组包装成只读字典，兼容 node_weights / last_update / access_count 的读取方式"""
+
+    def __init__(self, owner: "CompactInterestGraph", array_name: str, cast):
+        self._owner = owner
+        self._array_name = array_name
+        self._cast = cast
+
+    def __getitem__(self, node_id: str):
+        slot = self._owner._ids[node_id]
+        return self._cast(getattr(self._owner, self._array_name)[slot])
+
+    def __iter__(self):
+        return iter(self._owner._ids)
+
+    def __len__(self) -> int:
+        return len(self._owner._ids)
+
+
+class _EdgeView(Mapping):
+    """边权重的只读字典视图，键为 (source_id, target_id)"""
+
+    def __init__(self, owner: "CompactInterestGraph"):
+        self._owner = owner
+
+    def __getitem__(self, edge: Tuple[str, str]) -> float:
+        weight = self._owner.get_edge_weight(*edge)
+        if weight is None:
+            raise KeyError(edge)
+        return weight
+
+    def __iter__(self):
+        return iter(self._owner._iter_edges())
+
+    def __len__(self) -> int:
+        return self._owner._n_edges
+
+
+class _CompactGraphView:
+    """提供 InterestGraph.graph 常用的 networkx 只读接口"""
+
+    def __init__(self, owner: "CompactInterestGraph"):
+        self._owner = owner
+
+    def __len__(self) -> int:
+        return len(self._owner)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._owner
+
+    def __iter__(self):
+        return iter(list(self._owner._ids))
+
+    def nodes(self) -> Dict[str, Dict[str, str]]:
+        result = {}
+        for node_id in self._owner._ids:
+            category, _, topic = node_id.partition(":")
+            result[node_id] = {"category": category, "topic": topic}
+        return result
+
+    def edges(self) -> List[Tuple[str, str]]:
+        return [(s, t) for s, t in self._owner._iter_edges()]
+
+    def has_edge(self, source_id: str, target_id: str) -> bool:
+        return self._owner.get_edge_weight(source_id, target_id) is not None
+
+    def successors(self, node_id: str):
+        return iter(self._owner.successors(node_id))
+
+    def predecessors(self, node_id: str):
+        return iter(self._owner.predecessors(node_id))
+
+    def number_of_edges(self) -> int:
+        return self._owner._n_edges
+
+
+class CompactInterestGraph(InterestGraph):
+    """
+    基于NumPy数组的紧凑兴趣图谱。
+
+    公开接口与 InterestGraph 相同；node_weights、edge_weights、last_update、
+    access_count 和 graph 为只读视图，写入须通过 add_interest / add_relation。
+    """
+
+    TAIL_CAPACITY = 64  # 边尾段容量，满后合并到主段
+    GRAPH_BYTES = 3000
+    NODE_BYTES = 180
+    EDGE_BYTES = 12
+
+    def __init__(self, user_id: str, capacity: int = 16, eviction_policy=None):
+        """
+        初始化空的紧凑兴趣图谱。
+
+        Args:
+            user_id (str): 用户唯一标识
+            capacity (int): 初始节点容量，不足时按倍数扩容
+            eviction_policy (str | EvictionPolicy, optional): 淘汰策略
+        """
+        self._capacity = capacity
+        super().__init__(user_id, eviction_policy=eviction_policy)
+
+    def _init_storage(self):
+        # 节点表
+        self._ids: Dict[str, int] = {}
+        self._names: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._weights = np.zeros(self._capacity, dtype=np.float32)
+        self._timestamps = np.zeros(self._capacity, dtype=np.float64)
+        self._access = np.zeros(self._capacity, dtype=np.uint32)
+
+        # 边表：排序主段 + 追加尾段
+        self._edge_keys = np.empty(0, dtype=np.int64)
+        self._edge_w = np.empty(0, dtype=np.float32)
+        self._tail_keys = np.empty(self.TAIL_CAPACITY, dtype=np.int64)
+        self._tail_w = np.empty(self.TAIL_CAPACITY, dtype=np.float32)
+        self._n_tail = 0
+
+    # ===== 兼容视图 =====
+
+    @property
+    def graph(self) -> _CompactGraphView:
+        return _CompactGraphView(self)
+
+    @property
+    def node_weights(self) -> Mapping:
+        return _ArrayView(self, "_weights", float)
+
+    @property
+    def last_update(self) -> Mapping:
+        return _ArrayView(self, "_timestamps", float)
+
+    @property
+    def access_count(self) -> Mapping:
+        return _ArrayView(self, "_access", int)
+
+    @property
+    def edge_weights(self) -> Mapping:
+        return _EdgeView(self)
+
+    @property
+    def _n_edges(self) -> int:
+        return len(self._edge_keys) + self._n_tail
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._ids
+
+    # ===== 节点存储 =====
+
+    def _create_node(self, node_id: str, category: str, topic: str):
+        if self._free:
+            slot = self._free.pop()
+            self._names[slot] = node_id
+        else:
+            slot = len(self._names)
+            if slot >= len(self._weights):
+                self._grow(max(2 * len(self._weights), 16))
+            self._names.append(node_id)
+        self._ids[node_id] = slot
+        self._weights[slot] = 0.0
+        self._timestamps[slot] = 0.0
+        self._access[slot] = 0
+
+    def _grow(self, capacity: int):
+        """扩容节点数组"""
+        for name in ("_weights", "_timestamps", "_access"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _set_node(self, node_id: str, weight: float, timestamp: float):
+        slot = self._ids[node_id]
+        self._weights[slot] = weight
+        self._timestamps[slot] = timestamp
+
+    def _touch(self, node_id: str):
+        self._access[self._ids[node_id]] += 1
+
+    def get_weight(self, node_id: str, now: float = None) -> float:
+        slot = self._ids.get(node_id)
+        if slot is None:
+            return 0.0
+        if now is None:
+            now = time.time()
+        elapsed = max(now - float(self._timestamps[slot]), 0.0)
+        return float(self._weights[slot]) * math.exp(_LOG_DECAY_RATE * elapsed)
+
+    def _live_slots(self) -> np.ndarray:
+        """所有存活节点的槽位"""
+        return np.fromiter(self._ids.values(), dtype=np.int64, count=len(self._ids))
+
+    def _rank_keys(self, slots: np.ndarray) -> np.ndarray:
+        """槽位的排序键 ln(w) - t × 衰减率 (与当前时间无关)"""
+        return (np.log(np.maximum(self._weights[slots].astype(np.float64), 1e-12))
+                - _LOG_DECAY_RATE * self._timestamps[slots])
+
+    def _top_nodes(self, top_k: int) -> List[str]:
+        """向量化计算排序键后用 argpartition 取前k个"""
+        if top_k <= 0 or not self._ids:
+            return []
+        slots = self._live_slots()
+        keys = self._rank_keys(slots)
+        if top_k < len(slots):
+            part = np.argpartition(-keys, top_k - 1)[:top_k]
+        else:
+            part = np.arange(len(slots))
+        order = part[np.argsort(-keys[part], kind="stable")]
+        return [self._names[slot] for slot in slots[order]]
+
+    def _min_rank_key(self) -> float:
+        """向量化计算所有存活节点排序键的最小值"""
+        if not self._ids:
+            return math.inf
+        return float(self._rank_keys(self._live_slots()).min())
+
+    def _find_decayed(self, now: float) -> List[str]:
+        """向量化计算衰减后权重，找出失效节点"""
+        if not self._ids:
+            return []
+        slots = self._live_slots()
+        decayed = self._weights[slots] * np.exp(_LOG_DECAY_RATE * np.maximum(now - self._timestamps[slots], 0.0))
+        return [self._names[slot] for slot in slots[decayed < INTEREST_MIN_WEIGHT].tolist()]
+
+    def _remove_node(self, node_id: str):
+        slot = self._ids.get(node_id)
+        if slot is not None:
+            self._remove_slots(np.array([slot], dtype=np.int64))
+
+    def _remove_nodes(self, node_ids: List[str]):
+        slots = [self._ids[node_id] for node_id in node_ids if node_id in self._ids]
+        self._remove_slots(np.array(slots, dtype=np.int64))
+
+    # ===== 淘汰 (向量化计算策略分数，不维护逐节点的堆) =====
+
+    def _mark_evictable(self, node_id: str):
+        pass
+
+    def _rebuild_eviction_heap(self):
+        pass
+
+    def _select_victims(self, count: int, protect=frozenset()) -> List[str]:
+        if count <= 0 or not self._ids:
+            return []
+        slots = self._live_slots()
+        scores = np.asarray(self.eviction_policy.score(
+            self._weights[slots].astype(np.float64),
+            self._timestamps[slots],
+            self._access[slots].astype(np.float64)
+        ), dtype=np.float64)
+        for node_id in protect:
+            slot = self._ids.get(node_id)
+            if slot is not None:
+                scores[slots == slot] = np.inf
+        count = min(count, len(slots) - len(protect))
+        if count <= 0:
+            return []
+        part = np.argpartition(scores, count - 1)[:count]
+        return [self._names[slot] for slot in slots[part]]
+
+    def _remove_slots(self, slots: np.ndarray):
+        """批量删除节点及其所有出边和入边，槽位进入空闲列表"""
+        if len(slots) == 0:
+            return
+        self._removed_since_compact += len(slots)
+        for slot in slots.tolist():
+            node_id = self._names[slot]
+            del self._ids[node_id]
+            self._names[slot] = None
+            self._free.append(slot)
+            self._weights[slot] = 0.0
+            self._access[slot] = 0
+            self.version += 1
+
+        self._flush_tail()
+        if len(self._edge_keys):
+            src = self._edge_keys >> _SLOT_BITS
+            dst = self._edge_keys & _SLOT_MASK
+            keep = ~(np.isin(src, slots) | np.isin(dst, slots))
+            self._edge_keys = self._edge_keys[keep]
+            self._edge_w = self._edge_w[keep]
+
+    # ===== 边存储 =====
+
+    def _edge_key(self, source_id: str, target_id: str) -> Optional[int]:
+        source = self._ids.get(source_id)
+        target = self._ids.get(target_id)
+        if source is None or target is None:
+            return None
+        return (source << _SLOT_BITS) | target
+
+    def _find_edge(self, key: int) -> Tuple[Optional[str], int]:
+        """定位边：返回 ("main"|"tail"|None, 下标)"""
+        pos = int(np.searchsorted(self._edge_keys, key))
+        if pos < len(self._edge_keys) and self._edge_keys[pos] == key:
+            return "main", pos
+        if self._n_tail:
+            hits = np.flatnonzero(self._tail_keys[:self._n_tail] == key)
+            if len(hits):
+                return "tail", int(hits[0])
+        return None, -1
+
+    def get_edge_weight(self, source_id: str, target_id: str):
+        key = self._edge_key(source_id, target_id)
+        if key is None:
+            return None
+        segment, pos = self._find_edge(key)
+        if segment == "main":
+            return float(self._edge_w[pos])
+        if segment == "tail":
+            return float(self._tail_w[pos])
+        return None
+
+    def _set_edge(self, source_id: str, target_id: str, weight: float):
+        key = self._edge_key(source_id, target_id)
+        segment, pos = self._find_edge(key)
+        if segment == "main":
+            self._edge_w[pos] = weight
+        elif segment == "tail":
+            self._tail_w[pos] = weight
+        else:
+            if self._n_tail == self.TAIL_CAPACITY:
+                self._flush_tail()
+            self._tail_keys[self._n_tail] = key
+            self._tail_w[self._n_tail] = weight
+            self._n_tail += 1
+
+    def _flush_tail(self):
+        """把尾段合并进排序主段"""
+        if not self._n_tail:
+            return
+        keys = np.concatenate([self._edge_keys, self._tail_keys[:self._n_tail]])
+        weights = np.concatenate([self._edge_w, self._tail_w[:self._n_tail]])
+        order = np.argsort(keys, kind="stable")
+        self._edge_keys = keys[order]
+        self._edge_w = weights[order]
+        self._n_tail = 0
+
+    def _storage_bytes(self) -> int:
+        """节点和边数组 (按容量) 以及槽位表占用的字节数；整理时尾段一并合并"""
+        arrays = (self._weights, self._timestamps, self._access, self._edge_keys, self._edge_w,
+                  self._tail_keys, self._tail_w)
+        return (sum(array.nbytes for array in arrays)
+                + sys.getsizeof(self._ids) + sys.getsizeof(self._names) + sys.getsizeof(self._free))
+
+    def _iter_edges(self) -> Iterable[Tuple[str, str]]:
+        self._flush_tail()
+        for key in self._edge_keys.tolist():
+            yield self._names[key >> _SLOT_BITS], self._names[key & _SLOT_MASK]
+
+    def successors(self, node_id: str) -> List[str]:
+        slot = self._ids.get(node_id)
+        if slot is None:
+            return []
+        lo = np.searchsorted(self._edge_keys, slot << _SLOT_BITS)
+        hi = np.searchsorted(self._edge_keys, (slot + 1) << _SLOT_BITS)
+        targets = (self._edge_keys[lo:hi] & _SLOT_MASK).tolist()
+        if self._n_tail:
+            tail = self._tail_keys[:self._n_tail]
+            targets += (tail[(tail >> _SLOT_BITS) == slot] & _SLOT_MASK).tolist()
+        return [self._names[t] for t in targets]
+
+    def predecessors(self, node_id: str) -> List[str]:
+        slot = self._ids.get(node_id)
+        if slot is None:
+            return []
+        self._flush_tail()
+        sources = self._edge_keys[(self._edge_keys & _SLOT_MASK) == slot] >> _SLOT_BITS
+        return [self._names[s] for s in sources.tolist()]
+
+    def _top_neighbors(self, neighbors: np.ndarray, weights: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """argpartition 取权重最大的k个邻居，按 (权重降序, 节点ID) 排序"""
+        if k <= 0 or not len(neighbors):
+            return []
+        if k < len(neighbors):
+            part = np.argpartition(-weights, k - 1)[:k]
+            neighbors, weights = neighbors[part], weights[part]
+        ranked = sorted(((-float(w), self._names[n]) for n, w in zip(neighbors.tolist(), weights.tolist())))
+        return [(node_id, -neg_weight) for neg_weight, node_id in ranked]
+
+    def top_successors(self, node_id: str, k: int = 5) -> List[Tuple[str, float]]:
+        """源节点的边在主段中连续存放，二分定位后与尾段命中项一起取前k个"""
+        slot = self._ids.get(node_id)
+        if slot is None:
+            return []
+        lo = np.searchsorted(self._edge_keys, slot << _SLOT_BITS)
+        hi = np.searchsorted(self._edge_keys, (slot + 1) << _SLOT_BITS)
+        targets = self._edge_keys[lo:hi] & _SLOT_MASK
+        weights = self._edge_w[lo:hi]
+        if self._n_tail:
+            tail = self._tail_keys[:self._n_tail]
+            hits = (tail >> _SLOT_BITS) == slot
+            targets = np.concatenate([targets, tail[hits] & _SLOT_MASK])
+            weights = np.concatenate([weights, self._tail_w[:self._n_tail][hits]])
+        return self._top_neighbors(targets, weights, k)
+
+    def top_predecessors(self, node_id: str, k: int = 5) -> List[Tuple[str, float]]:
+        """按目标槽位向量化筛选入边后取前k个"""
+        slot = self._ids.get(node_id)
+        if slot is None:
+            return []
+        self._flush_tail()
+        hits = (self._edge_keys & _SLOT_MASK) == slot
+        return self._top_neighbors(self._edge_keys[hits] >> _SLOT_BITS, self._edge_w[hits], k)
+
+    # ===== 序列化 =====
+
+    def _export_arrays(self) -> Tuple:
+        """导出为按存活节点重新编号的紧凑数组"""
+        self._flush_tail()
+        slots = self._live_slots()
+        remap = np.full(len(self._names), -1, dtype=np.int64)
+        remap[slots] = np.arange(len(slots))
+        node_ids = [self._names[slot] for slot in slots.tolist()]
+        src = remap[self._edge_keys >> _SLOT_BITS].astype(np.uint32)
+        dst = remap[self._edge_keys & _SLOT_MASK].astype(np.uint32)
+        return (node_ids, self._weights[slots], self._timestamps[slots], self._access[slots],
+                src, dst, self._edge_w.copy())
+
+    def _import_arrays(self, node_ids, weights, timestamps, access, src, dst, edge_weights):
+        """直接接管数组 (可以是内存映射的写时复制视图)，图谱须为空"""
+        n = len(node_ids)
+        self._ids = dict(zip(node_ids, range(n)))
+        self._names = list(node_ids)
+        self._free = []
+        self._weights = np.asarray(weights, dtype=np.float32)
+        self._timestamps = np.asarray(timestamps, dtype=np.float64)
+        self._access = np.asarray(access, dtype=np.uint32)
+        if n == 0:
+            self._grow(16)
+        keys = (np.asarray(src, dtype=np.int64) << _SLOT_BITS) | np.asarray(dst, dtype=np.int64)
+        edge_weights = np.asarray(edge_weights, dtype=np.float32)
+        if len(keys) > 1 and np.any(keys[1:] < keys[:-1]):
+            order = np.argsort(keys, kind="stable")
+            keys, edge_weights = keys[order], edge_weights[order]
+        self._edge_keys = keys
+        self._edge_w = edge_weights
+        self._n_tail = 0
+
+    @classmethod
+    def from_graph(cls, source: InterestGraph) -> "CompactInterestGraph":
+        """从任意兴趣图谱实现转换"""
+        graph = cls(source.user_id, eviction_policy=source.eviction_policy)
+        graph._import_arrays(*source._export_arrays())
+        graph.version = source.version
+        return graph
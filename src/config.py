@@ -35,6 +35,18 @@ MODEL_NAME = "Qwen/Qwen2.5-0.5B-Instruct"  # 轻量级模型，推荐使用
 
 # ===== 3. 推荐系统参数 =====
 RECOMMENDATION_NUM = 5  # 每次推荐返回的数量
+GENERATION_SCHEDULER = "continuous"  # 生成调度方式: continuous(迭代级连续批处理，支持的生成参数见 SUPPORTED_KWARGS) 或 static(静态微批)
+GENERATION_MAX_BATCH = 8  # 并发生成请求合并成一批 (连续批处理时为同时解码) 的最大条数，1表示逐条生成
+GENERATION_MAX_WAIT = 0.01  # 批内第一条请求到达后等待更多请求的最长时间 (秒)
+GENERATION_TOKENS_PER_ITEM = 64  # 每条推荐 (title/description/reason 的JSON对象) 的token预算，Qwen2.5 tokenizer实测缩进格式p99: 字数限制内49、超出1.5倍58 (benchmarks/bench_generation_budget.py)
+GENERATION_PREAMBLE_TOKENS = 48  # 数组之前的开头说明和 ```json 标记的token预算 (实测一句完整的开头说明32)
+GENERATION_MAX_NEW_TOKENS = RECOMMENDATION_NUM * GENERATION_TOKENS_PER_ITEM + GENERATION_PREAMBLE_TOKENS  # 每次生成的新token上限
+PROMPT_PREFIX_CACHE = True  # 预填充提示词的固定前缀并复用其KV缓存，每次只编码用户相关的后缀
+RECOMMENDATION_CACHE_SIZE = 4096  # 推荐结果缓存的最大条目数，0表示不缓存
+RECOMMENDATION_CACHE_TTL = 600  # 推荐结果缓存的有效期 (秒)
+RECOMMENDATION_CACHE_WEIGHT_STEP = 0.05  # 缓存键中兴趣权重的量化步长
+RECOMMENDATION_CACHE_DB = None  # 同一主机各工作进程共享的二级缓存 (SQLite) 路径，None表示不使用
+RECOMMENDATION_CACHE_DB_MAX_ENTRIES = 100_000  # 二级缓存最多保留的条目数
 
 # ===== 4. 评估和演化参数 =====
 EVOLUTION_THRESHOLD = 0.6  # 演化触发的质量评分阈值
@@ -46,12 +58,54 @@ MIN_CLICK_RATIO = 0.3  # 最小点击率 (点击数/推荐数)
 
 # ===== 5. 兴趣图谱参数 =====
 INTEREST_DECAY_FACTOR = 0.95  # 兴趣衰减因子
+INTEREST_DECAY_PERIOD = 7 * 24 * 3600  # 衰减周期 (秒)，每经过一个周期权重乘以衰减因子
 NEW_INTEREST_WEIGHT = 0.1  # 新兴趣的初始权重
 MAX_GRAPH_SIZE = 1000  # 兴趣图谱的最大节点数
+INTEREST_MIN_WEIGHT = 0.01  # 衰减后低于该权重的节点会被清理
+INTEREST_SWEEP_INTERVAL = 3600  # 失效节点批量清理的最小间隔 (秒)
+MAINTENANCE_INTERVAL = 60.0  # 后台维护任务 (跨用户批量清理失效节点) 的运行间隔 (秒)
+MAINTENANCE_TIME_BUDGET = 0.05  # 每轮维护任务的时间预算 (秒)，用完后剩余图谱留到下一轮
+MAINTENANCE_PROCESSES = 0  # 清理落盘图谱的进程数，0表示在当前线程中处理
+MAINTENANCE_SHARD_SIZE = 64  # 落盘图谱按该数量分片提交给进程池
+SCHEDULER_TICK = 1.0  # 维护调度器时间轮的刻度 (秒)，也是后台线程的运行间隔
+SCHEDULER_SLOTS = 64  # 时间轮每层的槽位数 (2的幂)
+SCHEDULER_LEVELS = 4  # 时间轮层数，覆盖 刻度 × 槽位数^层数 秒
+SCHEDULER_MAX_TASKS = 256  # 每个刻度最多执行的维护任务数，其余留到下一刻度
+SCHEDULER_COMPACT_INTERVAL = 600  # 用户有修改后整理其图谱存储的延迟 (秒)
+SCHEDULER_EVOLUTION_DELAY = 1.0  # 用户交互后检查是否触发演化的延迟 (秒)
+GRAPH_ENGINE = "networkx"  # 图谱存储引擎: networkx(默认) 或 compact(NumPy数组)
+GRAPH_SNAPSHOTS = True  # SessionManager 为用户图谱发布只读快照 (每次请求的修改结束后复制一次，代价 O(图谱大小))
+EVICTION_POLICY = "weight"  # 淘汰策略: weight / lfu / lru / hybrid
+EVICTION_HYBRID_WEIGHTS = (0.6, 0.3, 0.1)  # hybrid策略中 权重/访问次数/更新时间 的系数
+EVICTION_BATCH = 8  # 每次修改最多淘汰的节点数 (增量修剪)
+READ_CACHE_BUCKET_SECONDS = 60  # 图谱读取缓存的衰减时间桶 (秒)
+GRAPH_COMPACT_MIN_REMOVED = 64  # 自上次整理以来移除的节点数达到该值，
+GRAPH_COMPACT_RATIO = 0.25  # 且占移除前节点数的比例达到该值时，自动整理图谱存储
+PAGERANK_DAMPING = 0.85  # 个性化PageRank沿边游走的概率
+PAGERANK_TOL = 1e-4  # 个性化PageRank收敛阈值 (L1)
+PAGERANK_MAX_ITER = 100  # 个性化PageRank最大迭代次数
+PAGERANK_SEEDS = 5  # 个性化PageRank的种子节点数 (权重最高的节点)
+TOPIC_MERGE_THRESHOLD = 0.6  # 同类别主题的n-gram Jaccard相似度不低于该值时合并到已有节点，None表示不合并
+TOPIC_MERGE_MIN_LENGTH = 4  # 归一化后短于该长度的主题不参与合并
+TOPIC_NGRAM = 2  # 主题相似度使用的字符n-gram长度
+TOPIC_MINHASH_BANDS = 20  # MinHash LSH 分段数
+TOPIC_MINHASH_ROWS = 3  # MinHash LSH 每段的哈希数
+COOCCURRENCE_DECAY_FACTOR = 0.9  # 跨用户共现计数每个衰减周期乘以的因子
+COOCCURRENCE_MIN_WEIGHT = 0.05  # 衰减后低于该计数的物品对在合并时被清除
+COOCCURRENCE_CANDIDATES = 3  # AgentA 每次从共现图谱取的候选数，0表示不使用
 
 # ===== 6. 权重更新参数 =====
 INTEREST_UPDATE_ALPHA = 0.3  # 指数移动平均权重系数
 
+# ===== 7. 持久化参数 =====
+JOURNAL_SHARDS = 16  # 修改日志的分片数
+JOURNAL_FSYNC_INTERVAL = 1.0  # 日志两次fsync之间的最长间隔 (秒)
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024  # 分片日志超过该大小时折叠进快照
+GRAPH_STORE_MEMORY_BUDGET = 512 * 1024 * 1024  # 常驻内存的兴趣图谱总大小上限 (字节，按估算)
+GRAPH_STORE_DIR = None  # 冷图谱的落盘目录，None时首次落盘使用临时目录
+SESSION_FLUSH_INTERVAL = 1.0  # 会话持久化后台批量写入的间隔 (秒)
+SESSION_FLUSH_BATCH = 256  # 待写入的脏用户和交互记录达到该数量时提前写入
+
 print(f"\n{'='*50}")
 print(f"🖥️  计算设备: {DEVICE}")
 print(f"🤖 LLM模型: {MODEL_NAME}")
@@ -0,0 +1,252 @@
+"""
+跨用户物品共现图谱
+
+每个用户的兴趣图谱彼此独立，新用户无法借助其他用户的点击。本模块汇总所有用户的
+交互，维护一张全局的物品-物品共现计数矩阵，作为不经过LLM的廉价候选来源：
+  1. 一次交互中的查询和所有点击标题构成一个"篮子"，篮子内每对物品的共现计数加1
+  2. 计数随时间衰减 (每经过一个衰减周期乘以衰减因子)
+  3. 给定一组种子主题，返回与之共现最强的前k个被点击物品
+
+存储 (与 CompactInterestGraph 的边存储方式相同)：
+  - 物品驻留为整数槽位，共现以 (a_slot << 32 | b_slot) 的int64键 + float64计数存储，
+    两个方向各存一份，同一物品的所有共现在主段中连续存放
+  - 主段按键排序；新出现的物品对先写入按源槽位分组的尾段字典，尾段满后合并重排
+  - 合并时清除衰减到 min_weight 以下的物品对，以及不再有任何共现的物品
+
+惰性衰减：
+  - 计数按基准时间 t_ref 缩放存储：t 时刻的一次共现计为 exp(r·(t - t_ref))，
+    当前计数 = 存储值 × exp(-r·(now - t_ref))，其中 r = -ln(衰减因子) / 衰减周期
+  - 所有物品对共用同一个缩放系数，排序不受衰减影响，查询时无需逐项计算
+  - 缩放指数过大时以当前时间为新基准整体重新缩放，避免溢出
+"""
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.config import (COOCCURRENCE_DECAY_FACTOR, COOCCURRENCE_MIN_WEIGHT,
+                        INTEREST_DECAY_PERIOD, RECOMMENDATION_NUM)
+
+_SLOT_BITS = 32
+_SLOT_MASK = (1 << _SLOT_BITS) - 1
+_MAX_EXPONENT = 200.0  # 缩放指数超过该值时重新缩放 (float64 上限约 e^709)
+
+
+class CooccurrenceGraph:
+    """
+    全局物品共现图谱 (线程安全，所有用户共享一个实例)。
+
+    Attributes:
+        decay_rate (float): 衰减速率 r (每秒)
+        min_weight (float): 合并尾段时低于该计数的物品对被清除
+    """
+
+    TAIL_CAPACITY = 4096  # 尾段物品对数达到该值时合并进主段
+
+    def __init__(self, decay_factor: float = COOCCURRENCE_DECAY_FACTOR,
+                 decay_period: float = INTEREST_DECAY_PERIOD,
+                 min_weight: float = COOCCURRENCE_MIN_WEIGHT):
+        self.decay_rate = -math.log(decay_factor) / decay_period
+        self.min_weight = min_weight
+        self._lock = threading.Lock()
+
+        self._ids: Dict[str, int] = {}  # 物品 -> 槽位
+        self._names: List[Optional[str]] = []  # 槽位 -> 物品
+        self._free: List[int] = []  # 可复用的槽位
+        self._clicked = np.zeros(0, dtype=bool)  # 物品是否被点击过 (只有被点击过的物品作为候选)
+
+        self._keys = np.empty(0, dtype=np.int64)
+        self._counts = np.empty(0, dtype=np.float64)
+        self._tail: Dict[int, Dict[int, float]] = {}  # 源槽位 -> {目标槽位: 计数}
+        self._n_tail = 0
+        self._t_ref = time.time()
+
+        self.baskets = 0
+
+    def __len__(self) -> int:
+        """物品数"""
+        return len(self._ids)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._ids
+
+    @property
+    def n_pairs(self) -> int:
+        """有序物品对数 (每对共现两个方向各计一次)"""
+        return len(self._keys) + self._n_tail
+
+    # ===== 写入 =====
+
+    def _intern(self, item: str) -> int:
+        slot = self._ids.get(item)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+            self._names[slot] = item
+        else:
+            slot = len(self._names)
+            self._names.append(item)
+            if slot >= len(self._clicked):
+                clicked = np.zeros(max(16, 2 * len(self._clicked)), dtype=bool)
+                clicked[:len(self._clicked)] = self._clicked
+                self._clicked = clicked
+        self._clicked[slot] = False
+        self._ids[item] = slot
+        return slot
+
+    def _add(self, source: int, target: int, amount: float):
+        key = (source << _SLOT_BITS) | target
+        pos = int(np.searchsorted(self._keys, key))
+        if pos < len(self._keys) and self._keys[pos] == key:
+            self._counts[pos] += amount
+            return
+        row = self._tail.setdefault(source, {})
+        if target not in row:
+            self._n_tail += 1
+        row[target] = row.get(target, 0.0) + amount
+
+    def record(self, query: str, clicked: Iterable[str], now: float = None):
+        """
+        记录一次交互：查询和点击的标题两两共现。
+
+        Args:
+            query (str): 查询 (为空时只统计点击之间的共现)
+            clicked (iterable): 点击的推荐标题
+            now (float, optional): 交互时间 (epoch秒)，默认当前时间
+        """
+        clicked = list(dict.fromkeys(title for title in clicked if title))
+        basket = list(dict.fromkeys(([query] if query else []) + clicked))
+        if len(basket) < 2:
+            return
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if self.decay_rate * (now - self._t_ref) > _MAX_EXPONENT:
+                self._rescale(now)
+            amount = math.exp(self.decay_rate * (now - self._t_ref))
+            slots = [self._intern(item) for item in basket]
+            for title in clicked:
+                self._clicked[self._ids[title]] = True
+            for a in slots:
+                for b in slots:
+                    if a != b:
+                        self._add(a, b, amount)
+            self.baskets += 1
+            if self._n_tail >= self.TAIL_CAPACITY:
+                self._flush_tail(now)
+
+    def _rescale(self, now: float):
+        """以 now 为新基准重新缩放所有计数"""
+        factor = math.exp(-self.decay_rate * (now - self._t_ref))
+        self._counts *= factor
+        for row in self._tail.values():
+            for target in row:
+                row[target] *= factor
+        self._t_ref = now
+
+    def _flush_tail(self, now: float = None):
+        """把尾段合并进主段，并清除衰减到 min_weight 以下的物品对和孤立物品"""
+        if now is None:
+            now = time.time()
+        tail_keys = np.fromiter(((source << _SLOT_BITS) | target
+                                 for source, row in self._tail.items() for target in row),
+                                dtype=np.int64, count=self._n_tail)
+        tail_counts = np.fromiter((count for row in self._tail.values() for count in row.values()),
+                                  dtype=np.float64, count=self._n_tail)
+        keys = np.concatenate([self._keys, tail_keys])
+        counts = np.concatenate([self._counts, tail_counts])
+        keep = counts * math.exp(-self.decay_rate * (now - self._t_ref)) >= self.min_weight
+        keys, counts = keys[keep], counts[keep]
+        order = np.argsort(keys, kind="stable")
+        self._keys, self._counts = keys[order], counts[order]
+        self._tail = {}
+        self._n_tail = 0
+
+        if len(self._names):
+            linked = np.zeros(len(self._names), dtype=bool)
+            linked[self._keys >> _SLOT_BITS] = True
+            for slot in np.flatnonzero(~linked).tolist():
+                item = self._names[slot]
+                if item is not None:
+                    del self._ids[item]
+                    self._names[slot] = None
+                    self._free.append(slot)
+
+    def flush(self):
+        """立即合并尾段 (查询不要求先合并，此方法用于清理和测试)"""
+        with self._lock:
+            self._flush_tail()
+
+    # ===== 查询 =====
+
+    def _neighbors(self, slot: int) -> Tuple[np.ndarray, np.ndarray]:
+        """槽位的所有共现物品及存储计数 (主段二分定位 + 尾段)"""
+        lo = np.searchsorted(self._keys, slot << _SLOT_BITS)
+        hi = np.searchsorted(self._keys, (slot + 1) << _SLOT_BITS)
+        targets = self._keys[lo:hi] & _SLOT_MASK
+        counts = self._counts[lo:hi]
+        row = self._tail.get(slot)
+        if row:
+            targets = np.concatenate([targets, np.fromiter(row.keys(), dtype=np.int64, count=len(row))])
+            counts = np.concatenate([counts, np.fromiter(row.values(), dtype=np.float64, count=len(row))])
+        return targets, counts
+
+    def top_k(self, seeds: Union[Dict[str, float], Iterable[str]], k: int = RECOMMENDATION_NUM,
+              exclude: Iterable[str] = (), now: float = None) -> List[Tuple[str, float]]:
+        """
+        返回与种子主题共现最强的前k个被点击物品。
+
+        Args:
+            seeds (dict or iterable): 种子主题，dict 时值为种子权重 (默认均为1)
+            k (int): 返回数量
+            exclude (iterable): 不作为候选的物品 (种子本身总是被排除)
+            now (float, optional): 计算衰减的时间，默认当前时间
+
+        Returns:
+            list: [(物品, 衰减后的加权共现计数), ...] 按计数降序，同计数按物品排序
+        """
+        if not isinstance(seeds, dict):
+            seeds = dict.fromkeys(seeds, 1.0)
+        if k <= 0 or not seeds:
+            return []
+        if now is None:
+            now = time.time()
+        with self._lock:
+            parts, weights = [], []
+            for item, seed_weight in seeds.items():
+                slot = self._ids.get(item)
+                if slot is None or seed_weight <= 0:
+                    continue
+                targets, counts = self._neighbors(slot)
+                parts.append(targets)
+                weights.append(counts * seed_weight)
+            if not parts:
+                return []
+            targets = np.concatenate(parts)
+            scores = np.concatenate(weights)
+            banned = [self._ids[item] for item in list(seeds) + list(exclude) if item in self._ids]
+            mask = self._clicked[targets] & ~np.isin(targets, banned)
+            targets, scores = targets[mask], scores[mask]
+            if not len(targets):
+                return []
+            # 多个种子共现同一物品时计数相加
+            candidates, inverse = np.unique(targets, return_inverse=True)
+            totals = np.bincount(inverse, weights=scores)
+            if k < len(candidates):
+                part = np.argpartition(-totals, k - 1)[:k]
+                candidates, totals = candidates[part], totals[part]
+            scale = math.exp(-self.decay_rate * (now - self._t_ref))
+            names = [self._names[slot] for slot in candidates.tolist()]
+        ranked = sorted(zip((-totals * scale).tolist(), names))
+        return [(item, -neg_score) for neg_score, item in ranked]
+
+    def get_stats(self) -> Dict:
+        """规模统计"""
+        return {
+            "items": len(self),
+            "pairs": self.n_pairs // 2,
+            "baskets": self.baskets,
+        }
@@ -0,0 +1,104 @@
+"""
+兴趣图谱淘汰策略模块
+
+图谱节点数达到上限后，按策略分数从低到高淘汰节点。支持的策略：
+  1. weight: 衰减后权重最低者优先淘汰
+  2. lfu:    访问次数最少者优先淘汰
+  3. lru:    最久未更新者优先淘汰
+  4. hybrid: 上述三项的加权组合
+
+所有分数只依赖节点存储的 (原始权重, 更新时间, 访问次数)，与当前时间无关，
+因此节点未被修改时分数保持不变，可以放进最小堆中增量维护。
+score() 同时接受标量和NumPy数组，紧凑存储引擎可以向量化计算。
+"""
+import math
+from typing import Dict
+
+import numpy as np
+
+from src.config import (EVICTION_POLICY, EVICTION_HYBRID_WEIGHTS,
+                        INTEREST_DECAY_FACTOR, INTEREST_DECAY_PERIOD)
+
+_LOG_DECAY_RATE = math.log(INTEREST_DECAY_FACTOR) / INTEREST_DECAY_PERIOD
+
+
+class EvictionPolicy:
+    """淘汰策略基类：score 越低越先被淘汰"""
+
+    name = "base"
+
+    def score(self, weight, timestamp, access):
+        raise NotImplementedError
+
+
+class WeightPolicy(EvictionPolicy):
+    """按衰减后权重淘汰 (与排序索引使用同一个时间无关的对数键)"""
+
+    name = "weight"
+
+    def score(self, weight, timestamp, access):
+        return np.log(np.maximum(weight, 1e-12)) - _LOG_DECAY_RATE * timestamp
+
+
+class LFUPolicy(EvictionPolicy):
+    """按访问次数淘汰，次数相同时淘汰较旧的节点"""
+
+    name = "lfu"
+
+    def score(self, weight, timestamp, access):
+        return access + timestamp * 1e-10
+
+
+class LRUPolicy(EvictionPolicy):
+    """按最后更新时间淘汰"""
+
+    name = "lru"
+
+    def score(self, weight, timestamp, access):
+        return timestamp
+
+
+class HybridPolicy(EvictionPolicy):
+    """
+    加权混合策略。
+
+    score = a × 衰减对数权重 + b × ln(1 + 访问次数) + c × 更新时间(天)
+    """
+
+    name = "hybrid"
+
+    def __init__(self, weights=EVICTION_HYBRID_WEIGHTS):
+        self.weights = weights
+        self._weight_policy = WeightPolicy()
+
+    def score(self, weight, timestamp, access):
+        a, b, c = self.weights
+        return (a * self._weight_policy.score(weight, timestamp, access)
+                + b * np.log1p(access)
+                + c * timestamp / 86400.0)
+
+
+EVICTION_POLICIES: Dict[str, type] = {
+    "weight": WeightPolicy,
+    "lfu": LFUPolicy,
+    "lru": LRUPolicy,
+    "hybrid": HybridPolicy,
+}
+
+
+def get_eviction_policy(policy=None) -> EvictionPolicy:
+    """
+    获取淘汰策略实例。
+
+    Args:
+        policy (str | EvictionPolicy, optional): 策略名称或实例，默认使用 EVICTION_POLICY
+
+    Returns:
+        EvictionPolicy: 策略实例
+    """
+    if isinstance(policy, EvictionPolicy):
+        return policy
+    name = policy or EVICTION_POLICY
+    if name not in EVICTION_POLICIES:
+        raise ValueError(f"未知的淘汰策略: {name}")
+    return EVICTION_POLICIES[name]()
@@ -0,0 +1,42 @@
+"""
+兴趣图谱只读快照
+
+写入方 (交互更新、衰减清理) 每完成一次最外层修改，就把图谱复制为一个不可变的
+紧凑快照并整体替换引用；读取方 (AgentA生成推荐) 拿到快照后无需加锁，
+也不会看到修改到一半的状态：
+  1. 快照基于 CompactInterestGraph，复制成本为 O(节点数 + 边数) 的数组拷贝
+  2. 快照上的修改方法一律报错，衰减清理不会在读取时触发
+  3. 引用替换是原子的，读取方持有的旧快照在读完前保持不变
+"""
+from src.compact_graph import CompactInterestGraph
+
+
+class GraphSnapshot(CompactInterestGraph):
+    """
+    不可变的兴趣图谱快照。
+
+    读取接口 (get_top_interests、get_recommendations_context、get_related_interests 等)
+    与 InterestGraph 相同，结果按快照自身的版本缓存。
+    """
+
+    @classmethod
+    def from_graph(cls, source) -> "GraphSnapshot":
+        """复制任意存储引擎的图谱 (须在写入方线程调用)"""
+        snapshot = super().from_graph(source)
+        for array in (snapshot._weights, snapshot._timestamps, snapshot._access,
+                      snapshot._edge_keys, snapshot._edge_w):
+            array.flags.writeable = False
+        return snapshot
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("图谱快照是只读的，请修改原图谱")
+
+    add_interest = add_relation = remove_interest = apply_updates = _read_only
+    decay_interests = replay = enable_snapshots = publish = _read_only
+
+    def compact(self) -> int:
+        """快照创建时已是紧凑布局，无需整理"""
+        return 0
+
+    def snapshot(self) -> "GraphSnapshot":
+        return self
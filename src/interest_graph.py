@@ -4,21 +4,87 @@
 本模块实现一个动态的用户兴趣知识图谱，支持：
   1. 兴趣节点的动态添加和权重更新
   2. 兴趣之间关系的建立和加强
-  3. 权重衰减机制 (长期未访问的兴趣自动衰减)
-  4. 图谱自动修剪 (当节点数超限时)
-  5. 完整的序列化和反序列化
+  3. 权重衰减机制 (读取时按闭式公式惰性计算，写入或后台任务定期批量清理失效节点，读取没有副作用)
+  4. 图谱增量修剪 (节点数达到上限后按淘汰策略逐批移除，见 src/eviction.py)
+  5. 完整的序列化和反序列化 (字典/JSON，以及 src/storage/snapshot.py 中的二进制快照)
+  6. 批量修改 (apply_updates：一批操作共用一个时间戳，只检查一次修剪、只递增一次版本号)
+  7. 近似重复主题合并 (插入时按字符n-gram MinHash/LSH查找同类别的相似主题，见 src/topic_index.py)
+  8. 存储整理 (compact：按当前内容紧凑重建内部表，大批量移除节点后自动执行)
 
 图谱结构：
   - 节点类型：query(查询), clicked(被点击), feedback(反馈)
   - 节点权重：0-1的范围，表示兴趣强度
-  - 边权重：表示两个兴趣之间的关联强度
+  - 边权重：表示两个兴趣之间的关联强度，只存于邻接索引 (src/adjacency_index.py)，
+    networkx 图只保存节点属性和边的拓扑
+
+惰性衰减：
+  - 节点只保存原始权重 w 和最后更新时间 t (epoch秒)
+  - 读取时计算 w × DECAY_FACTOR ^ ((now - t) / 7天)，不再原地改写权重
+  - 排序键 ln(w) - t × ln(DECAY_FACTOR) / 7天 与当前时间无关，
+    因此节点间的相对顺序只在写入时变化
+
+排序索引：
+  - 按上述排序键维护 RankingIndex，写入和删除时增量更新
+  - top-k 查询按索引顺序直接读取，代价 O(k)；衰减不改变排序键，无需更新索引
+  - 每个节点的出边和入边按权重排序维护在 AdjacencyIndex 中，
+    top_successors / top_predecessors 代价 O(k)
+
+只读快照：
+  - enable_snapshots() 之后每次最外层修改结束时发布不可变快照 (见 src/graph_snapshot.py)
+  - 读取方通过 snapshot() 拿到快照后无需加锁
+  - 每次发布复制整个图谱 (O(节点数 + 边数))；auto_publish=False 时修改后不发布，
+    由写入方在一组修改 (如一次请求) 结束后调用 publish()，只复制一次
+
+读取缓存：
+  - get_top_interests / get_recommendations_context 的结果按 (version, top_k, 时间桶) 缓存
+  - 每次修改递增 version，缓存自动失效
+
+多跳关联：
+  - get_related_interests 以权重最高的节点为种子运行个性化PageRank (见 src/pagerank.py)
+  - 关联按双向处理：点击节点没有出边，沿入边才能走回查询及其他点击
+  - 转移矩阵按版本缓存，只在图谱修改后重建
 """
 import networkx as nx
+import numpy as np
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Mapping, Set, Tuple
 import json
 import math
-from src.config import INTEREST_DECAY_FACTOR, NEW_INTEREST_WEIGHT, MAX_GRAPH_SIZE, INTEREST_UPDATE_ALPHA
+import sys
+from src.ranking_index import RankingIndex
+from src.adjacency_index import AdjacencyIndex
+from src.eviction import EvictionPolicy, get_eviction_policy
+from src.pagerank import TransitionMatrix, personalized_pagerank
+from src.topic_index import TopicIndex
+from src.config import (INTEREST_DECAY_FACTOR, NEW_INTEREST_WEIGHT, MAX_GRAPH_SIZE,
+                        INTEREST_UPDATE_ALPHA, INTEREST_MIN_WEIGHT, INTEREST_SWEEP_INTERVAL,
+                        INTEREST_DECAY_PERIOD, GRAPH_ENGINE, EVICTION_BATCH,
+                        READ_CACHE_BUCKET_SECONDS, PAGERANK_SEEDS, TOPIC_MERGE_THRESHOLD,
+                        GRAPH_COMPACT_MIN_REMOVED, GRAPH_COMPACT_RATIO)
+
+# 日志记录的修改操作类型 (见 src/storage/journal.py)
+OP_ADD_INTEREST = 1
+OP_ADD_RELATION = 2
+OP_REMOVE_NODE = 3
+OP_DECAY = 4
+OP_BATCH = 5
+OP_EVICT = 6  # 容量淘汰移除的节点 (回放时按记录移除，不重新运行淘汰策略)
+
+# apply_updates 支持的操作: 名称 -> (操作类型, 参数名, 可选参数的默认值)
+UPDATE_OPS = {
+    "add_interest": (OP_ADD_INTEREST, ("topic", "category", "weight"), ("general", None)),
+    "add_relation": (OP_ADD_RELATION, ("source_topic", "target_topic", "source_cat", "target_cat", "strength"),
+                     ("general", "general", 1.0)),
+    "remove_interest": (OP_REMOVE_NODE, ("node_id",), ()),
+}
+
+# 衰减周期 (秒) 及每秒的对数衰减率
+DECAY_PERIOD_SECONDS = INTEREST_DECAY_PERIOD
+_LOG_DECAY_RATE = math.log(INTEREST_DECAY_FACTOR) / DECAY_PERIOD_SECONDS
 
 
 class InterestGraph:
@@ -35,27 +101,105 @@ class InterestGraph:
     Attributes:
         user_id (str): 用户唯一标识
         graph (nx.DiGraph): 有向图结构，节点为兴趣项，边为关联关系
-        node_weights (dict): 每个节点的权重 (0-1), 表示兴趣强度
-        edge_weights (dict): 每条边的权重，表示关联强度
-        last_update (dict): 每个节点的最后更新时间 (ISO格式)
+        node_weights (dict): 每个节点在最后更新时刻的原始权重 (0-1)，读取时再衰减
+        edge_weights (Mapping): 每条边的权重，表示关联强度 (邻接索引的只读视图)
+        last_update (dict): 每个节点的最后更新时间 (epoch秒)
         access_count (dict): 每个节点的访问次数
         version (int): 图谱版本号，每次修改递增
+        eviction_policy (EvictionPolicy): 图谱满时使用的淘汰策略
     """
     
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, eviction_policy=None):
         """
         初始化空的兴趣图谱。
         
         Args:
             user_id (str): 用户唯一标识，用于持久化和多用户支持
+            eviction_policy (str | EvictionPolicy, optional): 淘汰策略，默认使用 EVICTION_POLICY
         """
         self.user_id = user_id
+        self.version = 0  # 版本号，每次修改递增
+        self.journal = None  # 修改日志 (GraphJournal)，为None时不记录
+        self._journal_depth = 0  # 嵌套修改深度，只记录最外层操作
+        self._replay_time = None  # 回放日志时使用记录中的时间戳
+        self._op_time = None  # 当前最外层操作的时间戳，日志记录与实际修改共用
+        self._batching = False  # 批量修改中，修剪和清理推迟到批次结束
+        self._last_sweep = time.time()  # 上次清理失效节点的时间
+        self.auto_sweep = True  # 为False时写入不触发失效节点清理 (由维护调度器在请求路径之外执行)
+        self._removed_since_compact = 0  # 上次整理以来移除的节点数
+        self._init_storage()
+        self._init_eviction(eviction_policy)
+        self._read_cache = {}  # 读取结果缓存，键含版本号
+        self._read_cache_version = -1
+        self._published = None  # 最近发布的只读快照 (GraphSnapshot)，为None时不发布
+        self.auto_publish = True  # 为False时修改后不自动发布快照，由写入方调用 publish()
+        self._topic_index = None  # 近似重复主题索引，首次插入时按现有节点构建
+    
+    def _init_storage(self):
+        """初始化节点和边的存储结构"""
         self.graph = nx.DiGraph()  # 有向图：节点=兴趣, 边=关联关系
         self.node_weights = {}  # 节点权重 (兴趣强度)
-        self.edge_weights = {}  # 边权重 (关联强度)
         self.last_update = {}  # 每个节点的最后更新时间
         self.access_count = {}  # 访问计数 (用于分析热门兴趣)
-        self.version = 0  # 版本号，每次修改递增
+        self._rank_index = RankingIndex()  # 按衰减排序键维护的节点索引
+        self._adjacency = AdjacencyIndex()  # 按边权重排序的出边/入边索引，边权重唯一的存储位置
+    
+    def _init_eviction(self, eviction_policy):
+        """初始化淘汰状态"""
+        self.eviction_policy: EvictionPolicy = get_eviction_policy(eviction_policy)
+        self._evict_heap = []  # 最小堆: (策略分数, 戳记, node_id)，过期条目惰性丢弃
+        self._evict_stamp = {}  # 节点的最新戳记
+        self._stamps = itertools.count()
+        self._pruning = False  # 是否处于修剪模式 (达到上限后直到降至70%)
+        self._protected = frozenset()  # 当前操作涉及、不可被淘汰的节点
+    
+    def __len__(self) -> int:
+        """节点数"""
+        return len(self.graph)
+    
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.graph
+    
+    # 近似内存占用 (字节)，实测见 benchmarks/bench_graph_memory.py
+    GRAPH_BYTES = 2000
+    NODE_BYTES = 800
+    EDGE_BYTES = 370
+    
+    def memory_estimate(self) -> int:
+        """按节点数和边数估算图谱的内存占用 (字节)"""
+        return self.GRAPH_BYTES + self.NODE_BYTES * len(self) + self.EDGE_BYTES * self.graph.number_of_edges()
+    
+    def _now(self) -> float:
+        """当前时间；回放日志时返回记录中的时间戳，操作进行中返回操作开始的时间"""
+        if self._replay_time is not None:
+            return self._replay_time
+        if self._op_time is not None:
+            return self._op_time
+        return time.time()
+    
+    @contextmanager
+    def _journaled(self, op: int, *fields, timestamp: float = None, force: bool = False):
+        """
+        先写日志再执行修改 (write-ahead)。
+        
+        嵌套在其他操作内部的修改 (如 add_relation 补建节点) 由外层记录覆盖，
+        不重复记录；force=True 的操作 (衰减清理) 无论嵌套与否都会记录。
+        """
+        outermost = self._journal_depth == 0
+        if outermost:
+            self._op_time = self._now() if timestamp is None else timestamp
+        if self.journal is not None and (force or outermost):
+            self.journal.record(self.user_id, op, self._now() if timestamp is None else timestamp, *fields)
+        self._journal_depth += 1
+        try:
+            yield
+        finally:
+            self._journal_depth -= 1
+            if outermost:
+                self._op_time = None
+                self._maybe_compact()
+                if self.auto_publish:
+                    self.publish()
         
     def add_interest(self, topic: str, category: str = "general", weight: float = None):
         """
@@ -69,35 +213,65 @@ class InterestGraph:
             category (str): 兴趣类别，默认为general
             weight (float, optional): 权重值 (0-1)
         
+        Returns:
+            str: 节点ID；与已有主题近似重复时为被合并到的已有节点
+        
         Examples:
             graph = InterestGraph("user_001")
             graph.add_interest("机器学习", "AI", weight=0.8)
             graph.add_interest("Python", "编程", weight=0.9)
         """
-        # 如果图谱已满，先进行修剪
-        if len(self.graph) >= MAX_GRAPH_SIZE:
-            self._prune_graph()
+        with self._journaled(OP_ADD_INTEREST, topic, category, weight):
+            return self._add_interest(topic, category, weight)
+    
+    def _add_interest(self, topic: str, category: str, weight: float) -> str:
+        """add_interest 的实现 (不写日志)，返回实际写入的节点ID"""
+        # 构造节点ID (category:topic格式)，近似重复的主题合并到已有节点
+        node_id = self._canonical_id(topic, category)
+        now = self._now()
         
-        # 构造节点ID (category:topic格式)
-        node_id = f"{category}:{topic}"
+        # 如果图谱已满，先进行一批增量修剪
+        self._prune_graph(protect=self._protected | {node_id})
         
-        if node_id in self.graph:
+        if node_id in self:
             # ===== 更新现有节点 =====
-            old_weight = self.node_weights.get(node_id, 0)
+            # 以衰减到当前时刻的权重作为历史权重
+            old_weight = self.get_weight(node_id, now)
             # 使用指数移动平均更新权重
             # 新权重 = INTEREST_UPDATE_ALPHA(0.3) × 当前权重 + (1-INTEREST_UPDATE_ALPHA) × 历史权重
             # 这样既保留历史记忆(70%)，又响应最新反馈(30%)
             new_weight = 0.7 * old_weight + 0.3 * (weight or 1.0)
-            self.node_weights[node_id] = min(new_weight, 1.0)  # 限制在0-1范围
+            self._set_node(node_id, min(new_weight, 1.0), now)  # 限制在0-1范围
         else:
             # ===== 添加新节点 =====
-            self.graph.add_node(node_id, category=category, topic=topic)
-            self.node_weights[node_id] = weight or NEW_INTEREST_WEIGHT
+            self._create_node(node_id, category, topic)
+            self._set_node(node_id, weight or NEW_INTEREST_WEIGHT, now)
+            if self._topic_index is not None:
+                self._topic_index.add(node_id, category, topic)
         
-        # 更新时间戳和访问计数
-        self.last_update[node_id] = datetime.now().isoformat()
-        self.access_count[node_id] = self.access_count.get(node_id, 0) + 1
+        # 更新访问计数
+        self._touch(node_id)
+        self._mark_evictable(node_id)
         self.version += 1
+        self._maybe_sweep(now)
+        return node_id
+    
+    def _canonical_id(self, topic: str, category: str) -> str:
+        """
+        主题对应的节点ID。
+        
+        节点已存在或未启用合并时为 "category:topic"；否则在同类别中查找
+        近似重复的主题 (见 src/topic_index.py)，找到时返回已有节点的ID。
+        """
+        node_id = f"{category}:{topic}"
+        if TOPIC_MERGE_THRESHOLD is None or node_id in self:
+            return node_id
+        if self._topic_index is None:
+            self._topic_index = TopicIndex(threshold=TOPIC_MERGE_THRESHOLD)
+            for existing in list(self.graph):
+                existing_category, _, existing_topic = existing.partition(":")
+                self._topic_index.add(existing, existing_category, existing_topic)
+        return self._topic_index.find(category, topic, alive=self.__contains__) or node_id
         
     def add_relation(self, source_topic: str, target_topic: str, 
                      source_cat: str = "general", target_cat: str = "general", 
@@ -112,130 +286,664 @@ class InterestGraph:
             target_cat (str): 目标兴趣类别
             strength (float): 关系强度 (0-1)
         """
-        source_id = f"{source_cat}:{source_topic}"
-        target_id = f"{target_cat}:{target_topic}"
+        with self._journaled(OP_ADD_RELATION, source_topic, target_topic, source_cat, target_cat, strength):
+            self._add_relation(source_topic, target_topic, source_cat, target_cat, strength)
+    
+    def _add_relation(self, source_topic: str, target_topic: str,
+                      source_cat: str, target_cat: str, strength: float) -> Tuple[str, str]:
+        """add_relation 的实现 (不写日志)，返回实际连接的 (源节点ID, 目标节点ID)"""
+        source_id = self._canonical_id(source_topic, source_cat)
+        target_id = self._canonical_id(target_topic, target_cat)
         
-        # 确保节点存在
-        if source_id not in self.graph:
-            self.add_interest(source_topic, source_cat)
-        if target_id not in self.graph:
-            self.add_interest(target_topic, target_cat)
+        # 确保节点存在 (补建节点触发的修剪不得淘汰关系的两端)
+        self._protected = frozenset((source_id, target_id))
+        try:
+            if source_id not in self:
+                source_id = self.add_interest(source_topic, source_cat)
+            if target_id not in self:
+                target_id = self.add_interest(target_topic, target_cat)
+        finally:
+            self._protected = frozenset()
         
-        # 添加边
-        if self.graph.has_edge(source_id, target_id):
-            old_strength = self.edge_weights.get((source_id, target_id), 0)
-            self.edge_weights[(source_id, target_id)] = 0.6 * old_strength + 0.4 * strength
+        # 添加边 (两端合并为同一节点时不添加自环)
+        if source_id == target_id:
+            self.version += 1
+            return source_id, target_id
+        old_strength = self.get_edge_weight(source_id, target_id)
+        if old_strength is not None:
+            self._set_edge(source_id, target_id, 0.6 * old_strength + 0.4 * strength)
         else:
-            self.edge_weights[(source_id, target_id)] = strength
-            self.graph.add_edge(source_id, target_id, weight=strength)
+            self._set_edge(source_id, target_id, strength)
         
         self.version += 1
+        return source_id, target_id
+    
+    # ===== 存储层操作 (紧凑存储引擎会重写这些方法) =====
+    
+    def _create_node(self, node_id: str, category: str, topic: str):
+        """创建空节点"""
+        self.graph.add_node(node_id, category=category, topic=topic)
+    
+    def _touch(self, node_id: str):
+        """访问计数加一"""
+        self.access_count[node_id] = self.access_count.get(node_id, 0) + 1
+    
+    @property
+    def edge_weights(self) -> Mapping:
+        """边权重 {(source_id, target_id): weight} 的只读视图"""
+        return self._adjacency.weights
+    
+    def get_edge_weight(self, source_id: str, target_id: str):
+        """获取边权重，边不存在时返回None"""
+        return self._adjacency.get_weight(source_id, target_id)
+    
+    def _set_edge(self, source_id: str, target_id: str, weight: float):
+        """写入边 (networkx图只记录拓扑，权重只写入邻接索引)"""
+        self.graph.add_edge(source_id, target_id)
+        self._adjacency.set_edge(source_id, target_id, weight)
+    
+    def successors(self, node_id: str) -> List[str]:
+        """节点的直接后继"""
+        if node_id not in self:
+            return []
+        return list(self.graph.successors(node_id))
+    
+    def top_successors(self, node_id: str, k: int = 5) -> List[Tuple[str, float]]:
+        """按边权重降序返回前k个后继 [(node_id, 边权重), ...]"""
+        return self._adjacency.top_successors(node_id, k)
+    
+    def top_predecessors(self, node_id: str, k: int = 5) -> List[Tuple[str, float]]:
+        """按边权重降序返回前k个前驱 [(node_id, 边权重), ...]"""
+        return self._adjacency.top_predecessors(node_id, k)
         
-    def decay_interests(self):
-        """衰减长期未访问的兴趣"""
-        now = datetime.now()
-        decayed_nodes = []
+    def get_weight(self, node_id: str, now: float = None) -> float:
+        """
+        获取节点衰减到当前时刻的权重。
         
-        for node_id in self.graph.nodes():
-            if node_id in self.last_update:
-                last_time = datetime.fromisoformat(self.last_update[node_id])
-                days_since = (now - last_time).days
-                
-                # 指数衰减
-                decay_factor = INTEREST_DECAY_FACTOR ** (days_since / 7.0)
-                self.node_weights[node_id] *= decay_factor
-                
-                # 如果权重过低则移除
-                if self.node_weights[node_id] < 0.01:
-                    decayed_nodes.append(node_id)
-        
-        for node_id in decayed_nodes:
-            self._remove_node(node_id)
+        Args:
+            node_id (str): 节点ID (category:topic格式)
+            now (float, optional): 计算时刻 (epoch秒)，默认为当前时间
         
-        self.version += 1
+        Returns:
+            float: w × DECAY_FACTOR ^ ((now - t) / 7天)，节点不存在时为0
+        """
+        if node_id not in self.node_weights:
+            return 0.0
+        if now is None:
+            now = time.time()
+        elapsed = max(now - self.last_update.get(node_id, now), 0.0)
+        return self.node_weights[node_id] * math.exp(_LOG_DECAY_RATE * elapsed)
+    
+    @staticmethod
+    def _rank_key(weight: float, timestamp: float) -> float:
+        """与时间无关的排序键: ln(w) - t × ln(DECAY_FACTOR) / 7天"""
+        return math.log(max(weight, 1e-12)) - _LOG_DECAY_RATE * timestamp
+    
+    def _set_node(self, node_id: str, weight: float, timestamp: float):
+        """写入节点的原始权重和更新时间，同步排序索引"""
+        self.node_weights[node_id] = weight
+        self.last_update[node_id] = timestamp
+        self._rank_index.add(node_id, self._rank_key(weight, timestamp))
+    
+    def decay_interests(self, now: float = None) -> int:
+        """
+        清理衰减后权重过低的节点。
+        
+        权重在读取时惰性衰减，本方法不再改写权重，只负责批量移除失效节点。
+        
+        Returns:
+            int: 移除的节点数
+        """
+        if now is None:
+            now = self._now()
+        with self._journaled(OP_DECAY, timestamp=now, force=True):
+            decayed_nodes = self._find_decayed(now)
+            self._remove_nodes(decayed_nodes)
+        
+        self._last_sweep = now
         return len(decayed_nodes)
     
-    def get_recommendations_context(self, top_k: int = 10) -> str:
-        """生成推荐上下文"""
-        self.decay_interests()
+    def _find_decayed(self, now: float) -> List[str]:
+        """找出衰减后权重低于 INTEREST_MIN_WEIGHT 的节点"""
+        # 衰减后权重 < 阈值 等价于 排序键 < ln(阈值) - now × 衰减率，
+        # 失效节点都位于索引底部，只需从底部扫描到第一个存活节点
+        threshold = math.log(INTEREST_MIN_WEIGHT) - _LOG_DECAY_RATE * now
+        decayed_nodes = []
+        for key, node_id in self._rank_index.iter_asc():
+            if key >= threshold:
+                break
+            decayed_nodes.append(node_id)
+        return decayed_nodes
+    
+    def _min_rank_key(self) -> float:
+        """最小排序键 (最接近失效的节点)，空图谱返回 inf；维护任务据此判断是否需要清理"""
+        for key, _ in self._rank_index.iter_asc():
+            return key
+        return math.inf
+    
+    def _maybe_sweep(self, now: float):
+        """
+        距上次清理超过INTEREST_SWEEP_INTERVAL时执行一次清理，摊销到多次修改。
+        
+        只在写路径调用：读取不修改图谱 (不删除节点、不递增版本号、不写日志)，
+        尚未清理的失效节点由 _live_top_nodes 在读取结果中过滤。
+        """
+        if self._replay_time is not None or self._journal_depth > 1 or self._batching:
+            # 回放时清理由日志中的衰减记录驱动；嵌套操作留给最外层之后的修改清理，
+            # 保证衰减记录总是落在完整操作之间，回放顺序与实际执行一致
+            return
+        if self.auto_sweep and now - self._last_sweep >= INTEREST_SWEEP_INTERVAL:
+            self.decay_interests(now)
+    
+    def _top_nodes(self, top_k: int) -> List[str]:
+        """按衰减后权重降序返回前k个节点ID"""
+        return [node_id for _, node_id in self._rank_index.top(top_k)]
+    
+    def _live_top_nodes(self, top_k: int, now: float) -> List[str]:
+        """前k个节点中在 now 时未失效的 (失效节点排在最后，过滤后与清理后的结果相同)"""
+        return [node_id for node_id in self._top_nodes(top_k) if self.get_weight(node_id, now) >= INTEREST_MIN_WEIGHT]
+    
+    def enable_snapshots(self):
+        """
+        开始发布只读快照：此后每次最外层修改结束时复制出新快照并替换引用。
+        
+        须在写入方线程调用。发布后其他线程通过 snapshot() 读取，无需加锁。
         
+        Returns:
+            GraphSnapshot: 当前状态的快照
+        """
+        if self._published is None:
+            from src.graph_snapshot import GraphSnapshot
+            self._published = GraphSnapshot.from_graph(self)
+        return self._published
+    
+    def publish(self):
+        """版本变化时重新发布快照 (未启用快照时不做任何事，须在写入方线程调用)"""
+        if self._published is not None and self._published.version != self.version:
+            from src.graph_snapshot import GraphSnapshot
+            self._published = GraphSnapshot.from_graph(self)
+    
+    def snapshot(self) -> "InterestGraph":
+        """
+        获取用于读取的图谱视图。
+        
+        启用快照时返回最近发布的不可变快照，否则返回图谱本身 (单线程使用)。
+        """
+        published = self._published
+        return published if published is not None else self
+    
+    def _cached(self, key: Tuple, build):
+        """
+        按版本号缓存读取结果。
+        
+        任何修改都会递增 version，缓存随之整体失效；同一版本内键相同的读取
+        直接返回缓存结果。
+        """
+        if self._read_cache_version != self.version:
+            self._read_cache = {}
+            self._read_cache_version = self.version
+        result = self._read_cache.get(key)
+        if result is None:
+            if len(self._read_cache) >= 64:
+                self._read_cache.clear()  # 版本长期不变时丢弃过期时间桶的条目
+            result = build()
+            self._read_cache[key] = result
+        return result
+    
+    def get_recommendations_context(self, top_k: int = 10) -> str:
+        """生成推荐上下文 (同一版本、同一时间桶内直接返回缓存)"""
+        now = time.time()
+        bucket = int(now // READ_CACHE_BUCKET_SECONDS)
+        return self._cached(("context", top_k, bucket), lambda: self._build_context(top_k, now))
+    
+    def _build_context(self, top_k: int, now: float) -> str:
+        """构造推荐上下文字符串"""
         # 获取权重最高的节点
-        sorted_nodes = sorted(
-            self.node_weights.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )[:top_k]
+        top_nodes = self._live_top_nodes(top_k, now)
         
         context = f"用户{self.user_id}的兴趣图谱:\n"
-        context += "主要兴趣: " + ", ".join([node[0].split(":")[-1] for node in sorted_nodes]) + "\n"
+        context += "主要兴趣: " + ", ".join([node_id.split(":")[-1] for node_id in top_nodes]) + "\n"
         
-        # 添加关联信息
-        if sorted_nodes:
-            top_node = sorted_nodes[0][0]
-            successors = list(self.graph.successors(top_node))
-            if successors:
-                context += f"相关兴趣: " + ", ".join(successors[:5]) + "\n"
+        # 添加关联信息 (以主要兴趣为种子的多跳关联，按关联度排序，不重复列出主要兴趣)
+        related = self.get_related_interests(top_k=5, seeds=top_k)
+        if related:
+            context += f"相关兴趣: " + ", ".join(node_id.split(":")[-1] for node_id, _ in related) + "\n"
         
         context += f"(版本: {self.version})"
         return context
     
     def get_top_interests(self, top_k: int = 5) -> List[Tuple[str, float]]:
-        """获取排名前k的兴趣"""
-        self.decay_interests()
-        return sorted(
-            self.node_weights.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:top_k]
-    
-    def _prune_graph(self):
-        """修剪图谱，保留权重最高的节点"""
-        if len(self.graph) <= MAX_GRAPH_SIZE * 0.8:
-            return
+        """
+        获取排名前k的兴趣。
+        
+        权重为衰减到所在时间桶首次读取时刻的值；READ_CACHE_BUCKET_SECONDS 内的
+        衰减可以忽略 (60秒约为 5e-6 的相对变化)。
+        """
+        now = time.time()
+        bucket = int(now // READ_CACHE_BUCKET_SECONDS)
+        top = self._cached(
+            ("top", top_k, bucket),
+            lambda: tuple((node_id, self.get_weight(node_id, now)) for node_id in self._live_top_nodes(top_k, now))
+        )
+        return list(top)
+    
+    def get_related_interests(self, top_k: int = 5, seeds: int = PAGERANK_SEEDS,
+                              include_seeds: bool = False) -> List[Tuple[str, float]]:
+        """
+        获取与主要兴趣多跳关联的兴趣。
+        
+        以衰减后权重最高的 seeds 个节点为重启分布 (按权重加权) 运行个性化PageRank，
+        按得分降序返回。结果按 (version, 参数, 时间桶) 缓存。
+        
+        Args:
+            top_k (int): 返回的节点数
+            seeds (int): 种子节点数
+            include_seeds (bool): 结果是否包含种子节点本身
+        
+        Returns:
+            list: [(node_id, 关联得分), ...]，只包含得分大于0 (从种子可达) 的节点
+        """
+        now = time.time()
+        bucket = int(now // READ_CACHE_BUCKET_SECONDS)
+        related = self._cached(
+            ("related", top_k, seeds, include_seeds, bucket),
+            lambda: self._build_related(top_k, seeds, include_seeds, now)
+        )
+        return list(related)
+    
+    def _transition_matrix(self) -> Tuple[List[str], Dict[str, int], TransitionMatrix]:
+        """按版本缓存的转移矩阵 (每条边正反两个方向)"""
+        def build():
+            node_ids, _, _, _, src, dst, edge_weights = self._export_arrays()
+            index = {node_id: i for i, node_id in enumerate(node_ids)}
+            matrix = TransitionMatrix(len(node_ids), np.concatenate([src, dst]),
+                                      np.concatenate([dst, src]), np.concatenate([edge_weights, edge_weights]))
+            return node_ids, index, matrix
+        return self._cached(("transition",), build)
+    
+    def _build_related(self, top_k: int, seeds: int, include_seeds: bool, now: float) -> Tuple:
+        """运行个性化PageRank并取前k个"""
+        seed_ids = self._live_top_nodes(seeds, now)
+        if not seed_ids or top_k <= 0:
+            return ()
+        node_ids, index, matrix = self._transition_matrix()
+        seed_idx = np.array([index[node_id] for node_id in seed_ids], dtype=np.intp)
+        personalization = np.zeros(matrix.n)
+        personalization[seed_idx] = [self.get_weight(node_id, now) for node_id in seed_ids]
+        
+        scores, _ = personalized_pagerank(matrix, personalization)
+        if not include_seeds:
+            scores[seed_idx] = 0.0
+        # 尚未清理的失效节点不作为结果 (读取不清理)
+        for i in np.flatnonzero(scores > 0).tolist():
+            if self.get_weight(node_ids[i], now) < INTEREST_MIN_WEIGHT:
+                scores[i] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if top_k < len(candidates):
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return tuple((node_ids[i], float(scores[i])) for i in order.tolist())
+    
+    def _prune_graph(self, max_nodes: int = EVICTION_BATCH, protect=frozenset()) -> int:
+        """
+        增量修剪图谱。
+        
+        节点数达到 MAX_GRAPH_SIZE 后进入修剪模式，此后每次修改按淘汰策略
+        最多移除 max_nodes 个节点，直到降至上限的70%，避免单次请求集中修剪。
         
-        # 删除权重最低的节点
-        nodes_to_remove = len(self.graph) - int(MAX_GRAPH_SIZE * 0.7)
-        weak_nodes = sorted(self.node_weights.items(), key=lambda x: x[1])[:nodes_to_remove]
+        Args:
+            max_nodes (int): 本次最多淘汰的节点数
+            protect (set): 不可淘汰的节点
+        
+        Returns:
+            int: 淘汰的节点数
+        """
+        if self._batching or self._replay_time is not None:
+            return 0  # 批量修改结束时统一修剪；回放时由日志中的淘汰记录移除
+        if len(self) >= MAX_GRAPH_SIZE:
+            self._pruning = True
+        if not self._pruning:
+            return 0
+        
+        target = int(MAX_GRAPH_SIZE * 0.7)
+        count = min(max_nodes, len(self) - target)
+        victims = self._select_victims(count, protect) if count > 0 else []
+        if victims and self.journal is not None:
+            # 淘汰顺序取决于淘汰堆的内部状态 (快照不保存)，记录实际移除的节点
+            self.journal.record(self.user_id, OP_EVICT, self._now(), victims)
+        self._remove_nodes(victims)
+        
+        if len(self) <= target:
+            self._pruning = False
+        return len(victims)
+    
+    def _eviction_score(self, node_id: str) -> float:
+        """节点当前的淘汰分数"""
+        return float(self.eviction_policy.score(
+            self.node_weights[node_id],
+            self.last_update[node_id],
+            self.access_count.get(node_id, 0)
+        ))
+    
+    def _mark_evictable(self, node_id: str):
+        """节点状态变化后重新入堆，旧条目通过戳记失效"""
+        stamp = next(self._stamps)
+        self._evict_stamp[node_id] = stamp
+        heapq.heappush(self._evict_heap, (self._eviction_score(node_id), stamp, node_id))
+        if len(self._evict_heap) > 2 * len(self._evict_stamp) + 64:
+            self._rebuild_eviction_heap()
+    
+    def compact(self) -> int:
+        """
+        整理内部存储：导出当前内容后按紧凑布局重建所有内部表。
+        
+        字典删除条目后不会收缩，淘汰堆中也会积累过期条目；重建后这些空间被释放。
+        不改变图谱内容和版本号。
         
-        for node_id, _ in weak_nodes:
+        Returns:
+            int: 回收的字节数 (按内部容器自身的大小估算)
+        """
+        before = self._storage_bytes()
+        arrays = self._export_arrays()
+        self._init_storage()
+        self._import_arrays(*arrays)
+        self._removed_since_compact = 0
+        return max(before - self._storage_bytes(), 0)
+    
+    def _maybe_compact(self):
+        """大批量移除节点 (修剪、清理) 后自动整理，在最外层操作结束时调用"""
+        removed = self._removed_since_compact
+        if removed >= GRAPH_COMPACT_MIN_REMOVED and removed >= GRAPH_COMPACT_RATIO * (len(self) + removed):
+            self.compact()
+    
+    def _storage_bytes(self) -> int:
+        """内部容器自身占用的字节数 (不含键值对象)"""
+        containers = [self.node_weights, self.last_update, self.access_count,
+                      self._evict_stamp, self._evict_heap, self.graph._node, self.graph._adj, self.graph._pred,
+                      self._rank_index._keys, self._adjacency._out, self._adjacency._in, self._adjacency._weights]
+        containers.extend(self.graph._adj.values())
+        containers.extend(self.graph._pred.values())
+        containers.extend(self._adjacency._out.values())
+        containers.extend(self._adjacency._in.values())
+        return sum(sys.getsizeof(c) for c in containers)
+    
+    def _rebuild_eviction_heap(self):
+        """丢弃过期条目，按当前状态重建淘汰堆"""
+        self._evict_stamp = {}
+        self._evict_heap = []
+        for node_id in self.node_weights:
+            stamp = next(self._stamps)
+            self._evict_stamp[node_id] = stamp
+            self._evict_heap.append((self._eviction_score(node_id), stamp, node_id))
+        heapq.heapify(self._evict_heap)
+    
+    def _select_victims(self, count: int, protect=frozenset()) -> List[str]:
+        """从淘汰堆中弹出分数最低的count个有效节点"""
+        victims = []
+        skipped = []
+        while self._evict_heap and len(victims) < count:
+            entry = heapq.heappop(self._evict_heap)
+            node_id = entry[2]
+            if self._evict_stamp.get(node_id) != entry[1]:
+                continue
+            if node_id in protect:
+                skipped.append(entry)
+                continue
+            victims.append(node_id)
+        for entry in skipped:
+            heapq.heappush(self._evict_heap, entry)
+        return victims
+    
+    @staticmethod
+    def _normalize_update(update) -> Tuple:
+        """
+        把一条修改转换为 (操作类型, 参数...)。
+        
+        支持 ("add_interest", "机器学习", "AI", 0.8) 形式的元组，
+        以及 {"op": "add_interest", "topic": "机器学习", "category": "AI"} 形式的字典，
+        省略的可选参数取对应公开方法的默认值。
+        """
+        if isinstance(update, dict):
+            name = update.get("op")
+            values = None
+        else:
+            name, values = update[0], list(update[1:])
+        if name not in UPDATE_OPS:
+            raise ValueError(f"未知的修改操作: {name}")
+        op, params, defaults = UPDATE_OPS[name]
+        required = len(params) - len(defaults)
+        if values is None:
+            missing = [p for p in params[:required] if p not in update]
+            if missing:
+                raise ValueError(f"{name} 缺少参数: {', '.join(missing)}")
+            values = [update.get(p, d) for p, d in zip(params, (None,) * required + defaults)]
+        else:
+            if not required <= len(values) <= len(params):
+                raise ValueError(f"{name} 的参数个数应为 {required}-{len(params)}，实际为 {len(values)}")
+            values += list(defaults[len(values) - required:])
+        return (op, *values)
+    
+    def apply_updates(self, updates: List, timestamp: float = None) -> int:
+        """
+        批量执行一组修改。
+        
+        与逐个调用 add_interest / add_relation / remove_interest 的结果相同，但：
+          - 整批共用一个时间戳
+          - 图谱满时只在批次结束后修剪一次 (本批涉及的节点不会被淘汰)
+          - 版本号只递增一次，读取缓存只失效一次
+          - 写入修改日志时整批为一条记录
+        适合一次交互产生多条修改，或同一用户的大量反馈事件一起到达的场景。
+        
+        Args:
+            updates (list): 修改列表，格式见 _normalize_update
+            timestamp (float, optional): 批次时间戳 (epoch秒)，默认为当前时间
+        
+        Returns:
+            int: 执行的修改条数
+        
+        Examples:
+            graph.apply_updates([
+                ("add_interest", "Python 数据分析", "query", 0.6),
+                ("add_relation", "Python 数据分析", "Pandas指南", "query", "clicked", 0.7),
+            ])
+        """
+        ops = [self._normalize_update(update) for update in updates]
+        if not ops:
+            return 0
+        with self._journaled(OP_BATCH, ops, timestamp=timestamp):
+            self._apply_updates(ops)
+        return len(ops)
+    
+    def _apply_updates(self, ops: List[Tuple]):
+        """apply_updates 的实现 (不写日志)"""
+        start_version = self.version
+        touched = set()
+        self._batching = True
+        try:
+            for op, *fields in ops:
+                if op == OP_ADD_INTEREST:
+                    touched.add(self._add_interest(*fields))
+                elif op == OP_ADD_RELATION:
+                    touched.update(self._add_relation(*fields))
+                elif op == OP_REMOVE_NODE:
+                    self._remove_node(*fields)
+                    touched.discard(fields[0])
+                else:
+                    raise ValueError(f"不支持批量执行的操作类型: {op}")
+        finally:
+            self._batching = False
+        
+        # 一次修剪：本批新增超出上限的部分连同常规批量一起淘汰
+        overflow = max(len(self) - MAX_GRAPH_SIZE, 0)
+        self._prune_graph(max_nodes=EVICTION_BATCH + overflow, protect=frozenset(touched))
+        self.version = start_version + 1
+        self._maybe_sweep(self._now())
+    
+    def remove_interest(self, node_id: str) -> bool:
+        """
+        移除一个兴趣节点及其关联边。
+        
+        Args:
+            node_id (str): 节点ID (category:topic格式)
+        
+        Returns:
+            bool: 节点是否存在
+        """
+        if node_id not in self:
+            return False
+        with self._journaled(OP_REMOVE_NODE, node_id):
+            self._remove_node(node_id)
+        return True
+    
+    def replay(self, op: int, timestamp: float, *fields):
+        """
+        按日志记录重放一次修改，使用记录中的时间戳。
+        
+        Args:
+            op (int): 操作类型 (OP_*)
+            timestamp (float): 操作发生时间 (epoch秒)
+            *fields: 操作参数，与对应公开方法的参数顺序一致
+        """
+        self._replay_time = timestamp
+        try:
+            if op == OP_ADD_INTEREST:
+                self._add_interest(*fields)
+            elif op == OP_ADD_RELATION:
+                self._add_relation(*fields)
+            elif op == OP_REMOVE_NODE:
+                self._remove_node(*fields)
+            elif op == OP_DECAY:
+                self.decay_interests(timestamp)
+            elif op == OP_BATCH:
+                self._apply_updates(*fields)
+            elif op == OP_EVICT:
+                self._remove_nodes(*fields)
+                self._pruning = len(self) > int(MAX_GRAPH_SIZE * 0.7)
+            else:
+                raise ValueError(f"未知的日志操作类型: {op}")
+        finally:
+            self._replay_time = None
+            if self.auto_publish:
+                self.publish()
+    
+    def _remove_nodes(self, node_ids: List[str]):
+        """批量移除节点"""
+        for node_id in node_ids:
             self._remove_node(node_id)
     
     def _remove_node(self, node_id: str):
-        """移除节点及其相关数据"""
+        """移除节点及其相关数据 (networkx图和邻接索引中的出边和入边)"""
         if node_id in self.graph:
             self.graph.remove_node(node_id)
             self.node_weights.pop(node_id, None)
             self.last_update.pop(node_id, None)
             self.access_count.pop(node_id, None)
+            self._rank_index.remove(node_id)
+            self._adjacency.remove_node(node_id)
+            self._evict_stamp.pop(node_id, None)
+            self._removed_since_compact += 1
             self.version += 1
     
+    def _export_arrays(self) -> Tuple:
+        """
+        导出为紧凑数组，供序列化使用。
+        
+        Returns:
+            tuple: (node_ids, weights, timestamps, access, src, dst, edge_weights)，
+                   其中 src/dst 为 node_ids 中的下标
+        """
+        node_ids = list(self.node_weights)
+        index = {node_id: i for i, node_id in enumerate(node_ids)}
+        weights = np.fromiter((self.node_weights[n] for n in node_ids), dtype=np.float64, count=len(node_ids))
+        timestamps = np.fromiter((self.last_update[n] for n in node_ids), dtype=np.float64, count=len(node_ids))
+        access = np.fromiter((self.access_count.get(n, 0) for n in node_ids), dtype=np.uint32, count=len(node_ids))
+        edges = [(index[s], index[t], self.get_edge_weight(s, t)) for s, t in self.graph.edges()]
+        src = np.array([e[0] for e in edges], dtype=np.uint32)
+        dst = np.array([e[1] for e in edges], dtype=np.uint32)
+        edge_weights = np.array([e[2] for e in edges], dtype=np.float64)
+        return node_ids, weights, timestamps, access, src, dst, edge_weights
+    
+    def _import_arrays(self, node_ids, weights, timestamps, access, src, dst, edge_weights):
+        """从紧凑数组导入节点和边 (图谱须为空)"""
+        for i, node_id in enumerate(node_ids):
+            category, _, topic = node_id.partition(":")
+            self._create_node(node_id, category, topic)
+            self._set_node(node_id, float(weights[i]), float(timestamps[i]))
+            self.access_count[node_id] = int(access[i])
+        for s, t, w in zip(np.asarray(src).tolist(), np.asarray(dst).tolist(), np.asarray(edge_weights).tolist()):
+            self._set_edge(node_ids[s], node_ids[t], w)
+        self._rebuild_eviction_heap()
+    
     def to_dict(self) -> Dict:
-        """序列化为字典"""
+        """序列化为字典 (可直接 json.dumps)"""
+        node_ids, weights, timestamps, access, src, dst, edge_weights = self._export_arrays()
         return {
             "user_id": self.user_id,
-            "nodes": dict(self.graph.nodes()),
-            "edges": list(self.graph.edges()),
-            "node_weights": self.node_weights,
-            "edge_weights": self.edge_weights,
-            "last_update": self.last_update,
-            "access_count": self.access_count,
+            "nodes": {node_id: dict(zip(("category", "topic"), node_id.split(":", 1)))
+                      for node_id in node_ids},
+            "edges": [[node_ids[s], node_ids[t]] for s, t in zip(src.tolist(), dst.tolist())],
+            "node_weights": dict(zip(node_ids, weights.tolist())),
+            # 边权重以 [source, target, weight] 列表保存，避免元组键无法JSON序列化
+            "edge_weights": [[node_ids[s], node_ids[t], w]
+                             for s, t, w in zip(src.tolist(), dst.tolist(), edge_weights.tolist())],
+            "last_update": dict(zip(node_ids, timestamps.tolist())),
+            "access_count": dict(zip(node_ids, access.tolist())),
             "version": self.version
         }
     
     @classmethod
-    def from_dict(cls, data: Dict):
-        """从字典反序列化"""
-        graph = cls(data["user_id"])
-        graph.version = data["version"]
-        graph.node_weights = data["node_weights"]
-        graph.edge_weights = data["edge_weights"]
-        graph.last_update = data["last_update"]
-        graph.access_count = data["access_count"]
+    def from_dict(cls, data: Dict, **kwargs):
+        """从字典反序列化 (兼容旧版元组键 edge_weights 和ISO时间戳)"""
+        graph = cls(data["user_id"], **kwargs)
         
-        for node in data["nodes"]:
-            graph.graph.add_node(node, **data["nodes"][node])
+        now = time.time()
+        node_ids = list(data["node_weights"])
+        index = {node_id: i for i, node_id in enumerate(node_ids)}
+        timestamps = []
+        for node_id in node_ids:
+            ts = data["last_update"].get(node_id, now)
+            if isinstance(ts, str):
+                ts = datetime.fromisoformat(ts).timestamp()  # 兼容旧版ISO时间戳
+            timestamps.append(float(ts))
         
-        for source, target in data["edges"]:
-            graph.graph.add_edge(source, target)
+        raw_edges = data.get("edge_weights", [])
+        if isinstance(raw_edges, dict):
+            raw_edges = [(s, t, w) for (s, t), w in raw_edges.items()]
+        edge_map = {(s, t): w for s, t, w in raw_edges}
+        for source, target in data.get("edges", []):
+            edge_map.setdefault((source, target), 1.0)
+        edges = [(index[s], index[t], w) for (s, t), w in edge_map.items()
+                 if s in index and t in index]
         
+        graph._import_arrays(
+            node_ids,
+            np.array([data["node_weights"][n] for n in node_ids], dtype=np.float64),
+            np.array(timestamps, dtype=np.float64),
+            np.array([data["access_count"].get(n, 0) for n in node_ids], dtype=np.uint32),
+            np.array([e[0] for e in edges], dtype=np.uint32),
+            np.array([e[1] for e in edges], dtype=np.uint32),
+            np.array([e[2] for e in edges], dtype=np.float64),
+        )
+        graph.version = data["version"]
         return graph
+
+
+def create_interest_graph(user_id: str, engine: str = None, eviction_policy=None) -> InterestGraph:
+    """
+    按存储引擎创建兴趣图谱。
+    
+    Args:
+        user_id (str): 用户唯一标识
+        engine (str, optional): "networkx" 或 "compact"，默认使用 GRAPH_ENGINE
+        eviction_policy (str | EvictionPolicy, optional): 淘汰策略，默认使用 EVICTION_POLICY
+    
+    Returns:
+        InterestGraph: 对应引擎的兴趣图谱实例
+    """
+    engine = engine or GRAPH_ENGINE
+    if engine == "compact":
+        from src.compact_graph import CompactInterestGraph
+        return CompactInterestGraph(user_id, eviction_policy=eviction_policy)
+    if engine == "networkx":
+        return InterestGraph(user_id, eviction_policy=eviction_policy)
+    raise ValueError(f"未知的图谱存储引擎: {engine}")
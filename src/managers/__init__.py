@@ -4,8 +4,12 @@
 包含：
   - EvolutionManager: 双智能体演化管理器
   - SessionManager: 用户会话管理器
+  - MaintenanceJob: 跨用户批量清理失效节点的维护任务
+  - MaintenanceScheduler: 按用户截止时间执行维护任务的调度器
 """
 
 from .evolution_manager import EvolutionManager, SessionManager
+from .maintenance import MaintenanceJob
+from .scheduler import MaintenanceScheduler
 
-__all__ = ['EvolutionManager', 'SessionManager']
+__all__ = ['EvolutionManager', 'SessionManager', 'MaintenanceJob', 'MaintenanceScheduler']
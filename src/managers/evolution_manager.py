@@ -4,19 +4,32 @@
 管理智能体A和B的协作、用户交互流程和演化过程。
 """
 
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+import json
+import threading
+from contextlib import ExitStack
 from src.agents.agent_a import AgentA
 from src.agents.agent_b import AgentB
-from src.interest_graph import InterestGraph
+from src.interest_graph import InterestGraph, create_interest_graph
+from src.cooccurrence import CooccurrenceGraph
+from src.storage.snapshot import SnapshotBundle, save_bundle
+from src.storage.journal import GraphJournal
+from src.storage.graph_store import InterestGraphStore
+from src.storage.session_store import SQLiteSessionStore
+from src.managers.maintenance import MaintenanceJob
+from src.managers.scheduler import MaintenanceScheduler
+from src.config import GRAPH_SNAPSHOTS
 
 
 class EvolutionManager:
     """管理两个智能体的演化过程"""
     
-    def __init__(self):
+    def __init__(self, cooccurrence: CooccurrenceGraph = None):
         self.agent_a = AgentA()
         self.agent_b = AgentB()
+        self.cooccurrence = cooccurrence  # 所有用户共享的共现图谱，为None时不汇总跨用户点击
+        self.deferred_evolution = False  # 为True时交互中不检查演化，由维护调度器调用 check_evolution
         self.evolution_history = []
         self.total_iterations = 0
         self.mutual_benefit_score = 0.0
@@ -30,7 +43,8 @@ class EvolutionManager:
         # 智能体A生成推荐
         recommendations = self.agent_a.generate_recommendations(
             user_query,
-            interest_graph
+            interest_graph,
+            self.cooccurrence
         )
         
         # 智能体B评估推荐
@@ -50,8 +64,8 @@ class EvolutionManager:
             feedback_data
         )
         
-        # 判断是否触发演化
-        should_evolve = self.agent_b.should_trigger_evolution()
+        # 判断是否触发演化 (推迟时由维护调度器在请求路径之外检查)
+        should_evolve = not self.deferred_evolution and self.agent_b.should_trigger_evolution()
         
         result = {
             "iteration": self.total_iterations,
@@ -81,21 +95,40 @@ class EvolutionManager:
     def _update_interest_graph(self, interest_graph: InterestGraph,
                               user_query: str, recommendations: List[Dict],
                               feedback_data: Dict):
-        """根据反馈更新兴趣图谱"""
+        """根据反馈更新兴趣图谱 (一次交互的所有修改作为一批提交)"""
         # 添加查询作为兴趣
-        interest_graph.add_interest(user_query, "query", weight=0.6)
+        updates = [("add_interest", user_query, "query", 0.6)]
         
         # 为点击的推荐添加兴趣关系
         clicked_indices = feedback_data.get("clicked_indices", [])
+        clicked_titles = []
         for idx in clicked_indices:
             if idx < len(recommendations):
                 title = recommendations[idx].get("title", "")
                 if title:
-                    interest_graph.add_interest(title, "clicked", weight=0.8)
+                    clicked_titles.append(title)
+                    updates.append(("add_interest", title, "clicked", 0.8))
                     # 添加查询和推荐的关联
-                    interest_graph.add_relation(
-                        user_query, title, "query", "clicked", strength=0.7
-                    )
+                    updates.append(("add_relation", user_query, title, "query", "clicked", 0.7))
+        
+        interest_graph.apply_updates(updates)
+        
+        # 汇总到跨用户共现图谱
+        if self.cooccurrence is not None:
+            self.cooccurrence.record(user_query, clicked_titles)
+    
+    def check_evolution(self) -> Optional[Dict]:
+        """
+        检查并在需要时执行演化 (供维护调度器在交互之后调用)。
+        
+        Returns:
+            dict: 演化记录，未触发时返回None
+        """
+        if not self.agent_b.should_trigger_evolution():
+            return None
+        evolution_info = self._trigger_evolution()
+        self.evolution_history.append(evolution_info)
+        return evolution_info
     
     def _trigger_evolution(self) -> Dict:
         """触发两个智能体的版本演化"""
@@ -144,62 +177,297 @@ class EvolutionManager:
             "agent_b_stats": self.agent_b.get_stats(),
             "evolution_history": self.evolution_history[-5:]
         }
+    
+    def to_dict(self) -> Dict:
+        """序列化演化状态 (智能体版本、AgentB评估指标、演化历史)"""
+        return {
+            "total_iterations": self.total_iterations,
+            "mutual_benefit_score": self.mutual_benefit_score,
+            "evolution_history": list(self.evolution_history),
+            "agent_a": self.agent_a.to_dict(),
+            "agent_b": self.agent_b.to_dict()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict, cooccurrence: CooccurrenceGraph = None) -> "EvolutionManager":
+        """从 to_dict 的结果恢复 (共现图谱是全局共享的，不随单个用户保存)"""
+        manager = cls(cooccurrence)
+        manager.total_iterations = data.get("total_iterations", 0)
+        manager.mutual_benefit_score = data.get("mutual_benefit_score", 0.0)
+        manager.evolution_history = list(data.get("evolution_history", []))
+        manager.agent_a.load_dict(data.get("agent_a", {}))
+        manager.agent_b = AgentB.from_dict(data.get("agent_b", {}))
+        return manager
 
 
 class SessionManager:
     """会话管理"""
     
-    def __init__(self):
-        self.users = {}
+    def __init__(self, journal: GraphJournal = None, graph_store: InterestGraphStore = None,
+                 persistence: SQLiteSessionStore = None, cooccurrence: CooccurrenceGraph = None,
+                 snapshots: bool = GRAPH_SNAPSHOTS):
+        # 兴趣图谱按内存预算常驻，冷用户落盘，访问时透明加载
+        self.users = graph_store if graph_store is not None else InterestGraphStore()
+        # 淘汰落盘须拿到该用户的锁，正在处理请求的用户不会被淘汰
+        self.users.lock_for = self.user_lock
         self.evolution_managers = {}
         self.session_history = {}
+        self.journal = journal
+        if journal is not None:
+            self.users.journal = journal
+        self.persistence = persistence  # 会话持久化，为None时重启后不保留
+        if persistence is not None:
+            persistence.lock_for = self.user_lock  # 后台写入时在用户锁内序列化图谱
+        # 所有用户共享的物品共现图谱，新用户也能得到其他用户的共同点击
+        self.cooccurrence = cooccurrence if cooccurrence is not None else CooccurrenceGraph()
+        # 跨用户批量清理失效节点，不活跃用户的图谱也能按时回收 (清理时持该用户的锁，正在处理请求的用户跳过)
+        self.maintenance = MaintenanceJob(self.users, lock_for=self.user_lock)
+        self.scheduler = None  # 按用户的维护调度器，enable_scheduler() 后启用
+        # 为用户图谱发布只读快照，不持用户锁的读取方 (如 get_user_profile) 不会读到修改中的图谱
+        self.snapshots = snapshots
+        self._user_locks = {}
+        self._user_locks_guard = threading.Lock()
+    
+    def user_lock(self, user_id: str) -> threading.RLock:
+        """用户锁：同一用户的请求与后台维护任务互斥"""
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            with self._user_locks_guard:
+                lock = self._user_locks.setdefault(user_id, threading.RLock())
+        return lock
+    
+    def enable_scheduler(self, start: bool = True, **kwargs) -> MaintenanceScheduler:
+        """
+        把失效节点清理、存储整理和演化检查移出请求路径，交给按用户的维护调度器。
+        
+        Args:
+            start (bool): 是否启动后台线程 (False 时由调用方定期调用 scheduler.run_pending)
+            **kwargs: 传给 MaintenanceScheduler 的参数
+        
+        Returns:
+            MaintenanceScheduler: 调度器
+        """
+        if self.scheduler is None:
+            self.scheduler = MaintenanceScheduler(self, **kwargs)
+            for user_id, graph in self.users.resident_items():
+                self._defer_maintenance(graph, self.evolution_managers.get(user_id))
+                self.scheduler.touch(user_id)
+        if start:
+            self.scheduler.start()
+        return self.scheduler
+    
+    def _defer_maintenance(self, interest_graph: InterestGraph, evo_manager: EvolutionManager):
+        interest_graph.auto_sweep = False
+        if evo_manager is not None:
+            evo_manager.deferred_evolution = True
         
     def get_or_create_user(self, user_id: str) -> Tuple[InterestGraph, EvolutionManager]:
-        """获取或创建用户的兴趣图谱和演化管理器"""
-        if user_id not in self.users:
-            self.users[user_id] = InterestGraph(user_id)
-            self.evolution_managers[user_id] = EvolutionManager()
-            self.session_history[user_id] = []
-        
-        return (
-            self.users[user_id],
-            self.evolution_managers[user_id]
-        )
+        """获取或创建用户的兴趣图谱和演化管理器 (落盘或已持久化的状态自动加载)"""
+        interest_graph = self.users.get(user_id)
+        if interest_graph is None:
+            if self.persistence is not None:
+                interest_graph = self.persistence.load_graph(user_id)
+            if interest_graph is None:
+                interest_graph = create_interest_graph(user_id)
+            if self.journal is not None:
+                self.journal.attach(interest_graph)
+            self.users[user_id] = interest_graph
+        if user_id not in self.evolution_managers:
+            state = self.persistence.load_session(user_id) if self.persistence is not None else None
+            if state is not None:
+                self.evolution_managers[user_id] = EvolutionManager.from_dict(state, self.cooccurrence)
+                self.session_history[user_id] = self.persistence.load_interactions(user_id)
+            else:
+                self.evolution_managers[user_id] = EvolutionManager(self.cooccurrence)
+                self.session_history[user_id] = []
+        # 从磁盘或持久化加载的对象是新建的，每次都重新设置
+        if self.scheduler is not None:
+            self._defer_maintenance(interest_graph, self.evolution_managers[user_id])
+        if self.snapshots:
+            self._enable_snapshots(interest_graph)
+        
+        return interest_graph, self.evolution_managers[user_id]
+    
+    @staticmethod
+    def _enable_snapshots(interest_graph: InterestGraph):
+        """
+        启用只读快照。每次发布都要复制整个图谱，因此不在每次修改后自动发布，
+        而是由持有用户锁的写入方在一组修改结束后调用 publish()，每次请求最多复制一次。
+        """
+        interest_graph.auto_publish = False
+        interest_graph.enable_snapshots()
+    
+    def _persist(self, user_id: str, interest_graph: InterestGraph, evo_manager: EvolutionManager):
+        """把用户放入写回队列 (图谱由后台写入时在用户锁内序列化，请求路径不复制图谱)"""
+        if self.persistence is not None:
+            self.persistence.mark_dirty(user_id, interest_graph, evo_manager.to_dict())
     
     def process_interaction(self, user_id: str, user_query: str,
                            feedback_data: Dict) -> Dict:
         """处理用户交互"""
-        interest_graph, evo_manager = self.get_or_create_user(user_id)
-        
-        result = evo_manager.process_user_interaction(
-            user_id,
-            user_query,
-            interest_graph,
-            feedback_data
-        )
-        
-        # 记录交互历史
-        self.session_history[user_id].append({
-            "query": user_query,
-            "timestamp": datetime.now().isoformat(),
-            "result": result
-        })
+        with self.user_lock(user_id):
+            interest_graph, evo_manager = self.get_or_create_user(user_id)
+            
+            result = evo_manager.process_user_interaction(
+                user_id,
+                user_query,
+                interest_graph,
+                feedback_data
+            )
+            
+            # 记录交互历史
+            record = {
+                "query": user_query,
+                "timestamp": datetime.now().isoformat(),
+                "result": result
+            }
+            self.session_history[user_id].append(record)
+            interest_graph.publish()
+            
+            if self.persistence is not None:
+                self.persistence.log_interaction(user_id, record)
+                self._persist(user_id, interest_graph, evo_manager)
         
+        if self.scheduler is not None:
+            self.scheduler.touch(user_id)
         return result
     
-    def get_user_profile(self, user_id: str) -> Dict:
-        """获取用户档案"""
-        if user_id not in self.users:
-            return {"user_id": user_id, "error": "用户不存在"}
+    def ingest_updates(self, updates_by_user: Dict[str, List]) -> int:
+        """
+        批量导入反馈流：每个用户的所有事件作为一批写入其兴趣图谱。
         
-        interest_graph = self.users[user_id]
-        evo_manager = self.evolution_managers[user_id]
+        Args:
+            updates_by_user (dict): user_id -> 修改列表 (格式同 InterestGraph.apply_updates)
         
+        Returns:
+            int: 执行的修改总数
+        """
+        applied = 0
+        for user_id, updates in updates_by_user.items():
+            with self.user_lock(user_id):
+                interest_graph, evo_manager = self.get_or_create_user(user_id)
+                applied += interest_graph.apply_updates(updates)
+                interest_graph.publish()
+                self._persist(user_id, interest_graph, evo_manager)
+            if self.scheduler is not None:
+                self.scheduler.touch(user_id)
+        return applied
+    
+    def get_user_profile(self, user_id: str) -> Dict:
+        """获取用户档案 (查找和加载在用户锁内，启用快照时图谱内容在锁外从不可变快照读取)"""
+        with self.user_lock(user_id):
+            if user_id not in self.users:
+                return {"user_id": user_id, "error": "用户不存在"}
+            interest_graph, evo_manager = self.get_or_create_user(user_id)
+            view = interest_graph.snapshot()
+            system_health = evo_manager.get_system_health()
+            interaction_count = len(self.session_history.get(user_id, []))
+            if view is interest_graph:
+                # 未启用快照时读取的是图谱本身，须在锁内完成
+                return self._build_profile(user_id, view, system_health, interaction_count)
+        return self._build_profile(user_id, view, system_health, interaction_count)
+    
+    @staticmethod
+    def _build_profile(user_id: str, view: InterestGraph, system_health: Dict, interaction_count: int) -> Dict:
         return {
             "user_id": user_id,
-            "interests": interest_graph.get_top_interests(top_k=10),
-            "graph_version": interest_graph.version,
-            "graph_size": len(interest_graph.graph),
-            "system_health": evo_manager.get_system_health(),
-            "interaction_count": len(self.session_history.get(user_id, []))
+            "interests": view.get_top_interests(top_k=10),
+            "graph_version": view.version,
+            "graph_size": len(view),
+            "system_health": system_health,
+            "interaction_count": interaction_count
         }
+    
+    def save_session(self, user_id: str, path: str) -> bool:
+        """
+        把单个用户的会话 (兴趣图谱、演化状态、交互记录) 导出为JSON文件。
+        
+        Returns:
+            bool: 是否保存成功
+        """
+        # 在用户锁内序列化，不会导出修改到一半的状态；写文件在锁外
+        with self.user_lock(user_id):
+            if user_id not in self.users:
+                return False
+            interest_graph, evo_manager = self.get_or_create_user(user_id)
+            data = {
+                "user_id": user_id,
+                "interest_graph": interest_graph.to_dict(),
+                "evolution": evo_manager.to_dict(),
+                "session_history": list(self.session_history.get(user_id, []))
+            }
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        except OSError as e:
+            print(f"⚠️  保存会话失败: {e}")
+            return False
+        return True
+    
+    def load_session(self, path: str) -> str:
+        """从 save_session 导出的JSON文件恢复用户会话，返回user_id"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        user_id = data["user_id"]
+        graph_cls = type(create_interest_graph(user_id))
+        interest_graph = graph_cls.from_dict(data["interest_graph"])
+        with self.user_lock(user_id):
+            self.evolution_managers[user_id] = EvolutionManager.from_dict(data["evolution"], self.cooccurrence)
+            self.session_history[user_id] = list(data.get("session_history", []))
+            self._install_graph(interest_graph)
+            if self.journal is not None:
+                self.journal.checkpoint([interest_graph])
+            self._persist(user_id, interest_graph, self.evolution_managers[user_id])
+        return user_id
+    
+    def run_maintenance(self, now: float = None) -> Dict:
+        """
+        运行一轮维护任务 (在处理请求的线程中于请求间隙调用，有时间预算)。
+        
+        Returns:
+            dict: 本轮清理的图谱数、移除的节点数和减少的估算内存 (字节)
+        """
+        return self.maintenance.tick(now)
+    
+    def get_store_stats(self) -> Dict:
+        """兴趣图谱存储的命中率、淘汰和落盘统计"""
+        return self.users.get_stats()
+    
+    def save_graph_snapshot(self, path: str) -> int:
+        """将所有用户的兴趣图谱保存为批量二进制快照，返回保存的用户数"""
+        return save_bundle(self.users.values(), path)
+    
+    def _install_graph(self, interest_graph: InterestGraph):
+        """
+        放入外部恢复的图谱 (调用方持有用户锁)：挂上日志，并对放入的图谱本身
+        (而不是 get_or_create_user 新建的占位图谱) 设置延后维护和只读快照。
+        """
+        if self.journal is not None and interest_graph.journal is None:
+            self.journal.attach(interest_graph)
+        self.users[interest_graph.user_id] = interest_graph
+        self.get_or_create_user(interest_graph.user_id)
+    
+    def load_graph_snapshot(self, path: str) -> int:
+        """
+        从批量二进制快照恢复兴趣图谱，返回恢复的用户数。
+        
+        配置了日志时，恢复的图谱挂上日志并写入日志快照作为回放基准，之后的修改可以崩溃恢复。
+        """
+        with SnapshotBundle(path) as bundle:
+            graphs = list(bundle.load_all())
+            count = len(bundle)
+        with ExitStack() as stack:
+            for graph in graphs:
+                stack.enter_context(self.user_lock(graph.user_id))
+                self._install_graph(graph)
+            if self.journal is not None:
+                self.journal.checkpoint(graphs)
+        return count
+    
+    def recover_from_journal(self) -> int:
+        """从修改日志 (最新快照 + 日志回放) 恢复兴趣图谱，返回恢复的用户数"""
+        graphs = self.journal.recover()
+        for user_id, graph in graphs.items():
+            with self.user_lock(user_id):
+                self._install_graph(graph)
+        return len(graphs)
@@ -0,0 +1,242 @@
+"""
+跨用户维护任务
+
+兴趣权重只在读取时惰性衰减，失效节点要等该用户下次访问才会被清理，不活跃
+用户的图谱会一直占着内存和磁盘。维护任务按固定节奏批量清理所有用户：
+  1. 常驻图谱：一次取出所有图谱的最小排序键组成数组，与当前时间的失效阈值
+     做向量化比较，只对确有失效节点的图谱执行 decay_interests
+  2. 落盘图谱：按 MAINTENANCE_SHARD_SIZE 分片，可提交到进程池并行处理；
+     工作进程只解析快照的节点数组做向量化检查，有失效节点时才解码、清理、
+     重新编码，由主进程确认磁盘副本未被改动后替换
+  3. 每轮有时间预算，预算用完后剩余的图谱留到下一轮 (落盘图谱按游标轮转)
+
+并发：后台线程运行时须传入与写入方共用的锁 (lock)，或返回用户锁的函数 (lock_for)。
+设置 lock_for 时每个常驻图谱的检查、清理、发布快照和内存重估都在该用户的锁内完成，
+锁正被写入方占用的用户跳过，留到下一轮；单次持锁时间只与该图谱的大小有关。
+"""
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from src.interest_graph import _LOG_DECAY_RATE
+from src.storage.graph_store import InterestGraphStore
+from src.storage.snapshot import dumps_graph, loads_graph, read_node_arrays
+from src.config import (INTEREST_MIN_WEIGHT, MAINTENANCE_INTERVAL, MAINTENANCE_TIME_BUDGET,
+                        MAINTENANCE_PROCESSES, MAINTENANCE_SHARD_SIZE)
+
+
+def decay_threshold(now: float) -> float:
+    """排序键低于该值的节点在 now 时已衰减到 INTEREST_MIN_WEIGHT 以下"""
+    return math.log(INTEREST_MIN_WEIGHT) - _LOG_DECAY_RATE * now
+
+
+def maintain_spilled(paths: List[Tuple[str, str]], now: float, engine: str = None) -> List[Tuple]:
+    """
+    清理一批落盘图谱 (进程池的工作函数，不修改文件)。
+
+    Args:
+        paths (list): [(user_id, 快照路径), ...]
+        now (float): 清理时间 (epoch秒)
+        engine (str, optional): 解码使用的存储引擎
+
+    Returns:
+        list: 有失效节点的图谱 [(user_id, 原版本, 新版本, 移除节点数, 新快照), ...]
+    """
+    results = []
+    for user_id, path in paths:
+        try:
+            with open(path, "rb") as f:
+                data = bytearray(f.read())
+        except FileNotFoundError:
+            continue  # 用户已被删除
+        _, version, timestamps, weights = read_node_arrays(data)
+        decayed = weights * np.exp(_LOG_DECAY_RATE * np.maximum(now - timestamps, 0.0))
+        if not np.any(decayed < INTEREST_MIN_WEIGHT):
+            continue
+        graph = loads_graph(data, 0, engine)
+        removed = graph.decay_interests(now)
+        results.append((user_id, version, graph.version, removed, dumps_graph(graph)))
+    return results
+
+
+class MaintenanceJob:
+    """
+    跨用户批量清理失效节点的维护任务。
+
+    Attributes:
+        store (InterestGraphStore): 兴趣图谱存储
+        time_budget (float): 每轮的时间预算 (秒)
+        processes (int): 处理落盘图谱的进程数，0表示在当前线程中处理
+        shard_size (int): 每个分片的落盘图谱数
+        lock: 与写入方共用的锁，为None时调用方须保证 tick() 不与写入并发
+        lock_for (callable): user_id -> 用户锁，清理常驻图谱前须立即拿到该锁，拿不到时跳过该用户
+    """
+
+    def __init__(self, store: InterestGraphStore, time_budget: float = MAINTENANCE_TIME_BUDGET,
+                 processes: int = MAINTENANCE_PROCESSES, shard_size: int = MAINTENANCE_SHARD_SIZE,
+                 lock=None, lock_for: Callable[[str], threading.RLock] = None):
+        self.store = store
+        self.time_budget = time_budget
+        self.processes = processes
+        self.shard_size = shard_size
+        self.lock = lock
+        self.lock_for = lock_for
+        self._pool = None
+        self._cursor = 0  # 落盘图谱的轮转位置
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.ticks = 0
+        self.graphs_swept = 0
+        self.graphs_skipped = 0
+        self.nodes_removed = 0
+        self.bytes_reclaimed = 0
+        self.files_rewritten = 0
+
+    def _locked(self):
+        return self.lock if self.lock is not None else nullcontext()
+
+    # ===== 常驻图谱 =====
+
+    def _sweep_resident(self, now: float, deadline: float) -> bool:
+        """清理常驻图谱，预算内处理完时返回True"""
+        with self._locked():
+            items = self.store.resident_items()
+            keys = np.fromiter((graph._min_rank_key() for _, graph in items), dtype=np.float64, count=len(items))
+        for i in np.flatnonzero(keys < decay_threshold(now)).tolist():
+            if time.perf_counter() >= deadline:
+                return False
+            user_id, graph = items[i]
+            user_lock = self.lock_for(user_id) if self.lock_for is not None else None
+            if user_lock is not None and not user_lock.acquire(blocking=False):
+                self.graphs_skipped += 1  # 写入方正在修改，留到下一轮
+                continue
+            try:
+                with self._locked():
+                    if self.store.resident(user_id) is not graph:
+                        continue  # 期间已被淘汰落盘或删除
+                    removed = graph.decay_interests(now)
+                    graph.publish()
+                    reclaimed = self.store.refresh(user_id)
+            finally:
+                if user_lock is not None:
+                    user_lock.release()
+            self.graphs_swept += 1
+            self.nodes_removed += removed
+            self.bytes_reclaimed += max(reclaimed, 0)
+        return True
+
+    # ===== 落盘图谱 =====
+
+    def _apply(self, results: List[Tuple]):
+        """把工作进程的结果写回存储"""
+        for user_id, version, new_version, removed, data in results:
+            with self._locked():
+                replaced = self.store.replace_spilled(user_id, version, new_version, data)
+            if replaced:
+                self.graphs_swept += 1
+                self.files_rewritten += 1
+                self.nodes_removed += removed
+
+    def _sweep_spilled(self, now: float, deadline: float):
+        with self._locked():
+            paths = self.store.spilled_paths()
+        if not paths:
+            return
+        start = self._cursor % len(paths)
+        paths = paths[start:] + paths[:start]
+        shards = [paths[i:i + self.shard_size] for i in range(0, len(paths), self.shard_size)]
+        engine = self.store.engine
+        done = 0
+
+        if self.processes <= 0:
+            for shard in shards:
+                if time.perf_counter() >= deadline:
+                    break
+                self._apply(maintain_spilled(shard, now, engine))
+                done += len(shard)
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.processes)
+            pending = {}
+            shards.reverse()
+            # 预算用完后不再提交新分片，已提交的分片等待完成 (单个分片的耗时有上限)
+            while shards or pending:
+                while shards and len(pending) < self.processes and time.perf_counter() < deadline:
+                    shard = shards.pop()
+                    pending[self._pool.submit(maintain_spilled, shard, now, engine)] = len(shard)
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done += pending.pop(future)
+                    self._apply(future.result())
+        self._cursor = start + done
+
+    # ===== 调度 =====
+
+    def tick(self, now: float = None) -> Dict:
+        """
+        运行一轮维护：先清理常驻图谱，预算有剩余时再处理落盘图谱。
+
+        Args:
+            now (float, optional): 清理时间 (epoch秒)，默认当前时间
+
+        Returns:
+            dict: 本轮清理的图谱数、移除的节点数和减少的估算内存 (字节)
+        """
+        if now is None:
+            now = time.time()
+        before = (self.graphs_swept, self.nodes_removed, self.bytes_reclaimed)
+        deadline = time.perf_counter() + self.time_budget
+        if self._sweep_resident(now, deadline):
+            self._sweep_spilled(now, deadline)
+        self.ticks += 1
+        return {
+            "graphs_swept": self.graphs_swept - before[0],
+            "nodes_removed": self.nodes_removed - before[1],
+            "bytes_reclaimed": self.bytes_reclaimed - before[2],
+        }
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"⚠️  维护任务失败: {e}")
+
+    def start(self, interval: float = MAINTENANCE_INTERVAL):
+        """在后台线程中每 interval 秒运行一轮 (须设置 lock 或 lock_for)"""
+        if self.lock is None and self.lock_for is None:
+            raise ValueError("后台运行维护任务须提供与写入方共用的锁")
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="graph-maintenance",
+                                            daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """停止后台线程并关闭进程池"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def get_stats(self) -> Dict:
+        """累计统计"""
+        return {
+            "ticks": self.ticks,
+            "graphs_swept": self.graphs_swept,
+            "graphs_skipped": self.graphs_skipped,
+            "nodes_removed": self.nodes_removed,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "files_rewritten": self.files_rewritten,
+        }
@@ -0,0 +1,153 @@
+"""
+按用户的维护调度器
+
+把原先挂在请求路径上的维护工作移到后台，按用户的截止时间执行：
+  - decay:     清理失效节点 (原先在读写时按 INTEREST_SWEEP_INTERVAL 触发)
+  - compact:   整理图谱存储，回收删除节点后未释放的内部表空间 (见 InterestGraph.compact)
+  - evolution: 检查是否触发演化 (原先每次交互都检查)
+
+每个 (用户, 任务) 只有一个截止时间，保存在分层时间轮中 (见 src/timing_wheel.py)；
+用户有交互时登记尚未登记的任务，任务执行后按需重新登记。后台线程每个刻度
+推进时间轮，最多执行 SCHEDULER_MAX_TASKS 个到期任务，其余顺延到下一刻度。
+
+只处理常驻内存的用户；已落盘的用户由 MaintenanceJob 批量处理。
+任务在用户锁 (SessionManager.user_lock) 内执行，不与该用户的请求并发。
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from src.timing_wheel import TimingWheel
+from src.config import (INTEREST_SWEEP_INTERVAL, SCHEDULER_TICK, SCHEDULER_SLOTS, SCHEDULER_LEVELS,
+                        SCHEDULER_MAX_TASKS, SCHEDULER_COMPACT_INTERVAL, SCHEDULER_EVOLUTION_DELAY)
+
+TASK_DECAY = "decay"
+TASK_COMPACT = "compact"
+TASK_EVOLUTION = "evolution"
+
+
+class MaintenanceScheduler:
+    """
+    按用户截止时间执行维护任务的调度器。
+
+    Attributes:
+        session: SessionManager
+        max_tasks (int): 每个刻度最多执行的任务数
+        delays (dict): 任务类型 -> 用户交互后到执行的延迟 (秒)
+    """
+
+    def __init__(self, session, tick: float = SCHEDULER_TICK, max_tasks: int = SCHEDULER_MAX_TASKS,
+                 decay_interval: float = INTEREST_SWEEP_INTERVAL,
+                 compact_interval: float = SCHEDULER_COMPACT_INTERVAL,
+                 evolution_delay: float = SCHEDULER_EVOLUTION_DELAY, now: float = None):
+        self.session = session
+        self.max_tasks = max_tasks
+        self.delays = {TASK_DECAY: decay_interval, TASK_COMPACT: compact_interval,
+                       TASK_EVOLUTION: evolution_delay}
+        self._wheel = TimingWheel(tick, SCHEDULER_SLOTS, SCHEDULER_LEVELS, time.time() if now is None else now)
+        self._ready = deque()  # 已到期、尚未执行的 (用户, 任务)
+        self._lock = threading.Lock()  # 保护时间轮和就绪队列
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.tasks_run = {TASK_DECAY: 0, TASK_COMPACT: 0, TASK_EVOLUTION: 0}
+        self.nodes_removed = 0
+        self.bytes_reclaimed = 0
+        self.evolutions = 0
+
+    def __len__(self) -> int:
+        """已登记和已到期待执行的任务数"""
+        with self._lock:
+            return len(self._wheel) + len(self._ready)
+
+    def touch(self, user_id: str, now: float = None):
+        """用户有交互：登记该用户尚未登记的维护任务 (已登记的保持原截止时间)"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            for task, delay in self.delays.items():
+                if (user_id, task) not in self._wheel:
+                    self._wheel.schedule((user_id, task), now + delay)
+
+    def cancel(self, user_id: str):
+        """取消用户的所有维护任务"""
+        with self._lock:
+            for task in self.delays:
+                self._wheel.cancel((user_id, task))
+
+    def run_pending(self, now: float = None) -> int:
+        """
+        推进时间轮并执行到期任务 (最多 max_tasks 个)。
+
+        Returns:
+            int: 执行的任务数
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._ready.extend(key for key, _ in self._wheel.advance(now))
+            batch = [self._ready.popleft() for _ in range(min(self.max_tasks, len(self._ready)))]
+        for user_id, task in batch:
+            self._run_task(user_id, task, now)
+        return len(batch)
+
+    def _run_task(self, user_id: str, task: str, now: float):
+        session = self.session
+        with session.user_lock(user_id):
+            # 在用户锁内取图谱：锁外取到的对象可能已被落盘、重新加载的新对象取代
+            graph = session.users.resident(user_id)
+            if graph is None:
+                return  # 已落盘或已删除，下次交互时重新登记
+            evo_manager = session.evolution_managers.get(user_id)
+            if task == TASK_DECAY:
+                removed = graph.decay_interests(now)
+                self.nodes_removed += removed
+                changed = removed > 0
+            elif task == TASK_COMPACT:
+                self.bytes_reclaimed += graph.compact()
+                changed = False
+            else:
+                changed = evo_manager is not None and evo_manager.check_evolution() is not None
+                self.evolutions += changed
+            graph.publish()  # 启用快照时发布清理后的状态 (版本未变时不复制)
+            if changed and evo_manager is not None:
+                session._persist(user_id, graph, evo_manager)
+        self.tasks_run[task] += 1
+        if task == TASK_DECAY and len(graph):
+            # 清理周期性进行，直到图谱被清空或用户落盘
+            with self._lock:
+                if (user_id, task) not in self._wheel:
+                    self._wheel.schedule((user_id, task), now + self.delays[task])
+
+    def _run(self, tick: float):
+        while not self._stop.wait(tick):
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"⚠️  维护调度失败: {e}")
+
+    def start(self):
+        """在后台线程中每个刻度运行一次 run_pending"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(self._wheel.tick,),
+                                            name="maintenance-scheduler", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_stats(self) -> Dict:
+        """执行统计"""
+        return {
+            "pending": len(self),
+            "tasks_run": dict(self.tasks_run),
+            "nodes_removed": self.nodes_removed,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "evolutions": self.evolutions,
+        }
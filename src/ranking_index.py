@@ -0,0 +1,129 @@
+"""
+排序索引模块
+
+为兴趣图谱维护一个按权重排序的节点索引，支持：
+  1. 增量插入、更新、删除 (分桶有序列表，单次约 O(log n + √n))
+  2. 按权重降序取前k个 (O(k)，无需全量排序)
+  3. 按权重升序取后k个 (用于清理和淘汰)
+
+结构说明：
+  - 元素为 (key, node_id)，按升序存放在若干有序桶中
+  - 每个桶的最大元素记录在 _maxes 中，通过二分查找定位桶
+  - 桶超过 2 × load 时拆分，避免单次插入搬移过多元素
+"""
+from bisect import bisect_left, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class RankingIndex:
+    """
+    按键排序的节点索引。
+
+    Attributes:
+        load (int): 桶的目标大小
+    """
+
+    def __init__(self, load: int = 256):
+        self.load = load
+        self._keys: Dict[str, float] = {}
+        self._buckets: List[List[Tuple[float, str]]] = []
+        self._maxes: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._keys
+
+    def key(self, node_id: str) -> Optional[float]:
+        """获取节点当前的排序键"""
+        return self._keys.get(node_id)
+
+    def add(self, node_id: str, key: float):
+        """插入节点，已存在时更新其排序键"""
+        if node_id in self._keys:
+            if self._keys[node_id] == key:
+                return
+            self.remove(node_id)
+
+        self._keys[node_id] = key
+        item = (key, node_id)
+
+        if not self._buckets:
+            self._buckets.append([item])
+            self._maxes.append(item)
+            return
+
+        pos = bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._buckets[pos].append(item)
+            self._maxes[pos] = item
+        else:
+            insort(self._buckets[pos], item)
+
+        if len(self._buckets[pos]) > 2 * self.load:
+            self._split(pos)
+
+    def remove(self, node_id: str) -> bool:
+        """删除节点，返回节点是否存在"""
+        key = self._keys.pop(node_id, None)
+        if key is None:
+            return False
+
+        item = (key, node_id)
+        pos = bisect_left(self._maxes, item)
+        bucket = self._buckets[pos]
+        del bucket[bisect_left(bucket, item)]
+
+        if bucket:
+            self._maxes[pos] = bucket[-1]
+        else:
+            del self._buckets[pos]
+            del self._maxes[pos]
+        return True
+
+    def clear(self):
+        """清空索引"""
+        self._keys.clear()
+        self._buckets.clear()
+        self._maxes.clear()
+
+    def _split(self, pos: int):
+        """将过大的桶一分为二"""
+        bucket = self._buckets[pos]
+        half = len(bucket) // 2
+        self._buckets[pos:pos + 1] = [bucket[:half], bucket[half:]]
+        self._maxes[pos:pos + 1] = [bucket[half - 1], bucket[-1]]
+
+    def iter_desc(self) -> Iterator[Tuple[float, str]]:
+        """按键降序遍历 (key, node_id)"""
+        for bucket in reversed(self._buckets):
+            yield from reversed(bucket)
+
+    def iter_asc(self) -> Iterator[Tuple[float, str]]:
+        """按键升序遍历 (key, node_id)"""
+        for bucket in self._buckets:
+            yield from bucket
+
+    def top(self, k: int) -> List[Tuple[float, str]]:
+        """键最大的k个元素，降序"""
+        result = []
+        if k <= 0:
+            return result
+        for item in self.iter_desc():
+            result.append(item)
+            if len(result) >= k:
+                break
+        return result
+
+    def bottom(self, k: int) -> List[Tuple[float, str]]:
+        """键最小的k个元素，升序"""
+        result = []
+        if k <= 0:
+            return result
+        for item in self.iter_asc():
+            result.append(item)
+            if len(result) >= k:
+                break
+        return result
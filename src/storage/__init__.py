@@ -0,0 +1,32 @@
+"""
+持久化模块
+
+包含：
+  - snapshot: 兴趣图谱二进制快照 (单用户/批量，支持mmap加载)
+  - journal: 分片的图谱修改日志，快照 + 日志回放恢复
+  - graph_store: 带内存预算的分层图谱存储 (内存LRU + 磁盘落盘)
+  - session_store: SQLite (WAL) 会话持久化，后台批量写回
+  - generation_cache: SQLite (WAL) 跨进程共享的生成结果缓存
+"""
+
+from .snapshot import (SnapshotBundle, SnapshotError, dumps_graph, loads_graph,
+                       save_graph, load_graph, save_bundle)
+from .journal import GraphJournal, JournalCompactor
+from .graph_store import InterestGraphStore
+from .session_store import SQLiteSessionStore
+from .generation_cache import SQLiteGenerationCache
+
+__all__ = [
+    'SnapshotBundle',
+    'SnapshotError',
+    'dumps_graph',
+    'loads_graph',
+    'save_graph',
+    'load_graph',
+    'save_bundle',
+    'GraphJournal',
+    'JournalCompactor',
+    'InterestGraphStore',
+    'SQLiteSessionStore',
+    'SQLiteGenerationCache',
+]
@@ -0,0 +1,163 @@
+"""
+跨进程共享的生成结果缓存 (SQLite)
+
+进程内的推荐缓存 (agents/recommendation_cache.py) 随部署重启清空，也不在
+同一主机的多个工作进程之间共享。本模块是它的二级缓存：
+  1. 同一主机的所有工作进程打开同一个数据库文件，WAL模式下读不阻塞写、
+     写不阻塞读；多个写入方之间按 busy_timeout 等待
+  2. 推荐列表序列化为紧凑JSON (无空白、不转义非ASCII)
+  3. 每个条目记录写入时间，读取时按TTL判断是否过期；每写入 prune_interval
+     次清理一次过期条目，并按写入时间删除超出 max_entries 的最旧条目
+  4. 数据库出错 (如锁等待超时) 时按未命中处理，不影响请求
+
+表结构：
+  generations (key, created, data)   key 为缓存键的JSON，data 为推荐列表的JSON
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+from src.config import RECOMMENDATION_CACHE_TTL, RECOMMENDATION_CACHE_DB_MAX_ENTRIES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generations_created ON generations (created);
+"""
+
+
+def _key_text(key: Hashable) -> str:
+    """缓存键 (字符串/数字组成的元组) 的稳定文本形式"""
+    return json.dumps(list(key) if isinstance(key, tuple) else key, ensure_ascii=False, separators=(",", ":"))
+
+
+class SQLiteGenerationCache:
+    """
+    基于SQLite (WAL模式) 的跨进程生成结果缓存。
+
+    Attributes:
+        path (str): 数据库文件路径 (同一主机的工作进程共用)
+        ttl (float): 条目的有效期 (秒)
+        max_entries (int): 最多保留的条目数
+        prune_interval (int): 每写入该次数清理一次
+    """
+
+    def __init__(self, path: str, ttl: float = RECOMMENDATION_CACHE_TTL,
+                 max_entries: int = RECOMMENDATION_CACHE_DB_MAX_ENTRIES, prune_interval: int = 256,
+                 busy_timeout: float = 5.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()  # 连接在本进程的线程之间共享
+        self._puts_since_prune = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.pruned = 0
+        self.errors = 0
+
+    def get(self, key: Hashable, now: float = None) -> Optional[Tuple[float, Tuple[Dict, ...]]]:
+        """
+        读取条目。
+
+        Returns:
+            tuple: (写入时间, 推荐列表)，未命中、已过期或出错时返回None
+        """
+        if now is None:
+            now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT created, data FROM generations WHERE key = ?",
+                                         (_key_text(key),)).fetchone()
+        except sqlite3.Error:
+            self.errors += 1
+            row = None
+        if row is None or now - row[0] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0], tuple(json.loads(row[1]))
+
+    def put(self, key: Hashable, recommendations: Iterable[Dict], now: float = None):
+        """写入条目 (覆盖同键的旧条目)"""
+        if now is None:
+            now = time.time()
+        data = json.dumps(list(recommendations), ensure_ascii=False, separators=(",", ":"),
+                          default=str).encode("utf-8")
+        try:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO generations (key, created, data) VALUES (?, ?, ?)",
+                                   (_key_text(key), now, data))
+                self._puts_since_prune += 1
+                prune = self._puts_since_prune >= self.prune_interval
+            self.writes += 1
+            if prune:
+                self.prune(now)
+        except sqlite3.Error:
+            self.errors += 1
+
+    def invalidate(self, keys: Iterable[Hashable]) -> int:
+        """删除指定的条目，返回删除的条目数"""
+        rows = [(_key_text(key),) for key in keys]
+        if not rows:
+            return 0
+        try:
+            with self._lock:
+                before = self._conn.total_changes
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany("DELETE FROM generations WHERE key = ?", rows)
+                return self._conn.total_changes - before
+        except sqlite3.Error:
+            self.errors += 1
+            return 0
+
+    def prune(self, now: float = None) -> int:
+        """删除过期条目和超出 max_entries 的最旧条目，返回删除的条目数"""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self._puts_since_prune = 0
+            before = self._conn.total_changes
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute("DELETE FROM generations WHERE created < ?", (now - self.ttl,))
+                excess = self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self._conn.execute("DELETE FROM generations WHERE key IN "
+                                       "(SELECT key FROM generations ORDER BY created LIMIT ?)", (excess,))
+            removed = self._conn.total_changes - before
+        self.pruned += removed
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    def get_stats(self) -> Dict:
+        """命中、写入和清理统计 (本进程)"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "pruned": self.pruned,
+            "errors": self.errors,
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,318 @@
+"""
+分层兴趣图谱存储
+
+内存中按LRU顺序保留活跃用户的图谱，超出内存预算时把最久未访问的图谱
+写成二进制快照落盘，下次访问时透明地从磁盘加载：
+  1. 内存占用按 InterestGraph.memory_estimate() 估算，每次访问时更新
+  2. 淘汰时图谱版本与磁盘副本一致则直接丢弃，不重复写盘；写盘失败的图谱保留在内存中，
+     计入 spill_failures，继续尝试下一个 (预算暂时超出，不丢失用户状态)
+  3. 加载时整个文件读入内存 (见 snapshot.load_graph)，不占用文件描述符，磁盘副本保留
+
+并发：存储内部状态 (LRU顺序、内存计数、磁盘索引) 由存储锁保护，多个线程可以
+同时访问不同用户。设置了 lock_for (返回用户锁的函数) 时，淘汰只落盘能立即拿到
+用户锁的图谱，正被其所有者修改的图谱跳过，留到下次淘汰，避免落盘后丢失修改。
+
+文件布局 (目录下)：
+  {sha1前两位}/{sha1(user_id)}.bin    单用户快照，按哈希前缀分目录
+"""
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.interest_graph import InterestGraph
+from src.storage.snapshot import _GRAPH_HEADER, GRAPH_MAGIC, _write_atomic, save_graph, load_graph
+from src.config import GRAPH_STORE_MEMORY_BUDGET, GRAPH_STORE_DIR
+
+
+def _read_user_id(path: str) -> Optional[str]:
+    """只读取快照头部的 user_id，不是有效快照时返回None"""
+    with open(path, "rb") as f:
+        header = f.read(_GRAPH_HEADER.size)
+        if len(header) < _GRAPH_HEADER.size:
+            return None
+        magic, *_, uid_len = _GRAPH_HEADER.unpack(header)
+        if magic != GRAPH_MAGIC:
+            return None
+        return f.read(uid_len).decode("utf-8")
+
+
+class InterestGraphStore:
+    """
+    带内存预算的兴趣图谱存储 (用法同 dict: user_id -> InterestGraph)。
+
+    Attributes:
+        memory_budget (int): 常驻内存的图谱估算总大小上限 (字节)
+        engine (str): 从磁盘加载时使用的存储引擎，None表示 GRAPH_ENGINE
+        journal (GraphJournal): 从磁盘加载的图谱会挂到该日志上，为None时不挂
+        lock_for (callable): user_id -> 用户锁，淘汰时须拿到该锁才落盘，为None时不检查
+    """
+
+    def __init__(self, directory: str = GRAPH_STORE_DIR,
+                 memory_budget: int = GRAPH_STORE_MEMORY_BUDGET,
+                 engine: str = None, journal=None,
+                 lock_for: Callable[[str], threading.RLock] = None):
+        self.memory_budget = memory_budget
+        self.engine = engine
+        self.journal = journal
+        self.lock_for = lock_for
+        self._lock = threading.RLock()  # 保护以下内部状态
+        self._directory = directory
+        self._owns_directory = False
+
+        self._hot: "OrderedDict[str, InterestGraph]" = OrderedDict()  # 最近访问的在末尾
+        self._sizes: Dict[str, int] = {}  # 常驻图谱上次访问时的估算大小
+        self._memory = 0
+        self._disk: Dict[str, int] = {}  # 已落盘的用户 -> 磁盘副本的图谱版本 (-1表示版本未知)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evictions_skipped = 0
+        self.spill_failures = 0
+        self.spill_writes = 0
+        self.spill_bytes = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    # ===== 磁盘 =====
+
+    @property
+    def directory(self) -> str:
+        """落盘目录 (未指定时首次使用才创建临时目录)"""
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="interest_graphs_")
+            self._owns_directory = True
+        return self._directory
+
+    def _path(self, user_id: str) -> str:
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.bin")
+
+    def _scan(self):
+        """索引目录中已有的快照 (上次运行落盘的图谱)"""
+        for path in glob.glob(os.path.join(self._directory, "*", "*.bin")):
+            user_id = _read_user_id(path)
+            if user_id is not None:
+                self._disk[user_id] = -1
+
+    def _spill(self, user_id: str, graph: InterestGraph):
+        """把图谱写到磁盘 (磁盘副本已是最新版本时跳过)"""
+        with self._lock:
+            if self._disk.get(user_id) == graph.version:
+                return
+            path = self._path(user_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            save_graph(graph, path)
+            self._disk[user_id] = graph.version
+            self.spill_writes += 1
+            self.spill_bytes += os.path.getsize(path)
+
+    def _load(self, user_id: str) -> InterestGraph:
+        graph = load_graph(self._path(user_id), self.engine)
+        self._disk[user_id] = graph.version
+        if self.journal is not None:
+            self.journal.attach(graph)
+        return graph
+
+    # ===== 内存 =====
+
+    def _admit(self, user_id: str, graph: InterestGraph):
+        """放入内存并按预算淘汰 (调用方持有存储锁，刚放入的图谱本身不会被淘汰)"""
+        self._memory -= self._sizes.get(user_id, 0)
+        self._hot[user_id] = graph
+        self._hot.move_to_end(user_id)
+        size = graph.memory_estimate()
+        self._sizes[user_id] = size
+        self._memory += size
+        if self._memory > self.memory_budget:
+            self._evict(user_id)
+
+    def _evict(self, keep: str):
+        """按LRU顺序落盘图谱直到不超预算，跳过 keep 和用户锁被占用的图谱 (调用方持有存储锁)"""
+        for victim in list(self._hot):
+            if self._memory <= self.memory_budget:
+                break
+            if victim == keep:
+                continue
+            lock = self.lock_for(victim) if self.lock_for is not None else None
+            if lock is not None and not lock.acquire(blocking=False):
+                self.evictions_skipped += 1  # 所有者正在使用，留到下次淘汰
+                continue
+            try:
+                # 先落盘，写入成功后才移出内存；写盘失败时图谱保留常驻，换下一个
+                self._spill(victim, self._hot[victim])
+            except Exception as e:
+                self.spill_failures += 1
+                print(f"⚠️  图谱落盘失败 (用户 {victim})，保留在内存中: {e}")
+                continue
+            finally:
+                if lock is not None:
+                    lock.release()
+            del self._hot[victim]
+            self._memory -= self._sizes.pop(victim)
+            self.evictions += 1
+
+    def refresh(self, user_id: str) -> int:
+        """
+        图谱在原处被修改 (如维护任务清理) 后重新估算其内存占用，不改变LRU顺序。
+
+        Returns:
+            int: 估算内存的减少量 (字节)，图谱不在内存中时为0
+        """
+        with self._lock:
+            graph = self._hot.get(user_id)
+            if graph is None:
+                return 0
+            size = graph.memory_estimate()
+            reclaimed = self._sizes[user_id] - size
+            self._sizes[user_id] = size
+            self._memory -= reclaimed
+            return reclaimed
+
+    def resident(self, user_id: str) -> Optional[InterestGraph]:
+        """常驻内存时返回图谱 (不改变LRU顺序)，否则返回None"""
+        with self._lock:
+            return self._hot.get(user_id)
+
+    def resident_items(self) -> List[Tuple[str, InterestGraph]]:
+        """常驻内存的图谱 (最久未访问的在前)，不改变LRU顺序也不计入命中统计"""
+        with self._lock:
+            return list(self._hot.items())
+
+    def spilled_paths(self) -> List[Tuple[str, str]]:
+        """只在磁盘上的用户及其快照路径"""
+        with self._lock:
+            return [(user_id, self._path(user_id)) for user_id in self._disk if user_id not in self._hot]
+
+    def replace_spilled(self, user_id: str, expected_version: int, version: int, data: bytes) -> bool:
+        """
+        用外部处理后的快照替换磁盘副本 (如维护任务在其他进程中清理的落盘图谱)。
+
+        处理期间用户被加载到内存，或磁盘副本已被重写为其他版本时放弃替换，
+        避免覆盖更新的状态。
+
+        Args:
+            user_id (str): 用户ID
+            expected_version (int): 处理所基于的磁盘副本版本
+            version (int): 新快照的图谱版本
+            data (bytes): 新快照 (snapshot.dumps_graph)
+
+        Returns:
+            bool: 是否已替换
+        """
+        with self._lock:
+            if user_id in self._hot or self._disk.get(user_id) not in (expected_version, -1):
+                return False
+            _write_atomic(self._path(user_id), [data])
+            self._disk[user_id] = version
+            return True
+
+    def flush(self) -> int:
+        """把所有常驻图谱写到磁盘 (不淘汰)，返回写入的图谱数"""
+        with self._lock:
+            before = self.spill_writes
+            for user_id, graph in self._hot.items():
+                self._spill(user_id, graph)
+            return self.spill_writes - before
+
+    # ===== dict 接口 =====
+
+    def __getitem__(self, user_id: str) -> InterestGraph:
+        with self._lock:
+            graph = self._hot.get(user_id)
+            if graph is not None:
+                self.hits += 1
+            elif user_id in self._disk:
+                self.misses += 1
+                graph = self._load(user_id)
+            else:
+                raise KeyError(user_id)
+            self._admit(user_id, graph)
+            return graph
+
+    def __setitem__(self, user_id: str, graph: InterestGraph):
+        with self._lock:
+            self._admit(user_id, graph)
+
+    def __delitem__(self, user_id: str):
+        with self._lock:
+            if user_id not in self:
+                raise KeyError(user_id)
+            if user_id in self._hot:
+                del self._hot[user_id]
+                self._memory -= self._sizes.pop(user_id)
+            if self._disk.pop(user_id, None) is not None:
+                os.remove(self._path(user_id))
+
+    def __contains__(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._hot or user_id in self._disk
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._hot) + sum(1 for user_id in self._disk if user_id not in self._hot)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            user_ids = list(self._hot) + [user_id for user_id in self._disk if user_id not in self._hot]
+        yield from user_ids
+
+    def get(self, user_id: str, default=None) -> Optional[InterestGraph]:
+        with self._lock:
+            return self[user_id] if user_id in self else default
+
+    def keys(self):
+        return list(self)
+
+    def values(self) -> Iterator[InterestGraph]:
+        """
+        遍历所有图谱。
+
+        落盘的图谱只临时加载，不放入内存也不计入命中统计，遍历不会
+        挤掉活跃用户。
+        """
+        with self._lock:
+            hot = list(self._hot.values())
+            spilled = [self._path(user_id) for user_id in self._disk if user_id not in self._hot]
+        yield from hot
+        for path in spilled:
+            yield load_graph(path, self.engine)
+
+    def items(self) -> Iterator:
+        for graph in self.values():
+            yield graph.user_id, graph
+
+    # ===== 统计 =====
+
+    def get_stats(self) -> Dict:
+        """命中率、淘汰和落盘统计"""
+        lookups = self.hits + self.misses
+        return {
+            "hot_users": len(self._hot),
+            "total_users": len(self),
+            "memory_bytes": self._memory,
+            "memory_budget": self.memory_budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "evictions_skipped": self.evictions_skipped,
+            "spill_failures": self.spill_failures,
+            "spill_writes": self.spill_writes,
+            "spill_bytes": self.spill_bytes,
+        }
+
+    def close(self):
+        """删除自动创建的临时目录 (指定的目录保留，需要持久化时先调用 flush)"""
+        if self._owns_directory:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+            self._owns_directory = False
+            self._disk.clear()
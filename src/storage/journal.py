@@ -0,0 +1,410 @@
+"""
+兴趣图谱修改日志
+
+把每次 add_interest / add_relation / remove_interest / 衰减清理 / 容量淘汰记录为紧凑的
+二进制日志，避免每次交互都重写整个图谱：
+  1. 用户按 crc32(user_id) 分片，每个分片一个追加写的日志文件
+  2. 恢复时加载分片的最新快照，再按序号回放快照之后的日志
+  3. 后台压缩线程把日志折叠进新快照，然后截断日志
+
+日志记录格式 (小端)：
+  长度 u32 | crc32 u32 | 序号 u64 | 操作 u8 | 时间戳 f64 | user_id | 操作参数
+  字符串编码为 u16长度 + UTF-8，浮点参数为 f64 (None记为NaN)
+  批量修改 (apply_updates) 为一条记录：u32条数，每条为 操作 u8 + 该操作的参数
+  容量淘汰 (OP_EVICT) 在所属操作的记录之后单独记录被移除的节点：u32个数 + 各节点ID，
+  回放时按记录移除而不重新运行淘汰策略 (淘汰堆的内部顺序不随快照保存)
+
+一次 add_interest 约 30 + 字符串长度 字节。
+
+文件布局 (目录下)：
+  journal-{分片}.log             当前日志
+  journal-{分片}.log.{序号}      压缩中轮换出的日志
+  snapshot-{分片}-{序号}.bin     快照，序号为已折叠进快照的最大日志序号
+"""
+import glob
+import math
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.interest_graph import (InterestGraph, create_interest_graph,
+                                OP_ADD_INTEREST, OP_ADD_RELATION, OP_REMOVE_NODE, OP_DECAY,
+                                OP_BATCH, OP_EVICT)
+from src.storage.snapshot import SnapshotBundle, save_bundle
+from src.config import JOURNAL_SHARDS, JOURNAL_FSYNC_INTERVAL, JOURNAL_COMPACT_BYTES
+
+_RECORD_HEADER = struct.Struct("<II")  # 长度, crc32
+_RECORD_PREFIX = struct.Struct("<QBd")  # 序号, 操作, 时间戳
+_STR_LEN = struct.Struct("<H")
+_FLOAT = struct.Struct("<d")
+_COUNT = struct.Struct("<I")
+_OP = struct.Struct("<B")
+
+# 各操作的参数类型: s=字符串, f=浮点数, u=修改列表, l=字符串列表
+_SCHEMAS = {
+    OP_ADD_INTEREST: "ssf",      # topic, category, weight
+    OP_ADD_RELATION: "ssssf",    # source_topic, target_topic, source_cat, target_cat, strength
+    OP_REMOVE_NODE: "s",         # node_id
+    OP_DECAY: "",
+    OP_BATCH: "u",               # [(op, *fields), ...]
+    OP_EVICT: "l",               # [node_id, ...]
+}
+
+_SNAPSHOT_RE = re.compile(r"snapshot-(\d+)-(\d+)\.bin$")
+
+
+def _encode_fields(parts: List[bytes], schema: str, values):
+    for kind, value in zip(schema, values):
+        if kind == "s":
+            data = value.encode("utf-8")
+            parts.append(_STR_LEN.pack(len(data)))
+            parts.append(data)
+        elif kind == "f":
+            parts.append(_FLOAT.pack(math.nan if value is None else value))
+        elif kind == "l":
+            parts.append(_COUNT.pack(len(value)))
+            _encode_fields(parts, "s" * len(value), value)
+        else:
+            parts.append(_COUNT.pack(len(value)))
+            for op, *fields in value:
+                parts.append(_OP.pack(op))
+                _encode_fields(parts, _SCHEMAS[op], fields)
+
+
+def _decode_fields(body: bytes, offset: int, schema: str) -> Tuple[list, int]:
+    values = []
+    for kind in schema:
+        if kind == "s":
+            (size,) = _STR_LEN.unpack_from(body, offset)
+            offset += _STR_LEN.size
+            values.append(body[offset:offset + size].decode("utf-8"))
+            offset += size
+        elif kind == "f":
+            (value,) = _FLOAT.unpack_from(body, offset)
+            offset += _FLOAT.size
+            values.append(None if math.isnan(value) else value)
+        elif kind == "l":
+            (count,) = _COUNT.unpack_from(body, offset)
+            items, offset = _decode_fields(body, offset + _COUNT.size, "s" * count)
+            values.append(items)
+        else:
+            (count,) = _COUNT.unpack_from(body, offset)
+            offset += _COUNT.size
+            updates = []
+            for _ in range(count):
+                (op,) = _OP.unpack_from(body, offset)
+                fields, offset = _decode_fields(body, offset + _OP.size, _SCHEMAS[op])
+                updates.append((op, *fields))
+            values.append(updates)
+    return values, offset
+
+
+def encode_record(seq: int, user_id: str, op: int, timestamp: float, *fields) -> bytes:
+    """编码一条日志记录"""
+    parts = [_RECORD_PREFIX.pack(seq, op, timestamp)]
+    _encode_fields(parts, "s" + _SCHEMAS[op], (user_id,) + fields)
+    body = b"".join(parts)
+    return _RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def iter_records(data: bytes) -> Iterator[Tuple[int, str, int, float, tuple, int]]:
+    """
+    解析日志数据。
+
+    遇到不完整或校验失败的记录 (崩溃时写了一半) 即停止。
+
+    Yields:
+        (序号, user_id, 操作, 时间戳, 参数, 该记录结束位置)
+    """
+    pos = 0
+    while pos + _RECORD_HEADER.size <= len(data):
+        length, crc = _RECORD_HEADER.unpack_from(data, pos)
+        start = pos + _RECORD_HEADER.size
+        body = data[start:start + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            return
+        seq, op, timestamp = _RECORD_PREFIX.unpack_from(body, 0)
+        values, _ = _decode_fields(body, _RECORD_PREFIX.size, "s" + _SCHEMAS[op])
+        pos = start + length
+        yield seq, values[0], op, timestamp, tuple(values[1:]), pos
+
+
+class _Shard:
+    """单个分片的日志文件"""
+
+    def __init__(self, directory: str, index: int):
+        self.index = index
+        self.path = os.path.join(directory, f"journal-{index:04d}.log")
+        self.lock = threading.Lock()
+        self.file = open(self.path, "ab")
+        self.last_fsync = time.time()
+        self.dirty = False
+
+
+class GraphJournal:
+    """
+    分片的兴趣图谱修改日志。
+
+    Attributes:
+        directory (str): 日志和快照所在目录
+        shards (int): 分片数
+        fsync_interval (float): 两次fsync之间的最长间隔 (秒)，0表示每条记录都fsync
+    """
+
+    def __init__(self, directory: str, shards: int = JOURNAL_SHARDS,
+                 fsync_interval: float = JOURNAL_FSYNC_INTERVAL):
+        self.directory = directory
+        self.shards = shards
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+        for index in range(shards):
+            self._repair(self._journal_path(index))
+        self._shards = [_Shard(directory, i) for i in range(shards)]
+        self._seq_lock = threading.Lock()
+        self._seq = self._max_seq()
+        self.bytes_written = 0
+        self.records_written = 0
+
+    def shard_of(self, user_id: str) -> int:
+        """用户所在分片"""
+        return zlib.crc32(user_id.encode("utf-8")) % self.shards
+
+    def attach(self, graph: InterestGraph) -> InterestGraph:
+        """让图谱的后续修改写入本日志"""
+        graph.journal = self
+        return graph
+
+    # ===== 写入 =====
+
+    def record(self, user_id: str, op: int, timestamp: float, *fields):
+        """追加一条记录 (由 InterestGraph 在修改前调用)"""
+        shard = self._shards[self.shard_of(user_id)]
+        with shard.lock:
+            # 在分片锁内分配序号，保证同一分片文件内序号严格递增
+            with self._seq_lock:
+                self._seq += 1
+                seq = self._seq
+            data = encode_record(seq, user_id, op, timestamp, *fields)
+            shard.file.write(data)
+            shard.file.flush()  # 进程崩溃不丢数据；断电持久性由fsync保证
+            shard.dirty = True
+            if time.time() - shard.last_fsync >= self.fsync_interval:
+                self._fsync(shard)
+        self.bytes_written += len(data)
+        self.records_written += 1
+
+    def _fsync(self, shard: _Shard):
+        os.fsync(shard.file.fileno())
+        shard.last_fsync = time.time()
+        shard.dirty = False
+
+    def sync(self):
+        """把所有分片刷到磁盘"""
+        for shard in self._shards:
+            with shard.lock:
+                if shard.dirty:
+                    self._fsync(shard)
+
+    def close(self):
+        """同步并关闭日志文件"""
+        self.sync()
+        for shard in self._shards:
+            with shard.lock:
+                shard.file.close()
+
+    # ===== 恢复 =====
+
+    def _journal_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"journal-{index:04d}.log")
+
+    @staticmethod
+    def _repair(path: str):
+        """截掉崩溃时写了一半的尾部记录，保证后续追加的记录可读"""
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        valid = 0
+        for *_, end in iter_records(data):
+            valid = end
+        if valid < len(data):
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+
+    def _snapshot_files(self, index: int) -> List[Tuple[int, str]]:
+        """分片的快照文件，按序号升序"""
+        found = []
+        for path in glob.glob(os.path.join(self.directory, f"snapshot-{index:04d}-*.bin")):
+            match = _SNAPSHOT_RE.search(os.path.basename(path))
+            if match:
+                found.append((int(match.group(2)), path))
+        return sorted(found)
+
+    def _journal_files(self, index: int) -> List[str]:
+        """分片的日志文件：轮换出的旧日志在前，当前日志在最后"""
+        base = self._journal_path(index)
+        rotated = sorted(glob.glob(f"{base}.*"), key=lambda p: int(p.rsplit(".", 1)[1]))
+        return rotated + ([base] if os.path.exists(base) else [])
+
+    def _max_seq(self) -> int:
+        """磁盘上已使用的最大序号"""
+        max_seq = 0
+        for index in range(self.shards):
+            snapshots = self._snapshot_files(index)
+            if snapshots:
+                max_seq = max(max_seq, snapshots[-1][0])
+            for path in self._journal_files(index):
+                with open(path, "rb") as f:
+                    for seq, *_ in iter_records(f.read()):
+                        max_seq = max(max_seq, seq)
+        return max_seq
+
+    def _load_shard(self, index: int, engine: str = None) -> Tuple[Dict[str, InterestGraph], int]:
+        """加载分片的最新快照并回放其后的日志，返回 (图谱, 最大序号)"""
+        graphs: Dict[str, InterestGraph] = {}
+        snapshot_seq = 0
+        snapshots = self._snapshot_files(index)
+        if snapshots:
+            snapshot_seq, path = snapshots[-1]
+            with SnapshotBundle(path) as bundle:
+                for graph in bundle.load_all(engine):
+                    graphs[graph.user_id] = graph
+
+        max_seq = snapshot_seq
+        for path in self._journal_files(index):
+            with open(path, "rb") as f:
+                data = f.read()
+            for seq, user_id, op, timestamp, fields, _ in iter_records(data):
+                if seq <= snapshot_seq:
+                    continue
+                graph = graphs.get(user_id)
+                if graph is None:
+                    graph = graphs[user_id] = create_interest_graph(user_id, engine)
+                graph.replay(op, timestamp, *fields)
+                max_seq = max(max_seq, seq)
+        return graphs, max_seq
+
+    def recover(self, engine: str = None) -> Dict[str, InterestGraph]:
+        """
+        从快照和日志恢复所有用户的图谱，并把日志挂到恢复出的图谱上。
+
+        Args:
+            engine (str, optional): 目标存储引擎，默认使用 GRAPH_ENGINE
+
+        Returns:
+            dict: user_id -> InterestGraph
+        """
+        graphs = {}
+        for index in range(self.shards):
+            shard_graphs, _ = self._load_shard(index, engine)
+            graphs.update(shard_graphs)
+        for graph in graphs.values():
+            self.attach(graph)
+        return graphs
+
+    # ===== 压缩 =====
+
+    def journal_bytes(self, index: int) -> int:
+        """分片日志的当前大小"""
+        return sum(os.path.getsize(path) for path in self._journal_files(index))
+
+    def compact_shard(self, index: int, overrides: Dict[str, InterestGraph] = None) -> bool:
+        """
+        把分片日志折叠进新快照。
+
+        先在分片锁内轮换日志文件 (新写入进入新文件)，再离线回放生成快照；
+        快照文件名携带已折叠的最大序号，崩溃后重复回放也不会重复应用记录。
+
+        Args:
+            index (int): 分片序号
+            overrides (dict, optional): user_id -> 图谱，以这些图谱的当前状态代替回放结果写入快照
+                                       (见 checkpoint)，此时日志为空也生成快照
+
+        Returns:
+            bool: 是否生成了新快照
+        """
+        shard = self._shards[index]
+        with shard.lock:
+            if not overrides and os.path.getsize(shard.path) == 0 and len(self._journal_files(index)) == 1:
+                return False
+            shard.file.flush()
+            os.fsync(shard.file.fileno())
+            shard.file.close()
+            with self._seq_lock:
+                rotate_seq = self._seq
+            os.replace(shard.path, f"{shard.path}.{rotate_seq}")
+            shard.file = open(shard.path, "ab")
+            shard.dirty = False
+
+        rotated = self._journal_files(index)[:-1]
+        graphs, max_seq = self._load_shard(index)
+        graphs.update(overrides or {})
+        old_snapshots = self._snapshot_files(index)
+        save_bundle(graphs.values(), os.path.join(self.directory, f"snapshot-{index:04d}-{max_seq}.bin"))
+        for path in rotated:
+            os.remove(path)
+        for seq, path in old_snapshots:
+            if seq < max_seq:
+                os.remove(path)
+        return True
+
+    def checkpoint(self, graphs: List[InterestGraph]) -> int:
+        """
+        把图谱的当前状态写入所在分片的快照，作为之后日志回放的基准。
+
+        用于日志中没有历史的图谱 (如从外部批量快照或JSON导入的图谱)：只挂上日志时，
+        恢复会把之后的修改回放到空图谱上。调用方须持有这些用户的锁，保证写入快照前
+        没有新的修改。
+
+        Returns:
+            int: 生成快照的分片数
+        """
+        by_shard: Dict[int, Dict[str, InterestGraph]] = {}
+        for graph in graphs:
+            by_shard.setdefault(self.shard_of(graph.user_id), {})[graph.user_id] = graph
+        return sum(1 for index, overrides in by_shard.items() if self.compact_shard(index, overrides))
+
+    def compact(self, min_bytes: int = 0) -> int:
+        """压缩日志大小不小于 min_bytes 的分片，返回压缩的分片数"""
+        compacted = 0
+        for index in range(self.shards):
+            if self.journal_bytes(index) >= max(min_bytes, 1) and self.compact_shard(index):
+                compacted += 1
+        return compacted
+
+
+class JournalCompactor:
+    """后台压缩线程：定期同步日志，并压缩超过阈值的分片"""
+
+    def __init__(self, journal: GraphJournal, interval: float = 30.0,
+                 min_bytes: int = JOURNAL_COMPACT_BYTES):
+        self.journal = journal
+        self.interval = interval
+        self.min_bytes = min_bytes
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="journal-compactor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.journal.sync()
+                self.journal.compact(self.min_bytes)
+            except Exception as e:
+                print(f"⚠️  日志压缩失败: {e}")
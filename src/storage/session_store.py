@@ -0,0 +1,224 @@
+"""
+SQLite会话持久化
+
+保存兴趣图谱、智能体版本、AgentB评估指标和交互记录，重启后按用户恢复。
+数据库使用WAL模式；写入走后台的写回 (write-behind) 队列，请求路径只把
+脏用户放进队列，不序列化图谱也不等待磁盘：
+  1. mark_dirty 记录脏用户及其图谱对象和演化状态 (同一用户多次修改只保留最后一次)
+  2. log_interaction 追加交互记录
+  3. 后台线程每 flush_interval 秒，或待写入数量达到 batch_size 时，取出整批，
+     逐个在用户锁 (lock_for) 内序列化图谱，再在一个事务中写入全部脏用户和交互记录
+     (一个用户在两次写入之间修改多少次，图谱都只序列化一次)
+
+表结构：
+  graphs        (user_id, version, data)        data 为二进制快照 (见 snapshot.py)
+  sessions      (user_id, state)                state 为 EvolutionManager.to_dict() 的JSON
+  interactions  (id, user_id, timestamp, record) record 为交互记录的JSON
+"""
+import json
+import sqlite3
+import threading
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+from src.interest_graph import InterestGraph
+from src.storage.snapshot import dumps_graph, loads_graph
+from src.config import SESSION_FLUSH_INTERVAL, SESSION_FLUSH_BATCH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS graphs (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    timestamp TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interactions_user ON interactions (user_id, id);
+"""
+
+
+class SQLiteSessionStore:
+    """
+    基于SQLite (WAL模式) 的会话存储，带后台批量写回。
+
+    Attributes:
+        path (str): 数据库文件路径
+        flush_interval (float): 后台写入间隔 (秒)，0表示不启动后台线程，只在 flush() 时写入
+        batch_size (int): 待写入数量达到该值时唤醒后台线程提前写入
+        lock_for (callable): user_id -> 用户锁，写入时在该锁内序列化图谱，为None时不加锁
+    """
+
+    def __init__(self, path: str, flush_interval: float = SESSION_FLUSH_INTERVAL,
+                 batch_size: int = SESSION_FLUSH_BATCH,
+                 lock_for: Callable[[str], threading.RLock] = None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.lock_for = lock_for
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()  # 连接在读取和后台写入之间共享
+
+        self._queue_lock = threading.Lock()
+        self._dirty: Dict[str, Dict] = {}  # user_id -> 最新状态
+        self._pending: List[tuple] = []  # 待写入的交互记录 (user_id, timestamp, record)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.flushes = 0
+        self.users_written = 0
+        self.interactions_written = 0
+
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+            self._thread.start()
+
+    # ===== 写入 (请求路径) =====
+
+    def mark_dirty(self, user_id: str, graph: InterestGraph, session_state: Dict):
+        """
+        记录脏用户，等待后台写入 (图谱在写入时才序列化)。
+
+        Args:
+            user_id (str): 用户ID
+            graph (InterestGraph): 用户的兴趣图谱 (保存引用)
+            session_state (dict): EvolutionManager.to_dict() 的结果
+        """
+        with self._queue_lock:
+            self._dirty[user_id] = {"graph": graph, "session": session_state}
+            backlog = len(self._dirty) + len(self._pending)
+        if backlog >= self.batch_size:
+            self._wakeup.set()
+
+    def log_interaction(self, user_id: str, record: Dict):
+        """追加一条交互记录，等待后台写入"""
+        with self._queue_lock:
+            self._pending.append((user_id, record.get("timestamp"), record))
+            backlog = len(self._dirty) + len(self._pending)
+        if backlog >= self.batch_size:
+            self._wakeup.set()
+
+    @property
+    def backlog(self) -> int:
+        """尚未写入的脏用户和交互记录数"""
+        with self._queue_lock:
+            return len(self._dirty) + len(self._pending)
+
+    # ===== 写入 (后台) =====
+
+    def flush(self) -> int:
+        """
+        在一个事务中写入队列中的全部状态和交互记录。
+
+        写入失败时未写入的内容放回队列 (已有更新状态的用户保留更新的状态)。
+
+        Returns:
+            int: 写入的用户数
+        """
+        with self._queue_lock:
+            dirty, self._dirty = self._dirty, {}
+            pending, self._pending = self._pending, []
+        if not dirty and not pending:
+            return 0
+        try:
+            graph_rows = [(user_id, *self._serialize(user_id, state["graph"])) for user_id, state in dirty.items()]
+            session_rows = [(user_id, json.dumps(state["session"], ensure_ascii=False, default=str))
+                            for user_id, state in dirty.items()]
+            log_rows = [(user_id, timestamp, json.dumps(record, ensure_ascii=False, default=str))
+                        for user_id, timestamp, record in pending]
+            with self._db_lock:
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO graphs (user_id, version, data) VALUES (?, ?, ?)", graph_rows)
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO sessions (user_id, state) VALUES (?, ?)", session_rows)
+                    self._conn.executemany(
+                        "INSERT INTO interactions (user_id, timestamp, record) VALUES (?, ?, ?)", log_rows)
+        except Exception:
+            with self._queue_lock:
+                for user_id, state in dirty.items():
+                    self._dirty.setdefault(user_id, state)
+                self._pending[:0] = pending
+            raise
+        self.flushes += 1
+        self.users_written += len(dirty)
+        self.interactions_written += len(pending)
+        return len(dirty)
+
+    def _serialize(self, user_id: str, graph: InterestGraph) -> tuple:
+        """在用户锁内序列化图谱，返回 (版本号, 快照)"""
+        with self.lock_for(user_id) if self.lock_for is not None else nullcontext():
+            return graph.version, dumps_graph(graph)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️  会话持久化失败: {e}")
+
+    def close(self):
+        """停止后台线程，写入剩余内容并关闭数据库"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    # ===== 读取 =====
+
+    def _query(self, sql: str, params=()) -> List[tuple]:
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def user_ids(self) -> List[str]:
+        """已持久化的所有用户"""
+        return [row[0] for row in self._query("SELECT user_id FROM sessions ORDER BY user_id")]
+
+    def load_graph(self, user_id: str, engine: str = None) -> Optional[InterestGraph]:
+        """加载用户的兴趣图谱，不存在时返回None"""
+        rows = self._query("SELECT data FROM graphs WHERE user_id = ?", (user_id,))
+        if not rows:
+            return None
+        return loads_graph(bytearray(rows[0][0]), 0, engine)
+
+    def load_session(self, user_id: str) -> Optional[Dict]:
+        """加载用户的演化状态 (EvolutionManager.to_dict() 的结果)，不存在时返回None"""
+        rows = self._query("SELECT state FROM sessions WHERE user_id = ?", (user_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def load_interactions(self, user_id: str, limit: int = None) -> List[Dict]:
+        """按时间顺序加载用户的交互记录，limit 指定时只返回最近的若干条"""
+        if limit is None:
+            rows = self._query("SELECT record FROM interactions WHERE user_id = ? ORDER BY id", (user_id,))
+        else:
+            rows = self._query(
+                "SELECT record FROM (SELECT id, record FROM interactions WHERE user_id = ? "
+                "ORDER BY id DESC LIMIT ?) ORDER BY id", (user_id, limit))
+        return [json.loads(row[0]) for row in rows]
+
+    def get_stats(self) -> Dict:
+        """写入统计"""
+        return {
+            "backlog": self.backlog,
+            "flushes": self.flushes,
+            "users_written": self.users_written,
+            "interactions_written": self.interactions_written,
+        }
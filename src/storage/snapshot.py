@@ -0,0 +1,266 @@
+"""
+兴趣图谱二进制快照
+
+用带版本号的紧凑二进制格式保存单个或一批用户的兴趣图谱，数值数组直接在
+缓冲区上解析，不经过逐元素拷贝。单图谱文件整体读入 bytearray (加载后不占用
+文件描述符，可以同时常驻大量图谱)；批量文件使用内存映射 (mmap)。
+
+单图谱块 (所有整数和浮点数均为小端)：
+  头部      : magic "RSGR" | 格式版本 u16 | 保留 u16 | 图谱版本 u64
+              | 节点数 u32 | 边数 u32 | 字符串字节数 u32 | user_id字节数 u32
+  字符串表  : user_id (UTF-8) | 节点ID字符偏移 u32[节点数+1] | 节点ID拼接串 (UTF-8)
+  节点数组  : 更新时间 f64[n] | 权重 f32[n] | 访问次数 u32[n]
+  边数组    : 源节点 u32[m] | 目标节点 u32[m] | 权重 f32[m]
+  各段按8字节对齐，保证 numpy.frombuffer 可以直接映射。
+
+批量文件：
+  文件头    : magic "RSGB" | 格式版本 u16 | 保留 u16 | 图谱数 u32
+  目录      : 每个用户 (偏移 u64 | 长度 u64 | user_id字节数 u16 | user_id)
+  数据区    : 依次存放各单图谱块，按8字节对齐
+"""
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from src.interest_graph import InterestGraph, create_interest_graph
+
+GRAPH_MAGIC = b"RSGR"
+BUNDLE_MAGIC = b"RSGB"
+FORMAT_VERSION = 1
+
+_GRAPH_HEADER = struct.Struct("<4sHHQIIII")
+_BUNDLE_HEADER = struct.Struct("<4sHHI")
+_DIR_ENTRY = struct.Struct("<QQH")
+
+
+class SnapshotError(ValueError):
+    """快照格式错误或版本不兼容"""
+
+
+def _pad(length: int) -> int:
+    """补齐到8字节边界所需的字节数"""
+    return (-length) % 8
+
+
+def dumps_graph(graph: InterestGraph) -> bytes:
+    """
+    将兴趣图谱编码为二进制快照。
+
+    Args:
+        graph (InterestGraph): 任意存储引擎的兴趣图谱
+
+    Returns:
+        bytes: 快照数据，长度为8的倍数
+    """
+    node_ids, weights, timestamps, access, src, dst, edge_weights = graph._export_arrays()
+    user_id = graph.user_id.encode("utf-8")
+    offsets = np.zeros(len(node_ids) + 1, dtype=np.uint32)
+    if node_ids:
+        np.cumsum([len(node_id) for node_id in node_ids], out=offsets[1:])
+    text = "".join(node_ids).encode("utf-8")
+
+    parts = [_GRAPH_HEADER.pack(GRAPH_MAGIC, FORMAT_VERSION, 0, graph.version,
+                                len(node_ids), len(src), len(text), len(user_id))]
+    strings = user_id + offsets.tobytes() + text
+    parts.append(strings + b"\0" * _pad(_GRAPH_HEADER.size + len(strings)))
+    for array in (
+        np.asarray(timestamps, dtype="<f8"),
+        np.asarray(weights, dtype="<f4"),
+        np.asarray(access, dtype="<u4"),
+        np.asarray(src, dtype="<u4"),
+        np.asarray(dst, dtype="<u4"),
+        np.asarray(edge_weights, dtype="<f4"),
+    ):
+        data = array.tobytes()
+        parts.append(data + b"\0" * _pad(len(data)))
+    return b"".join(parts)
+
+
+def loads_graph(buffer, offset: int = 0, engine: str = None) -> InterestGraph:
+    """
+    从二进制快照解码兴趣图谱。
+
+    buffer 为可写缓冲区 (如 ACCESS_COPY 模式的 mmap) 时，紧凑引擎直接使用
+    映射上的数组视图，只有被修改的页才会被复制。
+
+    Args:
+        buffer: bytes / bytearray / mmap 等支持缓冲区协议的对象
+        offset (int): 图谱块在缓冲区中的起始位置
+        engine (str, optional): 目标存储引擎，默认使用 GRAPH_ENGINE
+
+    Returns:
+        InterestGraph: 解码后的兴趣图谱
+    """
+    magic, fmt, _, version, n_nodes, n_edges, text_len, uid_len = _GRAPH_HEADER.unpack_from(buffer, offset)
+    if magic != GRAPH_MAGIC:
+        raise SnapshotError("不是兴趣图谱快照")
+    if fmt > FORMAT_VERSION:
+        raise SnapshotError(f"不支持的快照格式版本: {fmt}")
+
+    view = memoryview(buffer)
+    pos = offset + _GRAPH_HEADER.size
+    user_id = bytes(view[pos:pos + uid_len]).decode("utf-8")
+    pos += uid_len
+    offsets = np.frombuffer(buffer, dtype="<u4", count=n_nodes + 1, offset=pos).tolist()
+    pos += 4 * (n_nodes + 1)
+    text = bytes(view[pos:pos + text_len]).decode("utf-8")
+    pos += text_len
+    pos += _pad(pos - offset)
+    node_ids = [text[offsets[i]:offsets[i + 1]] for i in range(n_nodes)]
+
+    arrays = []
+    for dtype, count in (("<f8", n_nodes), ("<f4", n_nodes), ("<u4", n_nodes),
+                         ("<u4", n_edges), ("<u4", n_edges), ("<f4", n_edges)):
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=pos)
+        arrays.append(array)
+        pos += array.nbytes + _pad(array.nbytes)
+    timestamps, weights, access, src, dst, edge_weights = arrays
+
+    graph = create_interest_graph(user_id, engine)
+    graph._import_arrays(node_ids, weights, timestamps, access, src, dst, edge_weights)
+    graph.version = version
+    return graph
+
+
+def read_node_arrays(buffer, offset: int = 0) -> Tuple[str, int, np.ndarray, np.ndarray]:
+    """
+    只解析快照的头部和节点数组，不解码节点ID也不构建图谱 (用于批量检查落盘图谱)。
+
+    Returns:
+        tuple: (user_id, 图谱版本, 更新时间 f64[n], 权重 f32[n])，数组为缓冲区上的视图
+    """
+    magic, fmt, _, version, n_nodes, _, text_len, uid_len = _GRAPH_HEADER.unpack_from(buffer, offset)
+    if magic != GRAPH_MAGIC:
+        raise SnapshotError("不是兴趣图谱快照")
+    if fmt > FORMAT_VERSION:
+        raise SnapshotError(f"不支持的快照格式版本: {fmt}")
+    pos = offset + _GRAPH_HEADER.size
+    user_id = bytes(memoryview(buffer)[pos:pos + uid_len]).decode("utf-8")
+    pos += uid_len + 4 * (n_nodes + 1) + text_len
+    pos += _pad(pos - offset)
+    timestamps = np.frombuffer(buffer, dtype="<f8", count=n_nodes, offset=pos)
+    pos += timestamps.nbytes
+    weights = np.frombuffer(buffer, dtype="<f4", count=n_nodes, offset=pos)
+    return user_id, version, timestamps, weights
+
+
+def _write_atomic(path: str, chunks: Iterable[bytes]):
+    """写入临时文件后原子替换，避免留下半写的快照"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_graph(graph: InterestGraph, path: str):
+    """保存单个图谱快照"""
+    _write_atomic(path, [dumps_graph(graph)])
+
+
+def load_graph(path: str, engine: str = None) -> InterestGraph:
+    """
+    加载单个图谱快照。
+
+    文件整体读入可写的 bytearray 后解析 (紧凑引擎直接使用其上的数组视图)。
+    不使用内存映射：每个映射都占用一个文件描述符直到图谱被回收，分层存储
+    常驻大量图谱时会耗尽描述符。
+    """
+    with open(path, "rb") as f:
+        buffer = bytearray(os.fstat(f.fileno()).st_size)
+        f.readinto(buffer)
+    return loads_graph(buffer, 0, engine)
+
+
+def save_bundle(graphs: Iterable[InterestGraph], path: str) -> int:
+    """
+    将多个用户的图谱保存到一个快照文件。
+
+    Args:
+        graphs: 兴趣图谱序列
+        path (str): 目标文件路径
+
+    Returns:
+        int: 保存的图谱数
+    """
+    blocks = [(graph.user_id.encode("utf-8"), dumps_graph(graph)) for graph in graphs]
+    directory_size = sum(_DIR_ENTRY.size + len(uid) for uid, _ in blocks)
+    header_size = _BUNDLE_HEADER.size + directory_size
+    offset = header_size + _pad(header_size)
+
+    directory = []
+    for uid, block in blocks:
+        directory.append(_DIR_ENTRY.pack(offset, len(block), len(uid)) + uid)
+        offset += len(block)
+
+    chunks = [_BUNDLE_HEADER.pack(BUNDLE_MAGIC, FORMAT_VERSION, 0, len(blocks)),
+              b"".join(directory), b"\0" * _pad(header_size)]
+    chunks.extend(block for _, block in blocks)
+    _write_atomic(path, chunks)
+    return len(blocks)
+
+
+class SnapshotBundle:
+    """
+    批量快照读取器。
+
+    打开时只解析目录，单个用户的图谱在 load() 时才解码；数值数组直接
+    映射自文件，不经过拷贝。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, fmt, _, count = _BUNDLE_HEADER.unpack_from(self._mm, 0)
+        if magic != BUNDLE_MAGIC:
+            raise SnapshotError("不是批量兴趣图谱快照")
+        if fmt > FORMAT_VERSION:
+            raise SnapshotError(f"不支持的快照格式版本: {fmt}")
+
+        self._directory: Dict[str, Tuple[int, int]] = {}
+        pos = _BUNDLE_HEADER.size
+        for _ in range(count):
+            offset, length, uid_len = _DIR_ENTRY.unpack_from(self._mm, pos)
+            pos += _DIR_ENTRY.size
+            user_id = self._mm[pos:pos + uid_len].decode("utf-8")
+            pos += uid_len
+            self._directory[user_id] = (offset, length)
+
+    def __len__(self) -> int:
+        return len(self._directory)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._directory
+
+    def user_ids(self) -> List[str]:
+        """快照中的所有用户"""
+        return list(self._directory)
+
+    def load(self, user_id: str, engine: str = None) -> InterestGraph:
+        """解码单个用户的图谱"""
+        offset, _ = self._directory[user_id]
+        return loads_graph(self._mm, offset, engine)
+
+    def load_all(self, engine: str = None) -> Iterator[InterestGraph]:
+        """依次解码所有图谱"""
+        for user_id in self._directory:
+            yield self.load(user_id, engine)
+
+    def close(self):
+        """关闭映射 (仍有数组引用映射时由垃圾回收负责释放)"""
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
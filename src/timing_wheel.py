@@ -0,0 +1,122 @@
+"""
+分层时间轮模块
+
+为大量按键区分的定时任务 (如每个用户的清理、整理、演化检查) 维护截止时间，支持：
+  1. 插入、改期、取消均为 O(1) (同一个键只保留最新的截止时间)
+  2. 推进时间时只处理到期的槽位，不对全部任务排序
+
+结构说明：
+  - 时间按 tick 秒离散为刻度；共 levels 层，每层 slots 个槽位 (slots 为2的幂)
+  - 第 l 层的一个槽位覆盖 slots^l 个刻度；任务放在与当前刻度最高位相同的最低一层
+  - 当前刻度跨过第 l 层槽位边界时，把该层对应槽位的任务重新分配到下层 (级联)
+  - 超出最高层范围的任务暂存在溢出列表中，最高层转完一圈时重新分配
+  - 改期和取消不从槽位中删除旧条目，旧条目在到期或级联时按序号识别后丢弃
+"""
+from collections import deque
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class TimingWheel:
+    """
+    分层时间轮。
+
+    Attributes:
+        tick (float): 刻度长度 (秒)
+        slots (int): 每层的槽位数
+        levels (int): 层数，覆盖范围为 tick × slots^levels 秒
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 4, start: float = 0.0):
+        if slots & (slots - 1) or slots < 2:
+            raise ValueError("slots 须为不小于2的2的幂")
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._bits = slots.bit_length() - 1
+        self._mask = slots - 1
+        self._wheels: List[List[List[Tuple]]] = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._overflow: List[Tuple] = []
+        self._current = int(start // tick)  # 已处理到的刻度
+        self._entries: Dict[Hashable, Tuple[int, int]] = {}  # 键 -> (序号, 截止刻度)
+        self._seq = 0
+        self._due: deque = deque()  # 截止时间不晚于当前刻度、等待取出的条目
+
+    def __len__(self) -> int:
+        """待执行的任务数"""
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """任务的截止时间 (按刻度取整)，不存在时返回None"""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[1] * self.tick
+
+    def schedule(self, key: Hashable, deadline: float, payload: Any = None):
+        """插入任务，键已存在时改期 (以本次的截止时间为准)"""
+        self._seq += 1
+        tick = max(int(-(-deadline // self.tick)), self._current)  # 向上取整，不早于当前刻度
+        self._entries[key] = (self._seq, tick)
+        self._place((tick, self._seq, key, payload))
+
+    def cancel(self, key: Hashable) -> bool:
+        """取消任务，返回任务是否存在"""
+        return self._entries.pop(key, None) is not None
+
+    def _live(self, entry: Tuple) -> bool:
+        current = self._entries.get(entry[2])
+        return current is not None and current[0] == entry[1]
+
+    def _place(self, entry: Tuple):
+        tick = entry[0]
+        if tick <= self._current:
+            self._due.append(entry)
+            return
+        for level in range(self.levels):
+            shift = self._bits * (level + 1)
+            if tick >> shift == self._current >> shift:
+                self._wheels[level][(tick >> (self._bits * level)) & self._mask].append(entry)
+                return
+        self._overflow.append(entry)
+
+    def _cascade(self, level: int):
+        """当前刻度跨过第 level 层的槽位边界：把该槽位的任务重新分配到下层"""
+        if level == self.levels:
+            bucket, self._overflow = self._overflow, []
+        else:
+            index = (self._current >> (self._bits * level)) & self._mask
+            bucket, self._wheels[level][index] = self._wheels[level][index], []
+        for entry in bucket:
+            if self._live(entry):
+                self._place(entry)
+
+    def advance(self, now: float) -> List[Tuple[Hashable, Any]]:
+        """
+        把时间推进到 now，取出所有截止时间不晚于 now 的任务。
+
+        Returns:
+            list: [(键, payload), ...]，按截止刻度升序
+        """
+        target = int(now // self.tick)
+        while self._current < target:
+            if not self._entries:
+                self._current = target  # 没有任务时直接跳到目标刻度
+                break
+            self._current += 1
+            level = 1
+            while level <= self.levels and self._current & ((1 << (self._bits * level)) - 1) == 0:
+                self._cascade(level)
+                level += 1
+            bucket = self._wheels[0][self._current & self._mask]
+            if bucket:
+                self._wheels[0][self._current & self._mask] = []
+                self._due.extend(bucket)
+
+        result = []
+        while self._due:
+            entry = self._due.popleft()
+            if self._live(entry):
+                del self._entries[entry[2]]
+                result.append((entry[2], entry[3]))
+        return result
@@ -0,0 +1,156 @@
+"""
+主题相似度索引模块
+
+兴趣图谱插入节点前，先在同一类别中查找近似重复的主题 (如 "Python数据分析" 与
+"Python 数据分析 Pandas")，找到时合并到已有节点：
+  1. 归一化：NFKC、转小写、去掉空白和标点
+  2. 按字符 n-gram 切分，计算 MinHash 签名
+  3. LSH 分段：签名切成 bands 段，任意一段完全相同的主题成为候选
+  4. 对候选计算精确的 n-gram Jaccard 相似度，不低于阈值才合并
+
+保护规则：
+  - 归一化后长度小于 min_length 的主题不参与合并 (短主题的 n-gram 太少)
+  - 包含的数字不同的主题不合并 (如 "iPhone 14" 与 "iPhone 15")
+
+删除节点时索引不做同步，查找时跳过并清除已不在图谱中的节点。
+"""
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.config import (TOPIC_MERGE_THRESHOLD, TOPIC_MERGE_MIN_LENGTH, TOPIC_NGRAM,
+                        TOPIC_MINHASH_BANDS, TOPIC_MINHASH_ROWS)
+
+_PRIME = (1 << 31) - 1
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_topic(text: str) -> str:
+    """NFKC归一化、转小写，只保留字母、数字和汉字"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def shingles(text: str, n: int = TOPIC_NGRAM) -> FrozenSet[str]:
+    """字符 n-gram 集合 (不足n个字符时为整个字符串)"""
+    if len(text) <= n:
+        return frozenset([text])
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """两个集合的 Jaccard 相似度"""
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+class TopicIndex:
+    """
+    按类别分区的 MinHash/LSH 近似重复索引。
+
+    Attributes:
+        threshold (float): 合并所需的最小 Jaccard 相似度
+        min_length (int): 参与合并的最短归一化长度
+        bands (int): LSH 分段数
+        rows (int): 每段的哈希数
+    """
+
+    def __init__(self, threshold: float = TOPIC_MERGE_THRESHOLD, min_length: int = TOPIC_MERGE_MIN_LENGTH,
+                 bands: int = TOPIC_MINHASH_BANDS, rows: int = TOPIC_MINHASH_ROWS, ngram: int = TOPIC_NGRAM):
+        self.threshold = threshold
+        self.min_length = min_length
+        self.bands = bands
+        self.rows = rows
+        self.ngram = ngram
+        # 固定种子，保证日志回放时查找结果与原始执行一致
+        rng = np.random.default_rng(0)
+        self._a = rng.integers(1, _PRIME, size=bands * rows, dtype=np.int64)
+        self._b = rng.integers(0, _PRIME, size=bands * rows, dtype=np.int64)
+        self._entries: Dict[str, Tuple[str, FrozenSet[str], Tuple[str, ...], Tuple[int, ...]]] = {}
+        self._buckets: Dict[int, Set[str]] = defaultdict(set)  # LSH分段键 -> 节点ID
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _signature(self, grams: FrozenSet[str]) -> np.ndarray:
+        """MinHash签名: 每个哈希函数 (a·x + b) mod p 在所有 n-gram 上的最小值"""
+        x = np.fromiter((zlib.crc32(g.encode("utf-8")) % _PRIME for g in grams), dtype=np.int64, count=len(grams))
+        return ((self._a[:, None] * x[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def _band_keys(self, category: str, grams: FrozenSet[str]) -> Tuple[int, ...]:
+        signature = self._signature(grams).reshape(self.bands, self.rows)
+        return tuple(hash((category, band, row.tobytes())) for band, row in enumerate(signature))
+
+    def _features(self, topic: str):
+        """(n-gram集合, 数字序列)，不参与合并时返回None"""
+        text = normalize_topic(topic)
+        if len(text) < self.min_length:
+            return None
+        return shingles(text, self.ngram), tuple(_DIGITS.findall(text))
+
+    def add(self, node_id: str, category: str, topic: str):
+        """加入节点 (已存在时先移除旧条目)"""
+        self.remove(node_id)
+        features = self._features(topic)
+        if features is None:
+            return
+        grams, digits = features
+        keys = self._band_keys(category, grams)
+        self._entries[node_id] = (category, grams, digits, keys)
+        for key in keys:
+            self._buckets[key].add(node_id)
+
+    def remove(self, node_id: str):
+        """移除节点"""
+        entry = self._entries.pop(node_id, None)
+        if entry is None:
+            return
+        for key in entry[3]:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(node_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def find(self, category: str, topic: str, alive: Callable[[str], bool] = None) -> Optional[str]:
+        """
+        查找同类别中与主题最相似的节点。
+
+        Args:
+            category (str): 类别
+            topic (str): 待插入的主题
+            alive (callable, optional): 判断节点是否仍在图谱中，不在的条目会被清除
+
+        Returns:
+            str: 相似度不低于阈值的最相似节点ID，没有时返回None
+        """
+        features = self._features(topic)
+        if features is None:
+            return None
+        grams, digits = features
+        candidates: List[str] = []
+        seen = set()
+        for key in self._band_keys(category, grams):
+            for node_id in self._buckets.get(key, ()):
+                if node_id not in seen:
+                    seen.add(node_id)
+                    candidates.append(node_id)
+
+        best, best_score = None, self.threshold
+        for node_id in sorted(candidates):
+            if alive is not None and not alive(node_id):
+                self.remove(node_id)
+                continue
+            entry_category, entry_grams, entry_digits, _ = self._entries[node_id]
+            if entry_category != category or entry_digits != digits:
+                continue
+            score = jaccard(grams, entry_grams)
+            if score > best_score or (best is None and score == best_score):
+                best, best_score = node_id, score
+        return best
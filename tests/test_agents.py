@@ -5,8 +5,18 @@
 """
 
 import unittest
-from src.agents import AgentA, AgentB
+import threading
+from unittest import mock
+
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers, decoders
+from transformers import PreTrainedTokenizerFast, Qwen2Config, Qwen2ForCausalLM
+
+from src.agents import (AgentA, AgentB, ModelRegistry, SharedModel, GenerationBatcher, ContinuousBatcher,
+                        RecommendationCache)
+from src.agents.json_stream import JsonArrayTracker
 from src.interest_graph import InterestGraph
+from src.cooccurrence import CooccurrenceGraph
 
 
 class TestAgentA(unittest.TestCase):
@@ -78,5 +88,359 @@ class TestAgentB(unittest.TestCase):
         self.assertLessEqual(score, 1)
 
 
+class TestModelRegistry(unittest.TestCase):
+    """测试共享模型注册表"""
+    
+    def test_model_loaded_once_per_key(self):
+        """测试同一模型只加载一次并被所有AgentA共享"""
+        registry = ModelRegistry()
+        with mock.patch("src.agents.model_registry.AutoTokenizer") as tok, \
+             mock.patch("src.agents.model_registry.AutoModelForCausalLM") as lm:
+            threads = [threading.Thread(target=registry.get, args=("fake-model",)) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            agents = [AgentA(registry=registry) for _ in range(3)]
+        
+        self.assertEqual(tok.from_pretrained.call_count, 2)  # fake-model + MODEL_NAME
+        self.assertIs(agents[0].model, agents[1].model)
+        agents[0].update_version()
+        self.assertEqual(agents[1].version, 0)
+    
+    def test_failed_load_is_cached(self):
+        """测试加载失败只尝试一次"""
+        registry = ModelRegistry()
+        with mock.patch("src.agents.model_registry.AutoTokenizer") as tok:
+            tok.from_pretrained.side_effect = OSError("offline")
+            first = registry.get("missing-model")
+            second = registry.get("missing-model")
+        
+        self.assertFalse(first.available)
+        self.assertIs(first, second)
+        self.assertEqual(tok.from_pretrained.call_count, 1)
+
+    def test_prefix_warmup_once_per_model(self):
+        """测试静态前缀在模型加载时预填充一次，创建AgentA不再预热"""
+        registry = ModelRegistry()
+        with mock.patch("src.agents.model_registry.AutoTokenizer") as tok, \
+             mock.patch("src.agents.model_registry.AutoModelForCausalLM"), \
+             mock.patch.object(GenerationBatcher, "warmup") as warmup:
+            agents = [AgentA(registry=registry) for _ in range(3)]
+
+        from src.agents.prompts import PROMPT_PREFIX
+        warmup.assert_called_once_with(PROMPT_PREFIX)
+        self.assertIs(agents[0].shared_model.batcher, agents[2].shared_model.batcher)
+        self.assertEqual(tok.from_pretrained.call_count, 1)
+
+
+
+class TestCooccurrenceCandidates(unittest.TestCase):
+    """测试AgentA使用跨用户共现候选"""
+    
+    def test_other_users_clicks_become_candidates(self):
+        """测试其他用户的共同点击进入新用户的推荐，且不重复"""
+        registry = mock.Mock()
+        registry.get.return_value.model = None
+        agent = AgentA(registry=registry)
+        co = CooccurrenceGraph()
+        co.record("量子计算", ["量子计算入门", "Qiskit教程"])
+        
+        titles = [r["title"] for r in agent.generate_recommendations("量子计算", InterestGraph("new"), co)]
+        self.assertIn("Qiskit教程", titles)
+        self.assertEqual(len(titles), len(set(titles)))
+        
+        titles = [r["title"] for r in agent.generate_recommendations("量子计算", InterestGraph("new"))]
+        self.assertNotIn("Qiskit教程", titles)
+
+
+class TestRecommendationCache(unittest.TestCase):
+    """测试推荐结果缓存"""
+    
+    def test_key_normalization(self):
+        """测试查询归一化和兴趣权重量化"""
+        interests = [("query:Python", 0.80), ("query:数据分析", 0.52)]
+        key = RecommendationCache.make_key("  ＰＹＴＨＯＮ   进阶 ", interests, 0)
+        self.assertEqual(key, RecommendationCache.make_key("python 进阶", [("query:Python", 0.81),
+                                                                           ("query:数据分析", 0.51)], 0))
+        self.assertNotEqual(key, RecommendationCache.make_key("python 进阶", [("query:Python", 0.9),
+                                                                              ("query:数据分析", 0.52)], 0))
+        self.assertNotEqual(key, RecommendationCache.make_key("python 进阶", interests, 1))
+    
+    def test_lru_and_ttl(self):
+        """测试超出容量时淘汰最久未使用的条目，过期条目不命中"""
+        cache = RecommendationCache(max_size=2, ttl=10)
+        cache.put("a", [{"title": "A"}], now=0)
+        cache.put("b", [{"title": "B"}], now=0)
+        self.assertEqual(cache.get("a", now=1), [{"title": "A"}])
+        cache.put("c", [{"title": "C"}], now=1)
+        
+        self.assertIsNone(cache.get("b", now=1))
+        self.assertIsNone(cache.get("a", now=11))
+        self.assertEqual(cache.get("c", now=11), [{"title": "C"}])
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]), (2, 2, 1, 1))
+    
+    def test_agent_reuses_generation_until_version_changes(self):
+        """测试重复查询不再调用模型，版本变化后不命中旧条目，但不删除其他用户共享的条目"""
+        registry = mock.Mock()
+        agent = AgentA(registry=registry, cache=RecommendationCache())
+        agent._generate_with_model = mock.Mock(return_value=[{"title": "推荐", "description": "", "reason": ""}])
+        graph = InterestGraph("u")
+        graph.add_interest("机器学习", weight=0.8)
+        
+        first = agent.generate_recommendations("机器学习", graph)
+        second = agent.generate_recommendations(" 机器学习", graph)
+        self.assertEqual(first, second)
+        self.assertEqual(agent._generate_with_model.call_count, 1)
+        self.assertEqual((agent.get_stats()["cache_hits"], agent.get_stats()["cache_misses"]), (1, 1))
+        
+        agent.set_improvements({})
+        self.assertFalse(hasattr(agent, "_cache_keys"))
+        self.assertEqual(len(agent.cache), 1)
+        agent.generate_recommendations("机器学习", graph)
+        self.assertEqual(agent._generate_with_model.call_count, 2)
+        self.assertEqual(len(agent.cache), 2)
+        
+        # 仍处于旧版本的其他用户继续命中共享的条目
+        other = AgentA(registry=registry, cache=agent.cache)
+        other._generate_with_model = mock.Mock()
+        other.generate_recommendations("机器学习", graph)
+        other._generate_with_model.assert_not_called()
+        self.assertEqual(other.get_stats()["cache_hits"], 1)
+
+
+def char_tokenizer() -> PreTrainedTokenizerFast:
+    """字符级tokenizer (ASCII可见字符)"""
+    vocab = {chr(i): i for i in range(32, 127)}
+    vocab.update({"<unk>": 0, "<pad>": 1, "<eos>": 2})
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split("", "isolated")
+    tokenizer.decoder = decoders.Fuse()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="<unk>",
+                                   pad_token="<pad>", eos_token="<eos>")
+
+
+class EchoModel:
+    """把输入原样重复一遍作为新生成部分的假模型，记录每次 generate 的批大小"""
+    
+    def __init__(self, error: Exception = None):
+        self.batch_sizes = []
+        self.error = error
+    
+    def generate(self, input_ids, attention_mask, **kwargs):
+        if self.error is not None:
+            raise self.error
+        assert attention_mask[:, -1].all(), "应左填充"
+        self.batch_sizes.append(len(input_ids))
+        return torch.cat([input_ids, input_ids], dim=1)
+
+
+class TestGenerationBatcher(unittest.TestCase):
+    """测试并发生成请求的微批处理"""
+    
+    def make_batcher(self, model, max_batch_size=4, max_wait=1.0):
+        shared = SharedModel(model_name="echo", dtype=torch.float32, device=torch.device("cpu"),
+                             tokenizer=char_tokenizer(), model=model)
+        batcher = GenerationBatcher(shared, max_batch_size=max_batch_size, max_wait=max_wait)
+        self.addCleanup(batcher.close)
+        return batcher
+    
+    def submit_concurrently(self, batcher, prompts):
+        results = {}
+        
+        def worker(prompt):
+            try:
+                results[prompt] = batcher.generate(prompt, timeout=10)
+            except Exception as e:
+                results[prompt] = e
+        
+        threads = [threading.Thread(target=worker, args=(p,)) for p in prompts]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+    
+    def test_concurrent_requests_share_one_generate(self):
+        """测试并发请求合并成一批，各自取回自己的结果"""
+        model = EchoModel()
+        batcher = self.make_batcher(model)
+        prompts = ["a", "bb", "ccc", "dddd"]
+        
+        results = self.submit_concurrently(batcher, prompts)
+        self.assertEqual(results, {p: p for p in prompts})
+        self.assertEqual(model.batch_sizes, [4])
+        self.assertEqual(batcher.get_stats()["avg_batch_size"], 4.0)
+    
+    def test_batch_size_is_bounded(self):
+        """测试超过最大批大小的请求分到后续批次"""
+        model = EchoModel()
+        batcher = self.make_batcher(model, max_batch_size=2, max_wait=0.2)
+        
+        results = self.submit_concurrently(batcher, ["a", "b", "c", "d", "e"])
+        self.assertEqual(results, {p: p for p in "abcde"})
+        self.assertEqual(sum(model.batch_sizes), 5)
+        self.assertLessEqual(max(model.batch_sizes), 2)
+    
+    def test_error_reaches_every_caller(self):
+        """测试生成失败时批内所有调用方都收到异常"""
+        batcher = self.make_batcher(EchoModel(error=RuntimeError("oom")))
+        
+        results = self.submit_concurrently(batcher, ["a", "b"])
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results.values()))
+
+
+class TestJsonArrayTracker(unittest.TestCase):
+    """测试流式JSON数组括号跟踪"""
+    
+    def test_closes_on_outer_bracket(self):
+        """测试只在最外层数组闭合时结束，忽略字符串中的括号和数组前的文字"""
+        tracker = JsonArrayTracker()
+        text = '推荐如下 "说明: ": [{"title": "a]\\"[b", "tags": ["x", "y"]}, {"title": "c"}] 多余'
+        closed_at = [i for i, ch in enumerate(text) if tracker.feed(ch)]
+        self.assertEqual(text[closed_at[0]:closed_at[0] + 4], "] 多余")
+        self.assertTrue(tracker.closed)
+    
+    def test_escaped_quote(self):
+        """测试转义引号不结束字符串"""
+        tracker = JsonArrayTracker()
+        self.assertFalse(tracker.feed('["a\\"]'))
+        self.assertTrue(tracker.feed('"]'))
+
+
+class TestContinuousBatcher(unittest.TestCase):
+    """测试迭代级连续批处理"""
+    
+    def setUp(self):
+        torch.manual_seed(0)
+        tokenizer = char_tokenizer()
+        config = Qwen2Config(vocab_size=128, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                             num_attention_heads=4, num_key_value_heads=2, eos_token_id=2, pad_token_id=1)
+        self.shared = SharedModel(model_name="tiny", dtype=torch.float32, device=torch.device("cpu"),
+                                  tokenizer=tokenizer, model=Qwen2ForCausalLM(config).eval())
+        patcher = mock.patch.dict("src.agents.generation_batcher.GENERATE_KWARGS",
+                                  {"max_new_tokens": 20, "do_sample": False}, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def make_batcher(self, cls, **kwargs):
+        batcher = cls(self.shared, **kwargs)
+        self.addCleanup(batcher.close)
+        return batcher
+    
+    def test_matches_generate_with_mid_flight_admission(self):
+        """测试解码中途加入的请求与逐条 generate 的贪心结果一致，且不超过槽位数"""
+        prompts = ["hello", "a much longer prompt", "mid", "x" * 25]
+        single = self.make_batcher(GenerationBatcher, max_batch_size=1)
+        expected = [single.generate(p) for p in prompts]
+        
+        batcher = self.make_batcher(ContinuousBatcher, max_batch_size=3, max_wait=0)
+        futures = [batcher.submit(p) for p in prompts[:2]]
+        futures += [batcher.submit(p) for p in prompts[2:]]
+        self.assertEqual([f.result(timeout=30) for f in futures], expected)
+        self.assertLessEqual(batcher.get_stats()["largest_batch"], 3)
+    
+    def test_repetition_penalty_matches_generate(self):
+        """测试重复惩罚与 generate 的贪心结果一致 (批内各行提示词长度不同)"""
+        prompts = ["hello", "a much longer prompt", "aaaa"]
+        plain = [self.make_batcher(GenerationBatcher, max_batch_size=1).generate(p) for p in prompts]
+        with mock.patch.dict("src.agents.generation_batcher.GENERATE_KWARGS", {"repetition_penalty": 1.5}):
+            expected = [self.make_batcher(GenerationBatcher, max_batch_size=1).generate(p) for p in prompts]
+            batcher = self.make_batcher(ContinuousBatcher, max_batch_size=3, max_wait=0.5)
+            futures = [batcher.submit(p) for p in prompts]
+            self.assertEqual([f.result(timeout=30) for f in futures], expected)
+        self.assertNotEqual(expected, plain)
+    
+    def test_unsupported_kwargs_rejected(self):
+        """测试解码循环未实现的生成参数在构造时报错"""
+        with mock.patch.dict("src.agents.generation_batcher.GENERATE_KWARGS", {"num_beams": 2}):
+            with self.assertRaises(ValueError):
+                ContinuousBatcher(self.shared)
+    
+    def test_retires_when_json_array_closes(self):
+        """测试序列闭合JSON数组后立即结束，只返回新生成的文本 (两种调度方式)"""
+        script = self.shared.tokenizer.convert_tokens_to_ids(list('["a]"]'))
+        calls = []
+        
+        def force_script(module, args, output):
+            step = len(calls)
+            calls.append(step)
+            output[:, -1, script[min(step, len(script) - 1)]] = 1e4
+        
+        self.shared.model.lm_head.register_forward_hook(force_script)
+        for cls in (ContinuousBatcher, GenerationBatcher):
+            calls.clear()
+            batcher = self.make_batcher(cls, max_batch_size=2, max_wait=0)
+            self.assertEqual(batcher.generate("hi", timeout=30), '["a]"]')
+            self.assertEqual(len(calls), len(script))
+    
+    def test_forward_error_reaches_callers_and_loop_survives(self):
+        """测试解码步出错时所有调用方收到异常，之后的请求仍能完成"""
+        calls = []
+        
+        def fail_second_forward(module, args, output):
+            calls.append(len(calls))
+            if len(calls) == 2:
+                raise RuntimeError("oom")
+        
+        handle = self.shared.model.lm_head.register_forward_hook(fail_second_forward)
+        batcher = self.make_batcher(ContinuousBatcher, max_batch_size=2, max_wait=0)
+        with self.assertRaises(RuntimeError):
+            batcher.generate("hi", timeout=30)
+        handle.remove()
+        self.assertIsInstance(batcher.generate("hi", timeout=30), str)
+    
+    def test_budget_counts_only_new_tokens(self):
+        """测试 max_new_tokens 预算不受提示词长度影响"""
+        for cls in (ContinuousBatcher, GenerationBatcher):
+            batcher = self.make_batcher(cls, max_batch_size=2, max_wait=0)
+            with mock.patch.dict("src.agents.generation_batcher.GENERATE_KWARGS", {"max_new_tokens": 3}):
+                outputs = [batcher.generate(prompt, timeout=30) for prompt in ("hi", "x" * 60)]
+            for text in outputs:
+                self.assertLessEqual(len(text), 3)
+
+
+
+class TestPrefixCache(unittest.TestCase):
+    """测试静态前缀KV缓存"""
+    
+    PREFIX = "Recommend:\n"
+    setUp = TestContinuousBatcher.setUp
+    make_batcher = TestContinuousBatcher.make_batcher
+    
+    def test_prefix_cache_matches_full_prefill(self):
+        """测试复用前缀缓存与完整预填充的贪心结果一致 (两种调度方式)"""
+        prompts = [self.PREFIX + "hello", self.PREFIX + "a longer query", "no prefix"]
+        for cls in (ContinuousBatcher, GenerationBatcher):
+            expected = [self.make_batcher(cls, max_batch_size=1).generate(p, timeout=30) for p in prompts]
+            batcher = self.make_batcher(cls, max_batch_size=1)
+            self.assertTrue(batcher.warmup(self.PREFIX))
+            self.assertEqual([batcher.generate(p, timeout=30) for p in prompts], expected)
+            self.assertEqual(batcher.get_stats()["prefix_hits"], 2)
+    
+    def test_failed_warmup_not_retried(self):
+        """测试预填充失败被记录，同一前缀再次预热时直接返回，不重复前向计算"""
+        shared = mock.MagicMock()
+        shared.tokenizer.return_value = {"input_ids": [1, 2, 3]}
+        shared.device = torch.device("cpu")
+        shared.lock = threading.Lock()
+        shared.model.side_effect = RuntimeError("out of memory")
+        batcher = GenerationBatcher(shared)
+
+        self.assertFalse(batcher.warmup(self.PREFIX))
+        self.assertFalse(batcher.warmup(self.PREFIX))
+        self.assertEqual(shared.model.call_count, 1)
+        self.assertIsNone(batcher.prefix)
+
+    def test_agent_prompt_starts_with_prefix(self):
+        """测试AgentA的提示词以静态前缀开头 (用户相关内容在后)"""
+        from src.agents.agent_a import PROMPT_PREFIX
+        agent = AgentA.__new__(AgentA)
+        prompt = agent._build_prompt("想看科幻电影", "科幻", [("sci_fi", 0.9)])
+        self.assertTrue(prompt.startswith(PROMPT_PREFIX))
+        self.assertNotIn("想看科幻电影", PROMPT_PREFIX)
+
+
 if __name__ == "__main__":
     unittest.main()
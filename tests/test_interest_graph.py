@@ -6,8 +6,17 @@
 
 import unittest
 import json
+import threading
+import time
+import numpy as np
+from unittest import mock
 from datetime import datetime, timedelta
-from src.interest_graph import InterestGraph
+from src.interest_graph import InterestGraph, DECAY_PERIOD_SECONDS
+from src.compact_graph import CompactInterestGraph
+from src.pagerank import TransitionMatrix, personalized_pagerank
+from src.cooccurrence import CooccurrenceGraph
+from src.timing_wheel import TimingWheel
+from src.config import PAGERANK_MAX_ITER
 
 
 class TestInterestGraph(unittest.TestCase):
@@ -60,5 +69,568 @@ class TestInterestGraph(unittest.TestCase):
         self.assertTrue(new_graph.graph.has_edge("兴趣1", "兴趣2"))
 
 
+class TestLazyDecay(unittest.TestCase):
+    """测试惰性衰减"""
+    
+    def setUp(self):
+        self.graph = InterestGraph("decay_user")
+        self.graph.add_interest("机器学习", "AI", weight=0.8)
+        self.graph.add_interest("Python", "编程", weight=0.6)
+    
+    def _age(self, node_id, seconds):
+        """将节点的最后更新时间前移"""
+        self.graph._set_node(node_id, self.graph.node_weights[node_id],
+                             self.graph.last_update[node_id] - seconds)
+    
+    def test_decay_computed_on_read(self):
+        """测试读取时按闭式公式衰减，且多次读取不会叠加衰减"""
+        self._age("AI:机器学习", DECAY_PERIOD_SECONDS)
+        for _ in range(3):
+            top = dict(self.graph.get_top_interests(top_k=2))
+        
+        self.assertAlmostEqual(top["AI:机器学习"], 0.8 * 0.95, places=4)
+        self.assertEqual(self.graph.node_weights["AI:机器学习"], 0.8)
+    
+    def test_ranking_uses_decayed_weight(self):
+        """测试排序使用衰减后的权重"""
+        self._age("AI:机器学习", 52 * DECAY_PERIOD_SECONDS)
+        top = self.graph.get_top_interests(top_k=2)
+        self.assertEqual(top[0][0], "编程:Python")
+    
+    def test_sweep_removes_dead_nodes(self):
+        """测试清理衰减殆尽的节点"""
+        self._age("AI:机器学习", 1000 * DECAY_PERIOD_SECONDS)
+        removed = self.graph.decay_interests()
+        
+        self.assertEqual(removed, 1)
+        self.assertNotIn("AI:机器学习", self.graph.graph)
+
+    def test_reads_have_no_side_effects(self):
+        """测试读取不清理、不递增版本号、不写日志，失效节点只在结果中被过滤，由下一次修改清理"""
+        self.graph.add_relation("Python", "机器学习", "编程", "AI")
+        self._age("AI:机器学习", 1000 * DECAY_PERIOD_SECONDS)
+        self.graph._last_sweep -= 2 * 365 * 86400
+        self.graph.journal = mock.Mock()
+        version = self.graph.version
+
+        self.assertEqual([n for n, _ in self.graph.get_top_interests(top_k=5)], ["编程:Python"])
+        self.assertEqual(self.graph.get_related_interests(top_k=5), [])
+        self.assertNotIn("机器学习", self.graph.get_recommendations_context(top_k=5))
+        self.assertEqual(self.graph.version, version)
+        self.assertIn("AI:机器学习", self.graph)
+        self.graph.journal.record.assert_not_called()
+
+        self.graph.add_interest("深度学习", "AI")
+        self.assertNotIn("AI:机器学习", self.graph)
+
+
+class TestRankingIndex(unittest.TestCase):
+    """测试排序索引"""
+    
+    def test_matches_full_sort(self):
+        """测试增删改后top-k与全量排序一致"""
+        import random
+        from src.ranking_index import RankingIndex
+        
+        rng = random.Random(7)
+        index = RankingIndex(load=8)
+        keys = {}
+        for step in range(2000):
+            node_id = f"n{rng.randrange(300)}"
+            if rng.random() < 0.2:
+                index.remove(node_id)
+                keys.pop(node_id, None)
+            else:
+                keys[node_id] = rng.random()
+                index.add(node_id, keys[node_id])
+        
+        expected = sorted(((k, n) for n, k in keys.items()), reverse=True)
+        self.assertEqual(len(index), len(keys))
+        self.assertEqual(index.top(20), expected[:20])
+        self.assertEqual(index.bottom(5), sorted(expected)[:5])
+
+
+class TestCompaction(unittest.TestCase):
+    """测试边权重清理和存储整理"""
+    
+    def _build(self, cls, n=200):
+        graph = cls("u")
+        graph.apply_updates([("add_relation", f"q{i}", f"c{i}", "query", "clicked", 0.5) for i in range(n)])
+        return graph
+    
+    def test_remove_node_drops_edge_weights(self):
+        """测试删除节点时一并删除其出边和入边 (拓扑、边权重和邻接索引一致)"""
+        graph = InterestGraph("u")
+        graph.add_relation("a", "b", "query", "clicked", strength=0.7)
+        graph.add_relation("c", "a", "query", "query", strength=0.4)
+        graph.add_relation("c", "b", "query", "clicked", strength=0.2)
+        graph._remove_node("query:a")
+        
+        self.assertEqual(dict(graph.edge_weights), {("query:c", "clicked:b"): 0.2})
+        self.assertEqual(list(graph.graph.edges()), [("query:c", "clicked:b")])
+        self.assertIsNone(graph.get_edge_weight("query:a", "clicked:b"))
+        self.assertIsNone(graph.get_edge_weight("query:c", "query:a"))
+        self.assertEqual(graph.top_successors("query:c"), [("clicked:b", 0.2)])
+        self.assertEqual(graph.top_predecessors("clicked:b"), [("query:c", 0.2)])
+        
+        graph.remove_interest("query:c")
+        self.assertEqual(graph.edge_weights, {})
+        self.assertEqual(graph.top_predecessors("clicked:b"), [])
+    
+    def test_edge_weights_single_copy(self):
+        """测试边权重只存一份：更新后各读取路径一致，且不能绕过图谱直接修改"""
+        graph = InterestGraph("u")
+        graph.add_relation("a", "b", "query", "clicked", strength=0.5)
+        graph.add_relation("a", "b", "query", "clicked", strength=1.0)
+        
+        self.assertAlmostEqual(graph.get_edge_weight("query:a", "clicked:b"), 0.7)
+        self.assertAlmostEqual(graph.edge_weights[("query:a", "clicked:b")], 0.7)
+        self.assertAlmostEqual(graph.top_successors("query:a")[0][1], 0.7)
+        self.assertNotIn("weight", graph.graph.edges["query:a", "clicked:b"])
+        with self.assertRaises(TypeError):
+            graph.edge_weights[("query:a", "clicked:b")] = 0.1
+    
+    def test_compact_preserves_content(self):
+        """测试整理后内容和版本号不变，并回收删除节点留下的空间"""
+        for cls in (InterestGraph, CompactInterestGraph):
+            graph = self._build(cls)
+            graph._remove_nodes([f"query:q{i}" for i in range(150)])
+            before = graph.to_dict()
+            reclaimed = graph.compact()
+            self.assertGreater(reclaimed, 0)
+            after = graph.to_dict()
+            self.assertEqual(after["version"], before["version"])
+            self.assertEqual(sorted(after["edge_weights"]), sorted(before["edge_weights"]))
+            self.assertEqual(after["node_weights"], before["node_weights"])
+            self.assertEqual(graph.top_successors("query:q199"), [("clicked:c199", 0.5)])
+            graph.add_relation("new", "c0", "query", "clicked")
+            self.assertIn("query:new", graph)
+    
+    def test_compact_after_large_prune(self):
+        """测试一次清理移除大量节点后自动整理"""
+        graph = self._build(InterestGraph)
+        stale = time.time() - 3 * 365 * 86400
+        for i in range(150):
+            graph._set_node(f"query:q{i}", 0.5, stale)
+        with mock.patch.object(graph, "compact", wraps=graph.compact) as compact:
+            graph.decay_interests()
+            graph.add_interest("单个兴趣", "query")
+        compact.assert_called_once()
+        self.assertEqual(graph._removed_since_compact, 0)
+
+
+class TestTimingWheel(unittest.TestCase):
+    """测试分层时间轮"""
+    
+    def test_fires_in_order_across_levels(self):
+        """测试跨层级和溢出的任务按截止时间到期，改期和取消生效"""
+        wheel = TimingWheel(tick=1.0, slots=4, levels=2, start=0.0)
+        for key, deadline in (("a", 3), ("b", 9), ("c", 40), ("d", 2), ("e", 17)):
+            wheel.schedule(key, deadline, payload=deadline)
+        wheel.schedule("d", 5)  # 改期
+        wheel.cancel("e")
+        self.assertEqual(len(wheel), 4)
+        self.assertEqual(wheel.deadline("b"), 9)
+        
+        self.assertEqual(wheel.advance(2.5), [])
+        self.assertEqual(wheel.advance(5.0), [("a", 3), ("d", None)])
+        self.assertEqual(wheel.advance(39.0), [("b", 9)])
+        self.assertEqual(wheel.advance(1000.0), [("c", 40)])
+        self.assertEqual(len(wheel), 0)
+    
+    def test_past_deadline_due_immediately(self):
+        """测试截止时间已过的任务在下次推进时到期"""
+        wheel = TimingWheel(tick=1.0, start=100.0)
+        wheel.schedule("late", 50.0)
+        self.assertEqual(wheel.advance(100.0), [("late", None)])
+
+
+class TestCompactInterestGraph(unittest.TestCase):
+    """测试紧凑存储引擎与默认实现行为一致"""
+    
+    def _apply(self, graph):
+        import random
+        rng = random.Random(3)
+        for _ in range(400):
+            a, b = f"t{rng.randrange(60)}", f"t{rng.randrange(60)}"
+            if rng.random() < 0.5:
+                graph.add_interest(a, "query", weight=rng.random())
+            else:
+                graph.add_relation(a, b, "query", "clicked", strength=rng.random())
+            if rng.random() < 0.05:
+                graph._remove_node(f"query:{a}")
+        return graph
+    
+    def test_same_behaviour_as_networkx(self):
+        """测试相同操作序列下两种引擎结果一致"""
+        base = self._apply(InterestGraph("u"))
+        compact = self._apply(CompactInterestGraph("u"))
+        
+        self.assertEqual(len(compact), len(base))
+        self.assertEqual([n for n, _ in compact.get_top_interests(10)],
+                         [n for n, _ in base.get_top_interests(10)])
+        for node_id in base.graph:
+            self.assertEqual(sorted(compact.successors(node_id)), sorted(base.successors(node_id)))
+            for target in base.successors(node_id):
+                self.assertAlmostEqual(compact.get_edge_weight(node_id, target),
+                                       base.get_edge_weight(node_id, target), places=5)
+    
+    def test_removal_drops_edges(self):
+        """测试删除节点时同时删除出边和入边"""
+        graph = CompactInterestGraph("u")
+        graph.add_relation("Python", "Pandas", "query", "clicked", strength=0.7)
+        graph.add_relation("NumPy", "Python", "query", "query", strength=0.5)
+        graph._remove_node("query:Python")
+        
+        self.assertEqual(len(graph.edge_weights), 0)
+        self.assertEqual(graph.successors("query:NumPy"), [])
+    
+    def test_round_trip(self):
+        """测试与字典格式互相转换"""
+        graph = self._apply(CompactInterestGraph("u"))
+        restored = CompactInterestGraph.from_dict(graph.to_dict())
+        self.assertEqual([n for n, _ in restored.get_top_interests(5)],
+                         [n for n, _ in graph.get_top_interests(5)])
+        self.assertEqual(dict(restored.edge_weights), dict(graph.edge_weights))
+
+
+class TestEviction(unittest.TestCase):
+    """测试增量淘汰"""
+    
+    def _fill(self, graph, n):
+        for i in range(n):
+            graph.add_interest(f"t{i}", "query", weight=0.1 + (i % 10) / 20)
+    
+    @mock.patch("src.interest_graph.MAX_GRAPH_SIZE", 50)
+    def test_size_bounded_and_batch_limited(self):
+        """测试节点数不超过上限，且单次修改淘汰数有界"""
+        for graph in (InterestGraph("u"), CompactInterestGraph("u")):
+            for i in range(300):
+                before = len(graph)
+                graph.add_interest(f"t{i}", "query", weight=0.5)
+                self.assertLessEqual(len(graph), 50)
+                self.assertLessEqual(before + 1 - len(graph), 8)
+    
+    @mock.patch("src.interest_graph.MAX_GRAPH_SIZE", 50)
+    def test_lru_policy_evicts_oldest(self):
+        """测试LRU策略淘汰最久未更新的节点"""
+        for cls in (InterestGraph, CompactInterestGraph):
+            graph = cls("u", eviction_policy="lru")
+            self._fill(graph, 50)
+            graph.add_interest("t0", "query", weight=0.1)  # 刷新最旧的节点
+            graph.add_interest("new", "query")
+            self.assertIn("query:t0", graph)
+            self.assertNotIn("query:t1", graph)
+    
+    @mock.patch("src.interest_graph.MAX_GRAPH_SIZE", 10)
+    def test_relation_endpoints_survive_pruning(self):
+        """测试补建关系节点时不会淘汰关系的另一端"""
+        graph = InterestGraph("u")
+        self._fill(graph, 10)
+        graph.add_relation("a", "b", "query", "clicked", strength=0.5)
+        self.assertTrue(graph.graph.has_edge("query:a", "clicked:b"))
+        self.assertIn("query:a", graph)
+
+
+class TestReadCache(unittest.TestCase):
+    """测试按版本缓存的读取结果"""
+    
+    def test_cached_until_mutation(self):
+        """测试版本不变时复用结果，修改后重新计算"""
+        graph = InterestGraph("u")
+        graph.add_interest("Python", "编程", weight=0.6)
+        
+        with mock.patch.object(graph, "_top_nodes", wraps=graph._top_nodes) as top_nodes:
+            first = graph.get_recommendations_context(top_k=5)
+            second = graph.get_recommendations_context(top_k=5)
+            graph.get_top_interests(top_k=5)
+            graph.get_top_interests(top_k=5)
+            self.assertEqual(first, second)
+            # 上下文 (主要兴趣 + 相关兴趣种子) 与 top兴趣 各计算一次
+            self.assertEqual(top_nodes.call_count, 3)
+            
+            graph.add_interest("机器学习", "AI", weight=0.9)
+            top = graph.get_top_interests(top_k=5)
+            self.assertEqual(top[0][0], "AI:机器学习")
+            self.assertIn("机器学习", graph.get_recommendations_context(top_k=5))
+
+
+
+class TestBatchUpdates(unittest.TestCase):
+    """测试批量修改"""
+    
+    UPDATES = [
+        ("add_interest", "Python 数据分析", "query", 0.6),
+        ("add_interest", "Pandas指南", "clicked", 0.8),
+        ("add_relation", "Python 数据分析", "Pandas指南", "query", "clicked", 0.7),
+        {"op": "add_interest", "topic": "机器学习"},
+        ("add_interest", "临时"),
+        ("remove_interest", "general:临时"),
+    ]
+    
+    def test_same_result_as_single_calls(self):
+        """测试批量结果与逐个调用一致，且只递增一次版本号、共用一个时间戳"""
+        for cls in (InterestGraph, CompactInterestGraph):
+            single = cls("u")
+            single.add_interest("Python 数据分析", "query", weight=0.6)
+            single.add_interest("Pandas指南", "clicked", weight=0.8)
+            single.add_relation("Python 数据分析", "Pandas指南", "query", "clicked", strength=0.7)
+            single.add_interest("机器学习")
+            
+            batch = cls("u")
+            self.assertEqual(batch.apply_updates(self.UPDATES, timestamp=1000.0), 6)
+            self.assertEqual(batch.version, 1)
+            self.assertEqual(sorted(batch.graph), sorted(single.graph))
+            self.assertEqual(set(batch.last_update.values()), {1000.0})
+            self.assertAlmostEqual(batch.get_edge_weight("query:Python 数据分析", "clicked:Pandas指南"),
+                                   single.get_edge_weight("query:Python 数据分析", "clicked:Pandas指南"))
+            for node_id in single.graph:
+                self.assertAlmostEqual(batch.node_weights[node_id], single.node_weights[node_id], places=6)
+                self.assertEqual(batch.access_count[node_id], single.access_count[node_id])
+    
+    def test_invalid_update(self):
+        """测试未知操作和缺少参数时报错"""
+        graph = InterestGraph("u")
+        with self.assertRaises(ValueError):
+            graph.apply_updates([("rename", "a")])
+        with self.assertRaises(ValueError):
+            graph.apply_updates([{"op": "add_relation", "source_topic": "a"}])
+        self.assertEqual(graph.version, 0)
+    
+    @mock.patch("src.interest_graph.MAX_GRAPH_SIZE", 50)
+    def test_prunes_once_after_batch(self):
+        """测试批量写入超出上限时批次结束后一次修剪，且不淘汰本批节点"""
+        for cls in (InterestGraph, CompactInterestGraph):
+            graph = cls("u")
+            for i in range(45):
+                graph.add_interest(f"old{i}", "query", weight=0.9)
+            graph.apply_updates([("add_interest", f"new{i}", "query", 0.1) for i in range(20)])
+            self.assertLessEqual(len(graph), 50)
+            self.assertTrue(all(f"query:new{i}" in graph for i in range(20)))
+
+
+class TestRelatedInterests(unittest.TestCase):
+    """测试个性化PageRank多跳关联"""
+    
+    def test_pagerank_sums_to_one(self):
+        """测试有悬挂节点时得分仍为概率分布，且种子得分最高"""
+        matrix = TransitionMatrix(4, [0, 1, 1], [1, 2, 3], [1.0, 3.0, 1.0])
+        scores, iterations = personalized_pagerank(matrix, np.array([1.0, 0, 0, 0]))
+        self.assertAlmostEqual(scores.sum(), 1.0, places=5)
+        self.assertEqual(int(np.argmax(scores)), 0)
+        self.assertGreater(scores[2], scores[3])
+        self.assertLess(iterations, PAGERANK_MAX_ITER)
+    
+    def test_multi_hop_ranking(self):
+        """测试按关联度返回多跳节点，不包含种子和不可达节点"""
+        for cls in (InterestGraph, CompactInterestGraph):
+            graph = cls("u")
+            graph.add_interest("Python", "query", weight=0.9)
+            graph.add_relation("Python", "Pandas", "query", "clicked", strength=0.9)
+            graph.add_relation("Pandas", "NumPy", "clicked", "clicked", strength=0.5)
+            graph.add_interest("烹饪", "query", weight=0.05)
+            
+            related = graph.get_related_interests(top_k=5, seeds=1)
+            self.assertEqual([node_id for node_id, _ in related], ["clicked:Pandas", "clicked:NumPy"])
+            self.assertGreater(related[0][1], related[1][1])
+            self.assertIn("相关兴趣: Pandas, NumPy", graph.get_recommendations_context(top_k=1))
+    
+    def test_transition_matrix_cached_per_version(self):
+        """测试转移矩阵在版本不变时复用"""
+        graph = InterestGraph("u")
+        graph.add_relation("Python", "Pandas", "query", "clicked")
+        matrix = graph._transition_matrix()
+        self.assertIs(graph._transition_matrix(), matrix)
+        graph.add_interest("NumPy", "clicked")
+        self.assertIsNot(graph._transition_matrix(), matrix)
+
+
+class TestGraphSnapshots(unittest.TestCase):
+    """测试只读快照"""
+    
+    def test_published_after_each_outer_operation(self):
+        """测试快照在最外层修改结束后整体替换，旧快照保持不变"""
+        for cls in (InterestGraph, CompactInterestGraph):
+            graph = cls("u")
+            self.assertIs(graph.snapshot(), graph)
+            graph.add_interest("Python", "query", weight=0.9)
+            first = graph.enable_snapshots()
+            self.assertIs(graph.snapshot(), first)
+            
+            graph.apply_updates([("add_interest", "Pandas", "clicked", 0.8),
+                                 ("add_relation", "Python", "Pandas", "query", "clicked", 0.7)])
+            second = graph.snapshot()
+            self.assertIsNot(second, first)
+            self.assertEqual(second.version, graph.version)
+            self.assertNotIn("clicked:Pandas", first)
+            self.assertAlmostEqual(second.get_edge_weight("query:Python", "clicked:Pandas"), 0.7, places=6)
+            self.assertEqual([n for n, _ in second.get_top_interests(top_k=5)],
+                             [n for n, _ in graph.get_top_interests(top_k=5)])
+    
+    def test_snapshot_is_read_only(self):
+        """测试快照上的修改报错"""
+        graph = InterestGraph("u")
+        graph.add_interest("Python", "query")
+        view = graph.enable_snapshots()
+        with self.assertRaises(TypeError):
+            view.add_interest("Java")
+        with self.assertRaises(ValueError):
+            view._weights[0] = 1.0
+    
+    def test_concurrent_reader_sees_consistent_state(self):
+        """测试写线程修改期间，读线程读到的每个快照中边的两端都存在"""
+        graph = CompactInterestGraph("u")
+        graph.enable_snapshots()
+        errors = []
+        stop = threading.Event()
+        
+        def reader():
+            while not stop.is_set():
+                view = graph.snapshot()
+                for source, target in view.graph.edges():
+                    if source not in view or target not in view:
+                        errors.append((view.version, source, target))
+        
+        thread = threading.Thread(target=reader)
+        thread.start()
+        for i in range(200):
+            graph.apply_updates([("add_relation", f"q{i}", f"c{i}", "query", "clicked", 0.7),
+                                 ("remove_interest", f"query:q{i - 1}")])
+        stop.set()
+        thread.join()
+        self.assertEqual(errors, [])
+
+
+class TestTopicMerging(unittest.TestCase):
+    """测试近似重复主题合并"""
+    
+    def test_near_duplicates_merge(self):
+        """测试近似重复主题合并到已有节点，数字不同或类别不同时不合并"""
+        for cls in (InterestGraph, CompactInterestGraph):
+            graph = cls("u")
+            node_id = graph.add_interest("Python数据分析", "query", weight=0.6)
+            self.assertEqual(graph.add_interest("Python 数据分析 Pandas", "query", weight=0.9), node_id)
+            self.assertEqual(graph.add_interest("python  数据分析!", "query"), node_id)
+            self.assertEqual(graph.access_count[node_id], 3)
+            
+            self.assertEqual(graph.add_interest("iPhone 14 评测", "query"), "query:iPhone 14 评测")
+            self.assertEqual(graph.add_interest("iPhone 15 评测", "query"), "query:iPhone 15 评测")
+            self.assertEqual(graph.add_interest("Python数据分析", "clicked"), "clicked:Python数据分析")
+            self.assertEqual(graph.add_interest("机器学习", "query"), "query:机器学习")
+            self.assertEqual(len(graph), 5)
+    
+    def test_relation_uses_merged_nodes(self):
+        """测试关系和批量修改连接到合并后的节点"""
+        graph = InterestGraph("u")
+        graph.add_interest("Python数据分析", "query")
+        graph.apply_updates([
+            ("add_interest", "Pandas 入门指南", "clicked", 0.8),
+            ("add_relation", "Python 数据分析 Pandas", "Pandas入门指南", "query", "clicked", 0.7),
+        ])
+        self.assertEqual(len(graph), 2)
+        self.assertEqual(list(graph.graph.edges()), [("query:Python数据分析", "clicked:Pandas 入门指南")])
+        
+        graph.add_relation("深度学习框架", "深度学习框架对比", "query", "query")
+        self.assertNotIn(("query:深度学习框架", "query:深度学习框架"), graph.graph.edges())
+    
+    def test_removed_node_not_matched(self):
+        """测试删除的节点不再作为合并目标"""
+        graph = CompactInterestGraph("u")
+        graph.add_interest("Python数据分析", "query")
+        graph.remove_interest("query:Python数据分析")
+        self.assertEqual(graph.add_interest("Python 数据分析 Pandas", "query"), "query:Python 数据分析 Pandas")
+
+
+
+class TestAdjacencyIndex(unittest.TestCase):
+    """测试按权重排序的邻接索引"""
+    
+    def _build(self, cls):
+        graph = cls("u")
+        for target, strength in (("b", 0.3), ("c", 0.9), ("d", 0.6), ("e", 0.6)):
+            graph.add_relation("a", target, "query", "clicked", strength)
+        graph.add_relation("x", "c", "query", "clicked", 0.5)
+        graph.add_relation("y", "c", "query", "clicked", 0.95)
+        return graph
+    
+    def test_top_neighbours_sorted_by_weight(self):
+        """测试前k个后继和前驱按边权重降序返回，同权重按节点ID排序"""
+        for cls in (InterestGraph, CompactInterestGraph):
+            graph = self._build(cls)
+            self.assertEqual([n for n, _ in graph.top_successors("query:a", k=3)],
+                             ["clicked:c", "clicked:d", "clicked:e"])
+            self.assertAlmostEqual(graph.top_successors("query:a", k=1)[0][1], 0.9, places=5)
+            self.assertEqual([n for n, _ in graph.top_predecessors("clicked:c", k=5)],
+                             ["query:y", "query:a", "query:x"])
+            self.assertEqual(graph.top_successors("clicked:c"), [])
+            self.assertEqual(graph.top_successors("query:missing"), [])
+            self.assertEqual(graph.top_successors("query:a", k=0), [])
+    
+    def test_updates_and_removal(self):
+        """测试边权重更新后重新排序，删除节点后两个方向都不再返回"""
+        for cls in (InterestGraph, CompactInterestGraph):
+            graph = self._build(cls)
+            graph.add_relation("a", "b", "query", "clicked", 1.0)  # 0.6*0.3 + 0.4*1.0 = 0.58
+            self.assertEqual([n for n, _ in graph.top_successors("query:a", k=5)],
+                             ["clicked:c", "clicked:d", "clicked:e", "clicked:b"])
+            
+            graph.remove_interest("clicked:c")
+            self.assertEqual([n for n, _ in graph.top_successors("query:a", k=5)],
+                             ["clicked:d", "clicked:e", "clicked:b"])
+            self.assertEqual(graph.top_successors("query:y"), [])
+            graph.remove_interest("query:a")
+            self.assertEqual(graph.top_predecessors("clicked:d"), [])
+
+
+
+class TestCooccurrenceGraph(unittest.TestCase):
+    """测试跨用户物品共现图谱"""
+    
+    def test_top_k_co_clicked(self):
+        """测试按共现计数返回被点击物品，多个种子的计数相加，种子和查询不作为候选"""
+        co = CooccurrenceGraph()
+        now = time.time()
+        co.record("机器学习", ["吴恩达课程", "深度学习专项"], now=now)
+        co.record("机器学习", ["吴恩达课程"], now=now)
+        co.record("数据分析", ["Pandas指南", "吴恩达课程"], now=now)
+        co.record("单独查询", [], now=now)
+        
+        self.assertEqual([t for t, _ in co.top_k(["机器学习"], k=5, now=now)], ["吴恩达课程", "深度学习专项"])
+        self.assertAlmostEqual(co.top_k(["机器学习"], k=1, now=now)[0][1], 2.0)
+        self.assertEqual([t for t, _ in co.top_k({"机器学习": 1.0, "数据分析": 1.0}, k=1, now=now)],
+                         ["吴恩达课程"])
+        self.assertEqual([t for t, _ in co.top_k(["吴恩达课程"], k=5, now=now)], ["Pandas指南", "深度学习专项"])
+        self.assertEqual(co.top_k(["机器学习"], k=5, exclude=["吴恩达课程"], now=now)[0][0], "深度学习专项")
+        self.assertEqual(co.top_k(["单独查询"], now=now), [])
+        self.assertNotIn("单独查询", co)
+    
+    def test_decay_and_flush(self):
+        """测试计数随时间衰减，合并尾段前后查询结果一致，衰减到下限的物品被清除"""
+        co = CooccurrenceGraph(decay_factor=0.5, decay_period=100.0, min_weight=0.2)
+        now = time.time()
+        co.record("q1", ["a", "b"], now=now)
+        co.record("q2", ["c"], now=now + 200)
+        self.assertAlmostEqual(co.top_k(["q1"], now=now + 100)[0][1], 0.5)
+        before = co.top_k(["q1"], now=now + 200)
+        co.flush()
+        self.assertEqual(co.top_k(["q1"], now=now + 200), before)
+        self.assertEqual(co.n_pairs, 8)
+        
+        co._flush_tail(now + 300)  # q1 的计数衰减到 0.125，低于下限
+        self.assertNotIn("q1", co)
+        [(item, count)] = co.top_k(["q2"], now=now + 300)
+        self.assertEqual(item, "c")
+        self.assertAlmostEqual(count, 0.5)
+        self.assertEqual(co.get_stats(), {"items": 2, "pairs": 1, "baskets": 2})
+    
+    def test_rescale_keeps_counts(self):
+        """测试缩放基准更新后计数不变"""
+        co = CooccurrenceGraph(decay_factor=0.5, decay_period=1.0, min_weight=0.0)
+        now = time.time()
+        co.record("q", ["a"], now=now)
+        co.record("q", ["a"], now=now + 1000)  # 触发重新缩放
+        self.assertAlmostEqual(co.top_k(["q"], now=now + 1000)[0][1], 1.0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,764 @@
+"""
+单元测试 - 持久化测试
+
+测试兴趣图谱快照等持久化功能
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from src.interest_graph import InterestGraph
+from src.compact_graph import CompactInterestGraph
+from src.storage import (SnapshotBundle, dumps_graph, loads_graph, save_graph, load_graph, save_bundle,
+                         GraphJournal, InterestGraphStore, SQLiteSessionStore, SQLiteGenerationCache)
+from src.storage.journal import encode_record, iter_records
+from src.interest_graph import OP_ADD_INTEREST
+
+
+def build_graph(user_id, graph_cls=InterestGraph):
+    """构造带边的测试图谱"""
+    graph = graph_cls(user_id)
+    graph.add_interest("机器学习", "AI", weight=0.8)
+    graph.add_interest("Python 数据分析", "query", weight=0.6)
+    graph.add_relation("Python 数据分析", "Pandas指南", "query", "clicked", strength=0.7)
+    graph.add_relation("Python 数据分析", "Pandas指南", "query", "clicked", strength=0.2)
+    return graph
+
+
+def read_generation(path, key):
+    """在另一个进程中读取生成缓存 (进程池的工作函数)"""
+    cache = SQLiteGenerationCache(path)
+    try:
+        entry = cache.get(key)
+        return None if entry is None else list(entry[1])
+    finally:
+        cache.close()
+
+
+class TestSnapshot(unittest.TestCase):
+    """测试二进制快照"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def assertSameGraph(self, restored, graph):
+        self.assertEqual(restored.user_id, graph.user_id)
+        self.assertEqual(restored.version, graph.version)
+        self.assertEqual(sorted(restored.graph), sorted(graph.graph))
+        self.assertAlmostEqual(restored.get_edge_weight("query:Python 数据分析", "clicked:Pandas指南"),
+                               graph.get_edge_weight("query:Python 数据分析", "clicked:Pandas指南"), places=5)
+        for node_id in graph.graph:
+            self.assertAlmostEqual(restored.node_weights[node_id], graph.node_weights[node_id], places=5)
+            self.assertEqual(restored.access_count[node_id], graph.access_count[node_id])
+    
+    def test_round_trip_both_engines(self):
+        """测试两种引擎互相读写快照"""
+        for source_cls in (InterestGraph, CompactInterestGraph):
+            graph = build_graph("用户_1", source_cls)
+            data = dumps_graph(graph)
+            self.assertEqual(len(data) % 8, 0)
+            for engine in ("networkx", "compact"):
+                self.assertSameGraph(loads_graph(data, engine=engine), graph)
+    
+    def test_save_and_load(self):
+        """测试单图谱文件保存和加载 (加载后不占用文件描述符)"""
+        path = os.path.join(self.tmpdir.name, "graph.bin")
+        graph = build_graph("u1")
+        save_graph(graph, path)
+        restored = load_graph(path, engine="compact")
+        self.assertSameGraph(restored, graph)
+        restored.add_interest("新兴趣", "query", weight=0.5)  # 数组可写
+        self.assertIn("query:新兴趣", restored)
+        
+        if os.path.isdir("/proc/self/fd"):
+            before = len(os.listdir("/proc/self/fd"))
+            graphs = [load_graph(path, engine="compact") for _ in range(50)]
+            self.assertLess(len(os.listdir("/proc/self/fd")) - before, 5)
+            self.assertEqual(len(graphs), 50)
+    
+    def test_bundle(self):
+        """测试批量快照按用户加载"""
+        path = os.path.join(self.tmpdir.name, "bundle.bin")
+        graphs = [build_graph(f"u{i}") for i in range(5)]
+        graphs.append(InterestGraph("empty"))
+        self.assertEqual(save_bundle(graphs, path), 6)
+        
+        with SnapshotBundle(path) as bundle:
+            self.assertEqual(len(bundle), 6)
+            self.assertIn("u3", bundle)
+            self.assertSameGraph(bundle.load("u3"), graphs[3])
+            self.assertEqual(len(bundle.load("empty", engine="compact")), 0)
+    
+    def test_dict_is_json_serializable(self):
+        """测试to_dict可以JSON序列化且from_dict保留边权重"""
+        graph = build_graph("u1")
+        data = json.loads(json.dumps(graph.to_dict(), ensure_ascii=False))
+        self.assertSameGraph(InterestGraph.from_dict(data), graph)
+
+
+
+class TestJournal(unittest.TestCase):
+    """测试修改日志与快照压缩"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def assertSameGraph(self, restored, graph):
+        self.assertEqual(sorted(restored.graph), sorted(graph.graph))
+        self.assertEqual(sorted(restored.graph.edges()), sorted(graph.graph.edges()))
+        for node_id in graph.graph:
+            self.assertAlmostEqual(restored.node_weights[node_id], graph.node_weights[node_id], places=5)
+            self.assertEqual(restored.last_update[node_id], graph.last_update[node_id])
+    
+    def build_users(self, journal, count=4):
+        graphs = {}
+        for i in range(count):
+            graph = journal.attach(InterestGraph(f"u{i}"))
+            graph.add_interest("机器学习", "AI", weight=0.8)
+            graph.add_relation("Python 数据分析", "Pandas指南", "query", "clicked", strength=0.7)
+            graph.add_interest("机器学习", "AI", weight=0.4)
+            graph.remove_interest("AI:机器学习")
+            graph.add_interest(f"兴趣{i}", "query", weight=0.6)
+            graph.apply_updates([("add_interest", "批量", "query", 0.5),
+                                 ("add_relation", "批量", f"兴趣{i}", "query", "query", 0.3)])
+            graphs[graph.user_id] = graph
+        return graphs
+    
+    def test_record_size(self):
+        """测试单条记录只有几十字节"""
+        data = encode_record(1, "u1", OP_ADD_INTEREST, 1.0, "机器学习", "AI", 0.8)
+        self.assertLess(len(data), 64)
+        records = list(iter_records(data))
+        self.assertEqual(records[0][1:5], ("u1", OP_ADD_INTEREST, 1.0, ("机器学习", "AI", 0.8)))
+    
+    def test_recover_replays_journal(self):
+        """测试日志回放恢复出与内存一致的图谱"""
+        journal = GraphJournal(self.path, shards=3)
+        graphs = self.build_users(journal)
+        journal.close()
+        
+        recovered = GraphJournal(self.path, shards=3).recover()
+        self.assertEqual(sorted(recovered), sorted(graphs))
+        for user_id, graph in graphs.items():
+            self.assertSameGraph(recovered[user_id], graph)
+            self.assertEqual(recovered[user_id].version, graph.version)
+    
+    def test_compact_then_recover(self):
+        """测试压缩后日志被截断，恢复结果不变且后续写入继续生效"""
+        journal = GraphJournal(self.path, shards=2)
+        graphs = self.build_users(journal)
+        size_before = sum(journal.journal_bytes(i) for i in range(2))
+        used = {journal.shard_of(user_id) for user_id in graphs}
+        self.assertEqual(journal.compact(), len(used))
+        self.assertEqual(sum(journal.journal_bytes(i) for i in range(2)), 0)
+        self.assertGreater(size_before, 0)
+        
+        graphs["u1"].add_interest("压缩后", "query", weight=0.9)
+        journal.close()
+        
+        recovered = GraphJournal(self.path, shards=2).recover()
+        for user_id, graph in graphs.items():
+            self.assertSameGraph(recovered[user_id], graph)
+        self.assertIn("query:压缩后", recovered["u1"])
+    
+    @mock.patch("src.interest_graph.MAX_GRAPH_SIZE", 10)
+    def test_recover_after_eviction(self):
+        """测试容量淘汰跨越快照时，恢复出的图谱与崩溃前一致 (被淘汰的节点不会复活)"""
+        journal = GraphJournal(self.path, shards=1)
+        graph = journal.attach(InterestGraph("u1"))
+        graph.apply_updates([("add_interest", f"兴趣{i}", "query", 0.5) for i in range(9)], timestamp=1000.0)
+        # 权重和时间相同的节点按最近一次更新的先后淘汰，快照不保存这一顺序
+        graph.apply_updates([("add_interest", "兴趣0", "query", 0.5)], timestamp=1000.0)
+        graph.add_interest("满", "query", weight=0.5)  # 达到上限，进入修剪模式
+        journal.compact()
+        for i in range(4):
+            graph.add_interest(f"新{i}", "query", weight=0.5)
+        self.assertLess(len(graph), 10)
+        journal.close()
+        
+        recovered = GraphJournal(self.path, shards=1).recover()["u1"]
+        self.assertSameGraph(recovered, graph)
+        self.assertEqual(recovered.version, graph.version)
+    
+    def test_truncated_tail_is_ignored(self):
+        """测试崩溃时写了一半的尾部记录被丢弃，之后的追加仍可读"""
+        journal = GraphJournal(self.path, shards=1)
+        graph = journal.attach(InterestGraph("u1"))
+        graph.add_interest("完整", "query")
+        journal.close()
+        with open(os.path.join(self.path, "journal-0000.log"), "ab") as f:
+            f.write(encode_record(99, "u1", OP_ADD_INTEREST, 1.0, "半条", "query", 0.5)[:-3])
+        
+        journal = GraphJournal(self.path, shards=1)
+        recovered = journal.recover()
+        self.assertNotIn("query:半条", recovered["u1"])
+        recovered["u1"].add_interest("新写入", "query")
+        journal.close()
+        
+        recovered = GraphJournal(self.path, shards=1).recover()
+        self.assertIn("query:完整", recovered["u1"])
+        self.assertIn("query:新写入", recovered["u1"])
+
+
+class TestGraphStore(unittest.TestCase):
+    """测试带内存预算的分层图谱存储"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_spill_and_rehydrate(self):
+        """测试超出预算时淘汰最久未访问的图谱，再次访问时从磁盘加载"""
+        size = build_graph("u0").memory_estimate()
+        store = InterestGraphStore(self.path, memory_budget=2 * size)
+        for i in range(3):
+            store[f"u{i}"] = build_graph(f"u{i}")
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.get_stats()["hot_users"], 2)
+        self.assertEqual(store.evictions, 1)
+        
+        restored = store["u0"]
+        self.assertEqual(sorted(restored.graph.edges()), sorted(build_graph("u0").graph.edges()))
+        stats = store.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 1))
+        self.assertEqual(stats["evictions"], 2)
+        self.assertLessEqual(stats["memory_bytes"], 2 * size)
+        
+        store["u0"]
+        self.assertEqual(store.get_stats()["hit_rate"], 0.5)
+        self.assertIsNone(store.get("missing"))
+    
+    def test_clean_graph_not_rewritten(self):
+        """测试未修改的图谱再次淘汰时不重复写盘，修改后的图谱会写盘"""
+        size = build_graph("u0").memory_estimate()
+        store = InterestGraphStore(self.path, memory_budget=size)
+        store["a"], store["b"] = build_graph("a"), build_graph("b")
+        store["a"]
+        store["b"]
+        self.assertEqual(store.spill_writes, 2)
+        store["a"].add_interest("新兴趣", "query")
+        store["b"]
+        self.assertEqual(store.spill_writes, 3)
+        self.assertIn("query:新兴趣", store["a"])
+    
+    def test_busy_user_not_evicted(self):
+        """测试淘汰跳过用户锁被占用的图谱"""
+        size = build_graph("u0").memory_estimate()
+        locks = {"a": threading.RLock(), "b": threading.RLock()}
+        store = InterestGraphStore(self.path, memory_budget=size, lock_for=locks.get)
+        store["a"] = build_graph("a")
+        held, release = threading.Event(), threading.Event()
+        
+        def owner():
+            with locks["a"]:
+                held.set()
+                release.wait(10)
+        
+        thread = threading.Thread(target=owner)
+        thread.start()
+        held.wait(10)
+        store["b"] = build_graph("b")
+        self.assertIsNotNone(store.resident("a"))
+        self.assertEqual(store.get_stats()["evictions_skipped"], 1)
+        release.set()
+        thread.join()
+        store["b"]
+        self.assertIsNone(store.resident("a"))
+        self.assertEqual(store.evictions, 1)
+    
+    def test_spill_failure_keeps_graph_resident(self):
+        """测试落盘失败时图谱保留在内存中，不向触发淘汰的调用方抛出异常，改淘汰下一个"""
+        size = build_graph("u0").memory_estimate()
+        store = InterestGraphStore(self.path, memory_budget=2 * size)
+        store["a"] = build_graph("a")
+        store["b"] = build_graph("b")
+        real_save = save_graph
+
+        def failing_save(graph, path):
+            if graph.user_id == "a":
+                raise OSError("No space left on device")
+            real_save(graph, path)
+
+        with mock.patch("src.storage.graph_store.save_graph", side_effect=failing_save):
+            store["c"] = build_graph("c")
+        self.assertIsNotNone(store.resident("a"))
+        self.assertIsNone(store.resident("b"))
+        self.assertEqual((store.spill_failures, store.evictions), (1, 1))
+        self.assertEqual(store.get_stats()["memory_bytes"],
+                         sum(store.resident(u).memory_estimate() for u in ("a", "c")))
+
+        # 磁盘恢复后下次淘汰正常落盘，内容完整
+        store["d"] = build_graph("d")
+        self.assertIsNone(store.resident("a"))
+        self.assertEqual(sorted(store["a"].graph.edges()), sorted(build_graph("a").graph.edges()))
+
+    def test_concurrent_admission(self):
+        """测试多线程同时访问时内存计数与常驻图谱一致"""
+        size = build_graph("u0").memory_estimate()
+        store = InterestGraphStore(self.path, memory_budget=3 * size)
+        for i in range(12):
+            store[f"u{i}"] = build_graph(f"u{i}")
+        errors = []
+        
+        def worker(seed):
+            try:
+                for j in range(60):
+                    store[f"u{(seed * 7 + j) % 12}"]
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        resident = store.resident_items()
+        self.assertEqual(store.get_stats()["memory_bytes"], sum(g.memory_estimate() for _, g in resident))
+        self.assertEqual(len(store), 12)
+    
+    @mock.patch("src.managers.evolution_manager.EvolutionManager")
+    def test_reopen_and_session_manager(self, _):
+        """测试目录中已落盘的图谱在新存储中可见，SessionManager透明加载"""
+        from src.managers import SessionManager
+        
+        store = InterestGraphStore(self.path)
+        store["u1"] = build_graph("u1")
+        self.assertEqual(store.flush(), 1)
+        
+        session = SessionManager(graph_store=InterestGraphStore(self.path, memory_budget=0))
+        self.assertIn("u1", session.users)
+        graph, _ = session.get_or_create_user("u1")
+        self.assertIn("AI:机器学习", graph)
+        session.get_or_create_user("u2")
+        self.assertEqual(sorted(session.users), ["u1", "u2"])
+        self.assertEqual(sorted(g.user_id for g in session.users.values()), ["u1", "u2"])
+        self.assertEqual(session.get_store_stats()["misses"], 1)
+
+
+class TestMaintenance(unittest.TestCase):
+    """测试跨用户维护任务"""
+    
+    STALE = 3 * 365 * 86400  # 3年前更新的节点已衰减到下限以下
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.size = build_graph("u0").memory_estimate()
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def build_store(self, users, hot):
+        """users 个图谱各带2个失效节点，其中 hot 个常驻内存"""
+        from src.managers import MaintenanceJob
+        
+        now = time.time()
+        store = InterestGraphStore(self.tmpdir.name, memory_budget=hot * (self.size + 2 * InterestGraph.NODE_BYTES))
+        for i in range(users):
+            graph = build_graph(f"u{i}")
+            for j in range(2):
+                graph._create_node(f"query:old_{j}", "query", f"old_{j}")
+                graph._set_node(f"query:old_{j}", 0.5, now - self.STALE)
+            store[f"u{i}"] = graph
+        store["fresh"] = build_graph("fresh")
+        return store, MaintenanceJob
+    
+    def test_sweeps_resident_and_spilled(self):
+        """测试常驻图谱原地清理并回收估算内存，落盘图谱被重写"""
+        store, MaintenanceJob = self.build_store(users=5, hot=3)
+        spilled = [user_id for user_id, _ in store.spilled_paths()]
+        self.assertTrue(spilled)
+        job = MaintenanceJob(store, time_budget=10.0, shard_size=2)
+        
+        result = job.tick()
+        self.assertEqual(result["graphs_swept"], 5)
+        self.assertEqual(result["nodes_removed"], 10)
+        resident = [user_id for user_id, _ in store.resident_items() if user_id != "fresh"]
+        self.assertEqual(result["bytes_reclaimed"], 2 * InterestGraph.NODE_BYTES * len(resident))
+        self.assertEqual(job.files_rewritten, len(spilled))
+        for i in range(5):
+            self.assertNotIn("query:old_0", store[f"u{i}"])
+            self.assertIn("AI:机器学习", store[f"u{i}"])
+        self.assertEqual(job.tick()["graphs_swept"], 0)
+    
+    def test_time_budget_and_process_pool(self):
+        """测试预算用完时剩余图谱留到下一轮，落盘图谱可由进程池处理"""
+        store, MaintenanceJob = self.build_store(users=4, hot=2)
+        job = MaintenanceJob(store, time_budget=0.0)
+        self.assertEqual(job.tick()["graphs_swept"], 0)
+        
+        job = MaintenanceJob(store, time_budget=10.0, processes=2, shard_size=1)
+        try:
+            job.tick()
+        finally:
+            job.close()
+        self.assertEqual(job.get_stats()["nodes_removed"], 8)
+        self.assertGreater(job.files_rewritten, 0)
+    
+    def test_busy_user_skipped(self):
+        """测试常驻图谱在用户锁内清理，锁被写入方占用的用户跳过，留到下一轮"""
+        store, MaintenanceJob = self.build_store(users=2, hot=3)
+        self.assertEqual(store.spilled_paths(), [])
+        locks = {user_id: threading.RLock() for user_id in ("u0", "u1", "fresh")}
+        job = MaintenanceJob(store, time_budget=10.0, lock_for=locks.get)
+        held, release = threading.Event(), threading.Event()
+
+        def owner():
+            with locks["u0"]:
+                held.set()
+                release.wait(10)
+
+        thread = threading.Thread(target=owner)
+        thread.start()
+        held.wait(10)
+        with mock.patch.object(InterestGraph, "decay_interests", autospec=True,
+                               side_effect=lambda graph, now=None: self.assertTrue(
+                                   locks[graph.user_id]._is_owned()) or 0) as decay:
+            job.tick()
+        release.set()
+        thread.join()
+        self.assertEqual([call.args[0].user_id for call in decay.call_args_list], ["u1"])
+        self.assertEqual(job.get_stats()["graphs_skipped"], 1)
+        self.assertIn("query:old_0", store.resident("u0"))
+
+        job.tick()
+        self.assertNotIn("query:old_0", store.resident("u0"))
+
+    @mock.patch("src.managers.evolution_manager.EvolutionManager")
+    def test_session_maintenance_uses_user_lock(self, _):
+        """测试SessionManager的维护任务使用用户锁"""
+        from src.managers import SessionManager
+
+        session = SessionManager()
+        self.assertEqual(session.maintenance.lock_for, session.user_lock)
+
+    def test_spilled_copy_not_overwritten(self):
+        """测试处理期间被加载到内存的用户不被替换磁盘副本"""
+        store, _ = self.build_store(users=2, hot=1)
+        user_id, _ = store.spilled_paths()[0]
+        graph = store[user_id]
+        self.assertFalse(store.replace_spilled(user_id, graph.version, graph.version + 1, dumps_graph(graph)))
+
+
+class TestMaintenanceScheduler(unittest.TestCase):
+    """测试按用户的维护调度器"""
+    
+    @mock.patch("src.managers.evolution_manager.EvolutionManager")
+    def test_deferred_tasks_run_on_schedule(self, _):
+        """测试启用调度器后请求路径不清理、不检查演化，到期后由调度器执行且每刻度有上限"""
+        from src.managers import SessionManager
+        
+        session = SessionManager()
+        now = time.time()
+        scheduler = session.enable_scheduler(start=False, max_tasks=2, decay_interval=100.0,
+                                             compact_interval=50.0, evolution_delay=1.0, now=now)
+        graph, evo_manager = session.get_or_create_user("u1")
+        self.assertFalse(graph.auto_sweep)
+        self.assertTrue(evo_manager.deferred_evolution)
+        graph.add_interest("兴趣", "query")
+        graph._create_node("query:old", "query", "old")
+        graph._set_node("query:old", 0.5, now - TestMaintenance.STALE)
+        session.ingest_updates({"u1": [("add_interest", "另一个兴趣", "query", 0.5)]})
+        self.assertIn("query:old", graph)
+        self.assertEqual(len(scheduler), 3)
+        
+        self.assertEqual(scheduler.run_pending(now + 0.5), 0)
+        self.assertEqual(scheduler.run_pending(now + 2), 1)
+        evo_manager.check_evolution.assert_called_once()
+        self.assertEqual(scheduler.run_pending(now + 200), 2)  # compact 和 decay 同时到期
+        self.assertNotIn("query:old", graph)
+        self.assertEqual(scheduler.get_stats()["tasks_run"], {"decay": 1, "compact": 1, "evolution": 1})
+        self.assertEqual(len(scheduler), 1)  # decay 周期性重新登记
+    
+    @mock.patch("src.managers.evolution_manager.EvolutionManager")
+    def test_task_uses_graph_resident_under_lock(self, _):
+        """测试等待用户锁期间图谱被落盘后重新加载时，任务处理的是新加载的对象"""
+        from src.managers import SessionManager
+        
+        session = SessionManager()
+        now = time.time()
+        scheduler = session.enable_scheduler(start=False, decay_interval=1.0, compact_interval=100.0,
+                                             evolution_delay=100.0, now=now)
+        graph, _ = session.get_or_create_user("u1")
+        graph._create_node("query:old", "query", "old")
+        graph._set_node("query:old", 0.5, now - TestMaintenance.STALE)
+        scheduler.touch("u1", now)
+        reloaded = loads_graph(dumps_graph(graph))
+        user_lock = session.user_lock
+        
+        def swap_then_lock(user_id):
+            session.users[user_id] = reloaded  # 取锁前被淘汰并重新加载
+            return user_lock(user_id)
+        
+        with mock.patch.object(session, "user_lock", swap_then_lock):
+            self.assertEqual(scheduler.run_pending(now + 2), 1)
+        self.assertNotIn("query:old", reloaded)
+        self.assertIn("query:old", graph)
+
+
+class TestSessionRestore(unittest.TestCase):
+    """测试SessionManager恢复外部快照后的日志和维护设置"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @mock.patch("src.managers.evolution_manager.EvolutionManager")
+    def test_bundle_restore_is_journaled(self, _):
+        """测试从批量快照恢复的图谱挂上日志，之后的修改可以崩溃恢复"""
+        from src.graph_snapshot import GraphSnapshot
+        from src.managers import SessionManager
+
+        bundle = os.path.join(self.path, "bundle.bin")
+        save_bundle([build_graph("u1"), build_graph("u2")], bundle)
+        journal = GraphJournal(os.path.join(self.path, "journal"), shards=2)
+        session = SessionManager(journal=journal, snapshots=True)
+        session.enable_scheduler(start=False)
+        self.assertEqual(session.load_graph_snapshot(bundle), 2)
+
+        graph = session.users["u1"]
+        self.assertIs(graph.journal, journal)
+        self.assertFalse(graph.auto_sweep)
+        self.assertIsInstance(graph.snapshot(), GraphSnapshot)
+        session.ingest_updates({"u1": [("add_interest", "恢复后", "query", 0.9)]})
+        journal.close()
+
+        recovered = GraphJournal(os.path.join(self.path, "journal"), shards=2).recover()
+        self.assertEqual(sorted(recovered["u1"].graph), sorted(graph.graph))
+        self.assertIn("query:恢复后", recovered["u1"])
+        self.assertIn("AI:机器学习", recovered["u2"])
+        self.assertEqual(recovered["u1"].version, graph.version)
+
+
+class TestSessionSnapshots(unittest.TestCase):
+    """测试SessionManager为用户图谱发布只读快照"""
+
+    @mock.patch("src.managers.evolution_manager.EvolutionManager")
+    def test_publish_once_per_request(self, _):
+        """测试读取方拿到快照，一次请求的修改结束后只复制一次图谱"""
+        from src.graph_snapshot import GraphSnapshot
+        from src.managers import SessionManager
+        
+        session = SessionManager(snapshots=True)
+        graph, _ = session.get_or_create_user("u1")
+        self.assertIsInstance(graph.snapshot(), GraphSnapshot)
+        
+        with mock.patch.object(GraphSnapshot, "from_graph", wraps=GraphSnapshot.from_graph) as copies:
+            session.ingest_updates({"u1": [("add_interest", "机器学习", "AI", 0.8),
+                                           ("add_interest", "深度学习", "AI", 0.7)]})
+            graph.add_interest("未发布", "query")  # 会话之外的修改不自动发布
+        self.assertEqual(copies.call_count, 1)
+        view = graph.snapshot()
+        self.assertIn("AI:机器学习", view)
+        self.assertNotIn("query:未发布", view)
+        self.assertEqual(session.get_user_profile("u1")["graph_version"], view.version)
+    
+    @mock.patch("src.managers.evolution_manager.EvolutionManager")
+    def test_disabled(self, _):
+        """测试关闭快照时读取图谱本身"""
+        from src.managers import SessionManager
+        
+        graph, _ = SessionManager(snapshots=False).get_or_create_user("u1")
+        self.assertIs(graph.snapshot(), graph)
+
+    @mock.patch("src.managers.evolution_manager.EvolutionManager")
+    def test_readers_load_under_user_lock(self, evolution_cls):
+        """测试读取档案和导出会话时，加载用户 (可能从磁盘加载并复制快照) 在用户锁内进行"""
+        from src.managers import SessionManager
+
+        evolution_cls.return_value.get_system_health.return_value = {}
+        evolution_cls.return_value.to_dict.return_value = {}
+        session = SessionManager(snapshots=True)
+        session.ingest_updates({"u1": [("add_interest", "机器学习", "AI", 0.8)]})
+        get_or_create_user = session.get_or_create_user
+
+        def checked(user_id):
+            self.assertTrue(session.user_lock(user_id)._is_owned())
+            return get_or_create_user(user_id)
+
+        with mock.patch.object(session, "get_or_create_user", side_effect=checked) as lookups, \
+                tempfile.TemporaryDirectory() as tmpdir:
+            profile = session.get_user_profile("u1")
+            self.assertTrue(session.save_session("u1", os.path.join(tmpdir, "u1.json")))
+        self.assertEqual(lookups.call_count, 2)
+        self.assertEqual(profile["interests"][0][0], "AI:机器学习")
+
+
+class TestSessionStore(unittest.TestCase):
+    """测试SQLite会话持久化"""
+    
+    FEEDBACK = {"clicked_indices": [0, 1], "browse_times": [60, 90], "satisfaction": 0.8}
+    
+    def setUp(self):
+        from src.agents.model_registry import SharedModel
+        
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "sessions.db")
+        # 不加载LLM，AgentA使用模拟推荐
+        registry = mock.Mock()
+        registry.get.return_value = SharedModel("fake-model", None, None)
+        patcher = mock.patch("src.agents.agent_a.get_model_registry", return_value=registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_write_behind_coalesces_users(self):
+        """测试同一用户多次修改只写入最新状态，交互记录全部写入"""
+        store = SQLiteSessionStore(self.path, flush_interval=0)
+        for version in range(3):
+            graph = build_graph("u1")
+            graph.version = version
+            store.mark_dirty("u1", graph, {"total_iterations": version})
+            store.log_interaction("u1", {"query": f"q{version}", "timestamp": str(version)})
+        self.assertEqual(store.backlog, 4)
+        self.assertEqual(store.flush(), 1)
+        self.assertEqual(store.backlog, 0)
+        
+        self.assertEqual(store.load_graph("u1").version, 2)
+        self.assertEqual(store.load_session("u1"), {"total_iterations": 2})
+        self.assertEqual([r["query"] for r in store.load_interactions("u1", limit=2)], ["q1", "q2"])
+        self.assertIsNone(store.load_graph("u2"))
+        store.close()
+    
+    def test_graph_serialized_at_flush_under_user_lock(self):
+        """测试请求路径只登记脏用户，图谱在写入时于用户锁内序列化一次 (含其间的所有修改)"""
+        lock = threading.RLock()
+        store = SQLiteSessionStore(self.path, flush_interval=0, lock_for=lambda user_id: lock)
+        graph = build_graph("u1")
+        serialized = []
+
+        def dumps(g):
+            serialized.append(lock._is_owned())
+            return dumps_graph(g)
+
+        with mock.patch("src.storage.session_store.dumps_graph", side_effect=dumps):
+            for i in range(3):
+                graph.add_interest(f"兴趣{i}", "query")
+                store.mark_dirty("u1", graph, {})
+            self.assertEqual(serialized, [])
+            self.assertEqual(store.flush(), 1)
+        self.assertEqual(serialized, [True])
+        self.assertIn("query:兴趣2", store.load_graph("u1"))
+        self.assertEqual(store.load_graph("u1").version, graph.version)
+        store.close()
+
+    def test_batch_size_wakes_writer(self):
+        """测试待写入数量达到阈值时后台线程提前写入"""
+        store = SQLiteSessionStore(self.path, flush_interval=60, batch_size=2)
+        store.log_interaction("u1", {"query": "a"})
+        store.log_interaction("u1", {"query": "b"})
+        for _ in range(200):
+            if store.interactions_written == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(store.interactions_written, 2)
+        store.close()
+    
+    def test_session_survives_restart(self):
+        """测试SessionManager重启后恢复图谱、智能体版本、评估指标和交互记录"""
+        from src.managers import SessionManager
+        
+        session = SessionManager(persistence=SQLiteSessionStore(self.path, flush_interval=0.01))
+        for query in ("Python 数据分析", "机器学习"):
+            session.process_interaction("u1", query, self.FEEDBACK)
+        graph, evo_manager = session.get_or_create_user("u1")
+        session.persistence.close()
+        
+        restored = SessionManager(persistence=SQLiteSessionStore(self.path, flush_interval=0))
+        restored_graph, restored_evo = restored.get_or_create_user("u1")
+        self.assertEqual(sorted(restored_graph.graph), sorted(graph.graph))
+        self.assertEqual(restored_graph.version, graph.version)
+        self.assertEqual(restored_evo.to_dict()["agent_b"]["performance_metrics"],
+                         evo_manager.agent_b.to_dict()["performance_metrics"])
+        self.assertEqual(restored_evo.agent_a.version, evo_manager.agent_a.version)
+        self.assertEqual(restored.get_user_profile("u1")["interaction_count"], 2)
+        
+        export = os.path.join(self.tmpdir.name, "u1.json")
+        self.assertTrue(restored.save_session("u1", export))
+        self.assertFalse(restored.save_session("missing", export))
+        other = SessionManager()
+        self.assertEqual(other.load_session(export), "u1")
+        self.assertEqual(sorted(other.users["u1"].graph), sorted(graph.graph))
+        self.assertEqual(len(other.session_history["u1"]), 2)
+
+
+class TestGenerationCache(unittest.TestCase):
+    """测试跨进程共享的生成结果缓存"""
+    
+    KEY = ("python 进阶", "0123456789abcdef", 2)
+    RECS = [{"title": "Python进阶实战", "description": "项目实战", "reason": "直接匹配需求"}]
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "generations.db")
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def open_cache(self, **kwargs):
+        cache = SQLiteGenerationCache(self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+    
+    def test_shared_across_processes(self):
+        """测试一个进程写入的条目可以在另一个进程中读到"""
+        from concurrent.futures import ProcessPoolExecutor
+        
+        self.open_cache().put(self.KEY, self.RECS)
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            self.assertEqual(pool.submit(read_generation, self.path, self.KEY).result(), self.RECS)
+            self.assertIsNone(pool.submit(read_generation, self.path, ("其他", "", 0)).result())
+    
+    def test_ttl_and_max_entries(self):
+        """测试过期条目不命中，清理时删除过期和超出上限的最旧条目"""
+        cache = self.open_cache(ttl=10, max_entries=2, prune_interval=1000)
+        for i in range(4):
+            cache.put(("q", str(i), 0), self.RECS, now=float(i))
+        self.assertIsNone(cache.get(("q", "0", 0), now=11))
+        self.assertEqual(cache.get(("q", "3", 0), now=11)[1], tuple(self.RECS))
+        
+        self.assertEqual(cache.prune(now=11.5), 2)  # "0","1" 过期
+        self.assertEqual(len(cache), 2)
+        cache.put(("q", "4", 0), self.RECS, now=12)
+        self.assertEqual(cache.prune(now=12), 1)  # 超出上限，删除最旧的 "2"
+        self.assertIsNone(cache.get(("q", "2", 0), now=12))
+    
+    def test_second_tier_of_recommendation_cache(self):
+        """测试进程内缓存未命中时从二级缓存读取，演化清除同时作用于两级"""
+        from src.agents import RecommendationCache
+        
+        worker_a = RecommendationCache(backend=self.open_cache())
+        worker_b = RecommendationCache(backend=self.open_cache())
+        worker_a.put(self.KEY, self.RECS)
+        
+        self.assertEqual(worker_b.get(self.KEY), self.RECS)
+        self.assertEqual(worker_b.get(self.KEY), self.RECS)
+        stats = worker_b.get_stats()
+        self.assertEqual((stats["backend_hits"], stats["hits"]), (1, 1))
+        
+        worker_b.invalidate([self.KEY])
+        self.assertIsNone(RecommendationCache(backend=self.open_cache()).get(self.KEY))
+
+
+if __name__ == "__main__":
+    unittest.main()